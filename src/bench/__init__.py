@@ -0,0 +1,197 @@
+"""Throughput and latency benchmarks for reading Mifare Classic cards with mifareauth.NFCReader"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# The benchmark drives NFCReader.run() itself, so it measures exactly the
+# code path a gate runs.  Each operation is timed by wrapping it: the NFCReader
+# methods on the instance, polls through the nfc module, and frames both
+# through pynfc.Device and through the nfc module, so that the time spent in
+# Python for each frame can be told apart from the time spent in libnfc.
+
+import os
+import sys
+import math
+import struct
+import platform
+import threading
+
+import nfc
+import pynfc
+import nfcstats
+import presence
+import mifareauth
+
+PERCENTILES = (50, 90, 99)
+
+# NFCReader methods timed as operations
+READER_OPERATIONS = ('select_card', '_authenticate', '_read_block', 'read_card')
+
+def percentile(ordered, pct):
+    """Returns the pct percentile of an ordered list of samples, by the nearest rank"""
+    if not ordered:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(ordered))) - 1
+    return ordered[max(0, min(rank, len(ordered) - 1))]
+
+class Recorder(object):
+    """Collects latency samples for named operations"""
+    def __init__(self):
+        self.samples = {}
+
+    def timed(self, name, func):
+        """Returns func wrapped so that the duration of every call is recorded under name"""
+        append = self.samples.setdefault(name, []).append
+        return nfcstats.timed(func, lambda seconds, error: append(seconds))
+
+    def summary(self, name):
+        """Returns the count, mean, percentiles and maximum of an operation's samples, in seconds"""
+        ordered = sorted(self.samples.get(name, []))
+        result = {'count': len(ordered),
+                  'total': sum(ordered),
+                  'mean': (sum(ordered) / len(ordered)) if ordered else None,
+                  'max': ordered[-1] if ordered else None}
+        for pct in PERCENTILES:
+            result['p%d' % pct] = percentile(ordered, pct)
+        return result
+
+def wrapper_cost(runs = 10000):
+    """Returns the time a Recorder wrapper adds to each call, to be subtracted from per frame figures"""
+    noop = lambda: None
+    wrapped = Recorder().timed('noop', noop)
+    start = pynfc.monotonic()
+    for _ in range(runs):
+        noop()
+    bare = pynfc.monotonic() - start
+    start = pynfc.monotonic()
+    for _ in range(runs):
+        wrapped()
+    return max(0.0, (pynfc.monotonic() - start - bare) / runs)
+
+def install_sim(taps, dwell = 2, gap = 2, latency = None):
+    """Replaces libnfc with one simulated reader presenting taps blank Mifare Classic 1K cards in turn
+
+       Each card stays in the field for dwell polls or presence checks (the
+       first of which finds it), followed by gap with an empty field (enough
+       for NFCReader's presence checks to notice the removal).  Every card has
+       a different UID so that NFCReader reads each one.  Returns the SimReader.
+    """
+    import nfcsim
+    def script():
+        for tap in range(taps):
+            tag = nfcsim.MifareClassicTag(struct.pack(">I", 0x10000000 + tap))
+            for _ in range(dwell):
+                yield tag
+            for _ in range(gap):
+                yield None
+    reader = nfcsim.SimReader(script = script(), latency = latency)
+    nfcsim.install(reader)
+    return reader
+
+class _Patch(object):
+    """Replaces attributes for the duration of a with block"""
+    def __init__(self):
+        self.saved = []
+
+    def set(self, obj, name, value):
+        # _Patch marks attributes that were inherited or bound on first use, rather than set on obj
+        self.saved.append((obj, name, obj.__dict__.get(name, _Patch)))
+        setattr(obj, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for obj, name, own in reversed(self.saved):
+            if own is _Patch:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, own)
+        self.saved = []
+
+def run(taps = 100, duration = 60.0, keys = None, quiet = True, presence_interval = 0.0):
+    """Reads cards with NFCReader until taps cards have been read or duration seconds pass
+
+       Uses whichever libnfc is in place, so install_sim should be called first
+       for a simulated run.  After each read NFCReader waits for the card to
+       leave, checking its presence every presence_interval seconds; the time
+       spent waiting is reported apart from the time spent reading.  Returns a
+       dictionary of the results, suitable for saving as JSON.
+    """
+    recorder = Recorder()
+    reader = mifareauth.NFCReader(lambda message: None, keys = keys)
+    reader.presence_interval = presence_interval
+    read_card = reader.read_card
+    reads = [0]
+    def counted_read_card(uid):
+        try:
+            return read_card(uid)
+        finally:
+            reads[0] += 1
+            if reads[0] >= taps:
+                reader.stop()
+
+    with _Patch() as patch:
+        for name in READER_OPERATIONS:
+            func = counted_read_card if name == 'read_card' else getattr(reader, name)
+            patch.set(reader, name, recorder.timed(name, func))
+        patch.set(nfc, 'nfc_initiator_poll_target', recorder.timed('poll', nfc.nfc_initiator_poll_target))
+        patch.set(nfc, 'nfc_initiator_transceive_bytes',
+                  recorder.timed('libnfc_frame', nfc.nfc_initiator_transceive_bytes))
+        patch.set(pynfc.Device, 'transceive_into', recorder.timed('frame', pynfc.Device.transceive_into))
+        patch.set(presence.PresenceTracker, 'wait_for_removal',
+                  recorder.timed('presence_wait', presence.PresenceTracker.wait_for_removal))
+
+        timer = threading.Timer(duration, reader.stop)
+        timer.daemon = True
+        stdout = sys.stdout
+        if quiet:
+            # read_card prints every block
+            sys.stdout = open(os.devnull, 'w')
+        start = pynfc.monotonic()
+        try:
+            timer.start()
+            while reader.run():
+                pass
+        finally:
+            elapsed = pynfc.monotonic() - start
+            timer.cancel()
+            timer.join()
+            if quiet:
+                sys.stdout.close()
+                sys.stdout = stdout
+
+    read = recorder.samples['read_card']
+    reading = sum(read)
+    frames = recorder.summary('frame')
+    overhead = None
+    if frames['count']:
+        inner = recorder.summary('libnfc_frame')['total']
+        overhead = max(0.0, (frames['total'] - inner) / frames['count'] - wrapper_cost())
+    return {'libnfc_version': str(nfc.nfc_version()),
+            'python': platform.python_version(),
+            'taps': len(read),
+            'elapsed': elapsed,
+            'taps_per_second': (len(read) / elapsed) if elapsed else 0.0,
+            'read_seconds': reading,
+            'reads_per_second': (len(read) / reading) if reading else 0.0,
+            'presence_wait_seconds': recorder.summary('presence_wait')['total'],
+            'operations': dict([(name, recorder.summary(name))
+                                for name in ('poll', ) + READER_OPERATIONS + ('presence_wait', )]),
+            'frames': {'count': frames['count'],
+                       'python_overhead_per_frame': overhead,
+                       'latency': frames}}
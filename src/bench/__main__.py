@@ -0,0 +1,65 @@
+"""Benchmarks reading Mifare Classic cards, against a real reader or a simulated one, printing the results as JSON"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import sys
+import json
+import optparse
+
+import bench
+
+def main(args = None):
+    parser = optparse.OptionParser(usage = "python -m bench [options]", description = __doc__)
+    parser.add_option("-n", "--taps", type = "int", default = 100, help = "Number of cards to read")
+    parser.add_option("-t", "--duration", type = "float", default = 60.0, help = "Maximum number of seconds to run for")
+    parser.add_option("-k", "--key", action = "append", dest = "keys", default = [],
+                      help = "Mifare key to try, in hex (may be repeated)")
+    parser.add_option("-o", "--output", help = "File to write the results to, instead of standard output")
+    parser.add_option("--sim", action = "store_true", default = False, help = "Use a simulated reader instead of libnfc")
+    parser.add_option("--latency", action = "append", default = [], metavar = "OPERATION=SECONDS",
+                      help = "Latency of a simulated reader operation (may be repeated)")
+    parser.add_option("--dwell", type = "int", default = 2,
+                      help = "Polls or presence checks each simulated card stays in the field for")
+    parser.add_option("--gap", type = "int", default = 2, help = "Polls or presence checks between simulated cards")
+    parser.add_option("--presence-interval", type = "float", default = 0.0, metavar = "SECONDS",
+                      help = "Time between checks that a card which has been read is still in the field")
+    opts, _ = parser.parse_args(args)
+
+    if opts.sim:
+        latency = {}
+        for item in opts.latency:
+            operation, _, seconds = item.partition("=")
+            latency[operation] = float(seconds)
+        bench.install_sim(opts.taps, opts.dwell, opts.gap, latency)
+    elif opts.latency:
+        parser.error("--latency only applies to a simulated reader")
+
+    results = bench.run(opts.taps, opts.duration, [key.decode('hex') for key in opts.keys] or None,
+                        presence_interval = opts.presence_interval)
+    results['backend'] = "sim" if opts.sim else "libnfc"
+
+    out = open(opts.output, 'w') if opts.output else sys.stdout
+    try:
+        json.dump(results, out, indent = 2, sort_keys = True)
+        out.write("\n")
+    finally:
+        if opts.output:
+            out.close()
+
+if __name__ == '__main__':
+    main()
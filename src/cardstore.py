@@ -0,0 +1,361 @@
+"""An append-only, memory-mapped archive of card images, indexed by UID"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# A store is two files:
+#
+#   path      a header (magic, version, bytes used) followed by records, each
+#             a header (layout, UID, time read, offset of the card's previous
+#             record), a bitmap of the blocks or pages that were read, and
+#             the image itself, whose size is fixed by the layout
+#   path.idx  an open addressing hash table from UID to the offset of the
+#             card's latest record, doubled in size when 70% full
+#
+# Both are memory-mapped, so looking a card up touches a few pages, and
+# images are handed out as memoryviews of the mapping rather than copies.
+# The data file grows by remapping it larger; earlier mappings are kept
+# open until the store is closed, so views already handed out stay valid.
+#
+# The index can always be rebuilt from the records (rebuild_index), which
+# is done automatically if it is missing.  A store should only be written
+# by one process at a time.
+
+import os
+import time
+import mmap
+import zlib
+import ctypes
+import struct
+import threading
+import collections
+
+DATA_MAGIC = "PNCS"
+INDEX_MAGIC = "PNCX"
+VERSION = 1
+
+# Magic, version, bytes used
+_DATA_HEADER = struct.Struct(">4sB3xQ")
+# Layout, UID length, UID, time read, offset of the previous record for the UID (0 for none)
+_RECORD_HEADER = struct.Struct(">BB10sdQ4x")
+# Magic, version, number of slots, number of UIDs
+_INDEX_HEADER = struct.Struct(">4sB3xII")
+# UID length (0 for an empty slot), UID, offset of the latest record
+_SLOT = struct.Struct(">B10sxQ")
+
+MAX_UID_LEN = 10
+# Fraction of the index slots used before it is doubled
+MAX_LOAD = 0.7
+
+class Layout(collections.namedtuple('Layout', 'id name units unit_size')):
+    """The shape of a card image: units (blocks or pages) of unit_size bytes"""
+    __slots__ = ()
+
+    @property
+    def size(self):
+        return self.units * self.unit_size
+
+    @property
+    def mask_size(self):
+        return (self.units + 7) // 8
+
+    @property
+    def record_size(self):
+        return _RECORD_HEADER.size + self.mask_size + self.size
+
+CLASSIC_1K = Layout(1, "Mifare Classic 1K", 64, 16)
+CLASSIC_4K = Layout(2, "Mifare Classic 4K", 256, 16)
+ULTRALIGHT = Layout(3, "Mifare Ultralight", 16, 4)
+NTAG213 = Layout(4, "NTAG213", 45, 4)
+NTAG215 = Layout(5, "NTAG215", 135, 4)
+NTAG216 = Layout(6, "NTAG216", 231, 4)
+
+LAYOUTS = dict([(layout.id, layout) for layout in (CLASSIC_1K, CLASSIC_4K, ULTRALIGHT, NTAG213, NTAG215, NTAG216)])
+
+def _view(buf, offset, size):
+    """Returns a memoryview of size bytes of buf (a mmap) from offset, without copying"""
+    try:
+        return memoryview(buf)[offset:offset + size]
+    except TypeError:
+        # Python 2 mmaps do not expose the new buffer interface
+        return memoryview((ctypes.c_char * size).from_buffer(buf, offset))
+
+def _hash(uid):
+    return zlib.crc32(uid) & 0xffffffff
+
+class StoredImage(object):
+    """A card image held in a CardStore
+
+       data is a memoryview of the image in the store's mapping, valid until
+       the store is closed.  Units (blocks or pages) that could not be read
+       are zeros in data, and absent from blocks().
+    """
+    __slots__ = ['offset', 'layout', 'uid', 'timestamp', 'previous', 'mask', 'data']
+
+    def __init__(self, buf, offset):
+        layout_id, uid_len, uid, timestamp, previous = _RECORD_HEADER.unpack_from(buf, offset)
+        self.offset = offset
+        self.layout = LAYOUTS[layout_id]
+        self.uid = uid[:uid_len]
+        self.timestamp = timestamp
+        self.previous = previous or None
+        start = offset + _RECORD_HEADER.size
+        self.mask = buf[start:start + self.layout.mask_size]
+        self.data = _view(buf, start + self.layout.mask_size, self.layout.size)
+
+    def __repr__(self):
+        return "<StoredImage %s %s at %d>" % (self.uid.encode('hex'), self.layout.name, self.offset)
+
+    def valid(self, unit):
+        """Returns whether the unit (block or page) was read"""
+        return bool(ord(self.mask[unit >> 3]) & (1 << (unit & 7)))
+
+    def unit(self, unit):
+        """Returns a memoryview of a unit (block or page)"""
+        size = self.layout.unit_size
+        return self.data[unit * size:(unit + 1) * size]
+
+    def blocks(self):
+        """Returns the image as a dictionary of unit number to data (a string), for the units that were read"""
+        size = self.layout.unit_size
+        data = self.data.tobytes()
+        return dict([(unit, data[unit * size:(unit + 1) * size])
+                     for unit in range(self.layout.units) if self.valid(unit)])
+
+def diff(old, new):
+    """Returns the sorted units that differ between two images, each a StoredImage or a dictionary of unit to data"""
+    if isinstance(old, StoredImage):
+        old = old.blocks()
+    if isinstance(new, StoredImage):
+        new = new.blocks()
+    return sorted([unit for unit in set(old) | set(new) if old.get(unit, '') != new.get(unit, '')])
+
+class CardStore(object):
+    """An append-only store of card images at path, indexed by UID
+
+       Every image appended is kept; get() returns the latest for a UID and
+       history() the earlier ones, and iterating over the store yields every
+       image in the order they were appended.
+    """
+    def __init__(self, path, index_capacity = 1 << 16):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._lock = threading.Lock()
+        # Mappings of the data file replaced by larger ones, kept for the views into them
+        self._old_maps = []
+
+        new = not os.path.exists(path)
+        self._file = open(path, "w+b" if new else "r+b")
+        if new:
+            self._file.write(_DATA_HEADER.pack(DATA_MAGIC, VERSION, _DATA_HEADER.size))
+            self._file.truncate(1 << 20)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, self._used = _DATA_HEADER.unpack_from(self._map, 0)
+        if magic != DATA_MAGIC or version != VERSION:
+            raise IOError("%s is not a card store" % path)
+
+        self._index_file = None
+        self._index = None
+        if os.path.exists(self.index_path):
+            self._open_index()
+        else:
+            self.rebuild_index(index_capacity)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open_index(self):
+        self._index_file = open(self.index_path, "r+b")
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+        magic, version, self._capacity, self._count = _INDEX_HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC or version != VERSION:
+            raise IOError("%s is not a card store index" % self.index_path)
+
+    def _close_index(self):
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+            self._index = self._index_file = None
+
+    def rebuild_index(self, capacity = 1 << 16):
+        """Rebuilds the index from the records, for instance after a crash while appending"""
+        with self._lock:
+            latest = collections.OrderedDict()
+            for image in self._records():
+                latest[image.uid] = image.offset
+            self._write_index(latest, capacity)
+
+    def _write_index(self, entries, capacity):
+        """Replaces the index with one holding entries, a dictionary of UID to offset"""
+        while capacity * MAX_LOAD < len(entries) + 1:
+            capacity *= 2
+        temp = self.index_path + ".tmp"
+        with open(temp, "w+b") as f:
+            f.truncate(_INDEX_HEADER.size + capacity * _SLOT.size)
+            index = mmap.mmap(f.fileno(), 0)
+            _INDEX_HEADER.pack_into(index, 0, INDEX_MAGIC, VERSION, capacity, len(entries))
+            for uid, offset in entries.items():
+                slot = _hash(uid) % capacity
+                while index[_INDEX_HEADER.size + slot * _SLOT.size] != "\x00":
+                    slot = (slot + 1) % capacity
+                _SLOT.pack_into(index, _INDEX_HEADER.size + slot * _SLOT.size, len(uid), uid, offset)
+            index.flush()
+            index.close()
+        self._close_index()
+        os.rename(temp, self.index_path)
+        self._open_index()
+
+    def _find(self, uid):
+        """Returns the position in the index of uid's slot, or of the empty slot it would take"""
+        index = self._index
+        capacity = self._capacity
+        slot = _hash(uid) % capacity
+        while True:
+            position = _INDEX_HEADER.size + slot * _SLOT.size
+            uid_len, slot_uid, _offset = _SLOT.unpack_from(index, position)
+            if uid_len == 0 or slot_uid[:uid_len] == uid:
+                return position
+            slot = (slot + 1) % capacity
+
+    def _latest(self, uid):
+        uid_len, _uid, offset = _SLOT.unpack_from(self._index, self._find(uid))
+        return offset if uid_len else None
+
+    def _grow(self, size):
+        """Makes the data file at least size bytes long"""
+        if size <= len(self._map):
+            return
+        length = max(size, len(self._map) * 2)
+        self._map.flush()
+        self._file.truncate(length)
+        self._old_maps.append(self._map)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def append(self, uid, layout, image, timestamp = None):
+        """Stores an image of the card with the given uid, returning its offset
+
+           image is either a string of the layout's size, or a dictionary of
+           unit (block or page) number to data, as returned by
+           NFCReader.read_card, in which empty or missing units count as not read.
+        """
+        if not 0 < len(uid) <= MAX_UID_LEN:
+            raise ValueError("UIDs must be 1 to %d bytes long" % MAX_UID_LEN)
+        if isinstance(image, dict):
+            units = [unit for unit in image if image[unit]]
+            if [unit for unit in units if not 0 <= unit < layout.units]:
+                raise ValueError("%s images have %d units" % (layout.name, layout.units))
+            data = bytearray(layout.size)
+            for unit in units:
+                value = image[unit][:layout.unit_size]
+                data[unit * layout.unit_size:unit * layout.unit_size + len(value)] = value
+        else:
+            if len(image) != layout.size:
+                raise ValueError("%s images are %d bytes long" % (layout.name, layout.size))
+            units = range(layout.units)
+            data = image
+        mask = bytearray(layout.mask_size)
+        for unit in units:
+            mask[unit >> 3] |= 1 << (unit & 7)
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            if (self._count + 1) > self._capacity * MAX_LOAD:
+                self._write_index(self._entries(), self._capacity * 2)
+            offset = self._used
+            self._grow(offset + layout.record_size)
+            position = self._find(uid)
+            uid_len, _uid, previous = _SLOT.unpack_from(self._index, position)
+            start = offset + _RECORD_HEADER.size
+            _RECORD_HEADER.pack_into(self._map, offset, layout.id, len(uid), uid, timestamp,
+                                     previous if uid_len else 0)
+            self._map[start:start + layout.mask_size] = str(mask)
+            self._map[start + layout.mask_size:start + layout.mask_size + layout.size] = str(data)
+            self._used = offset + layout.record_size
+            _DATA_HEADER.pack_into(self._map, 0, DATA_MAGIC, VERSION, self._used)
+            _SLOT.pack_into(self._index, position, len(uid), uid, offset)
+            if not uid_len:
+                self._count += 1
+                _INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, VERSION, self._capacity, self._count)
+        return offset
+
+    def _entries(self):
+        """Returns the index as a dictionary of UID to offset"""
+        entries = {}
+        for slot in range(self._capacity):
+            uid_len, uid, offset = _SLOT.unpack_from(self._index, _INDEX_HEADER.size + slot * _SLOT.size)
+            if uid_len:
+                entries[uid[:uid_len]] = offset
+        return entries
+
+    def get(self, uid):
+        """Returns the latest StoredImage of the card with the given uid, or None"""
+        with self._lock:
+            offset = self._latest(uid)
+            return StoredImage(self._map, offset) if offset is not None else None
+
+    def history(self, uid):
+        """Yields every StoredImage of the card with the given uid, latest first"""
+        image = self.get(uid)
+        while image is not None:
+            yield image
+            image = StoredImage(self._map, image.previous) if image.previous else None
+
+    def _records(self):
+        offset = _DATA_HEADER.size
+        while offset < self._used:
+            image = StoredImage(self._map, offset)
+            yield image
+            offset += image.layout.record_size
+
+    def __iter__(self):
+        return self._records()
+
+    def __contains__(self, uid):
+        with self._lock:
+            return self._latest(uid) is not None
+
+    def __len__(self):
+        """Returns the number of different cards stored"""
+        return self._count
+
+    def uids(self):
+        """Returns the UIDs of every card stored"""
+        with self._lock:
+            return list(self._entries())
+
+    def flush(self):
+        """Writes the store to disk"""
+        with self._lock:
+            self._map.flush()
+            self._index.flush()
+
+    def close(self):
+        """Closes the store; images it returned must not be used afterwards"""
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._close_index()
+            for m in self._old_maps + [self._map]:
+                m.close()
+            self._old_maps = []
+            self._map = None
+            self._file.close()
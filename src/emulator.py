@@ -0,0 +1,299 @@
+"""Target emulation on top of nfc_emulate_target, answering frames from precomputed response tables"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# libnfc calls the emulator's io function with every frame the initiator
+# sends, and the initiator only waits a few milliseconds for the answer.  The
+# io function therefore does as little as possible in Python: the frame is
+# read once, looked up in the table for the current state, and the response
+# (a string prepared in advance) is copied straight into libnfc's transmit
+# buffer.  The callback takes plain addresses rather than ctypes pointers, so
+# no objects are built for the buffers on each frame.
+#
+# Frames missing from the table are answered by handle(), and the answer is
+# added to the table, so an emulator only works out each response once.
+
+import sys
+import ctypes
+import struct
+
+import nfc
+import pynfc
+
+# The type of nfc_emulation_state_machine.io, and the cheaper one the callback is made with
+_IO_FUNC = dict(nfc.nfc_emulation_state_machine._fields_)['io']
+_IO_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t,
+                                ctypes.c_void_p, ctypes.c_size_t)
+
+# Default next state for Emulator.add, since None is a valid state
+_STAY = object()
+
+def iso14443a_target(uid, atqa = "\x00\x04", sak = 0x20, ats = ""):
+    """Returns an nfc_target describing an ISO14443A tag, for emulating it
+
+       PN53x readers only emulate 4 byte UIDs, and replace the first byte with 0x08.
+    """
+    target = nfc.nfc_target()
+    target.nm.nmt = nfc.NMT_ISO14443A
+    target.nm.nbr = nfc.NBR_UNDEFINED
+    nai = target.nti.nai
+    ctypes.memmove(nai.abtAtqa, atqa, 2)
+    nai.btSak = sak
+    nai.szUidLen = len(uid)
+    ctypes.memmove(nai.abtUid, uid, len(uid))
+    nai.szAtsLen = len(ats)
+    ctypes.memmove(nai.abtAts, ats, len(ats))
+    return target
+
+class Emulator(object):
+    """Emulates a target by answering each frame from a table of prepared responses
+
+       The emulator moves between states (any hashable values, starting from
+       initial_state at each run), and each state has a table mapping frames
+       to (response, next state, next state's table) entries.  A response of
+       None sends nothing back.  Subclasses fill the tables with add() and
+       prepare(), and override handle() to answer frames missing from them.
+
+       Since answers from handle() are kept in the tables, they must depend
+       only on the state and the frame.  Up to max_cached answers are kept
+       for each state.  Anything else an emulator needs to remember across
+       frames should be made part of its state.
+
+       frames and misses count the frames received and those not found in
+       the tables.
+    """
+    initial_state = None
+    max_cached = 4096
+
+    def __init__(self, target):
+        self.target = target
+        self.tables = {}
+        self.state = self.initial_state
+        self._table = self.table(self.state)
+        self.frames = 0
+        self.misses = 0
+        self._stopping = False
+        self._error = None
+
+        self._callback = _IO_CALLBACK(self._io)
+        self._state_machine = nfc.nfc_emulation_state_machine()
+        self._state_machine.io = ctypes.cast(self._callback, _IO_FUNC)
+        self._emulator = nfc.nfc_emulator()
+        self._emulator.target = ctypes.pointer(self.target)
+        self._emulator.state_machine = ctypes.pointer(self._state_machine)
+        self._as_parameter_ = ctypes.pointer(self._emulator)
+
+    def table(self, state):
+        """Returns the table of responses for state"""
+        table = self.tables.get(state)
+        if table is None:
+            table = self.tables[state] = {}
+        return table
+
+    def add(self, state, frame, response, next_state = _STAY):
+        """Answers frame with response in state, moving to next_state (by default staying in state)"""
+        if next_state is _STAY:
+            next_state = state
+        self.table(state)[frame] = (response, next_state, self.table(next_state))
+
+    def prepare(self, state, frames):
+        """Works out the answers to frames in state in advance, with handle()"""
+        for frame in frames:
+            response, next_state = self.handle(state, frame)
+            self.add(state, frame, response, next_state)
+
+    def clear(self):
+        """Forgets every response, for instance after the emulated contents change"""
+        for table in self.tables.values():
+            table.clear()
+
+    def handle(self, state, frame):
+        """Returns the (response, next state) for a frame missing from state's table
+
+           The base class sends no response and stays in the same state.
+        """
+        return None, state
+
+    def _io(self, emulator, rx, rx_len, tx, tx_len):
+        try:
+            self.frames += 1
+            if self._stopping:
+                return nfc.NFC_EOPABORTED
+            frame = ctypes.string_at(rx, rx_len)
+            entry = self._table.get(frame)
+            if entry is None:
+                entry = self._miss(frame)
+            response, self.state, self._table = entry
+            if response is None:
+                return 0
+            size = len(response)
+            if size > tx_len:
+                return nfc.NFC_EOVFLOW
+            ctypes.memmove(tx, response, size)
+            return size
+        except Exception:
+            # Exceptions cannot pass through libnfc, so end the emulation and raise it from run()
+            self._error = sys.exc_info()
+            return nfc.NFC_ESOFT
+
+    def _miss(self, frame):
+        self.misses += 1
+        response, next_state = self.handle(self.state, frame)
+        entry = (response, next_state, self.table(next_state))
+        if len(self._table) < self.max_cached:
+            self._table[frame] = entry
+        return entry
+
+    def run(self, device, timeout = 0):
+        """Emulates the target on a pynfc.Device until the initiator goes away
+
+           Waits up to timeout milliseconds (0 for ever) for an initiator and
+           for each of its frames.  Returns False if the emulator was stopped,
+           and True otherwise, so that initiators can be served in turn with:
+
+               while emulator.run(device):
+                   pass
+
+           Raises IOError if the device fails, and re-raises any exception
+           from handle().
+        """
+        self.state = self.initial_state
+        self._table = self.table(self.state)
+        self._error = None
+        res = device.emulate(self, timeout)
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error[0], error[1], error[2]
+        if self._stopping:
+            self._stopping = False
+            return False
+        if res < 0 and res not in pynfc.CARD_ERRORS:
+            raise IOError(res, "NFC Error whilst emulating target")
+        return True
+
+    def stop(self):
+        """Ends the emulation at the next frame
+
+           The device should also be aborted, in case it is waiting for an initiator.
+        """
+        self._stopping = True
+
+# Status words
+SW_OK = "\x90\x00"
+SW_WRONG_LENGTH = "\x67\x00"
+SW_SECURITY_NOT_SATISFIED = "\x69\x82"
+SW_NO_CURRENT_EF = "\x69\x86"
+SW_WRONG_P1P2 = "\x6a\x86"
+SW_NOT_FOUND = "\x6a\x82"
+SW_OFFSET_OUT_OF_RANGE = "\x6b\x00"
+SW_INS_NOT_SUPPORTED = "\x6d\x00"
+
+class Type4TagEmulator(Emulator):
+    """Emulates a read-only NFC Forum Type 4 tag (mapping version 2.0) holding an NDEF message
+
+       message is the encoded NDEF message.  The responses to the commands
+       phones send to read a tag (selecting the NDEF application and its files,
+       and reading them in chunks of up to max_read bytes) are encoded up
+       front, so reading the tag never leaves the tables after the first time.
+       The NDEF file is size bytes long (by default just big enough for the
+       message), and set_message replaces the message.
+    """
+    NDEF_APPLICATION = "\xd2\x76\x00\x00\x85\x01\x01"
+    CC_FILE = "\xe1\x03"
+    NDEF_FILE = "\xe1\x04"
+
+    # States, from nothing selected to the NDEF application and then one of its files
+    STATES = (None, 'application', 'cc', 'ndef')
+    FILE_STATES = {CC_FILE: 'cc', NDEF_FILE: 'ndef'}
+
+    def __init__(self, message, uid = "\x08\x00\xb0\x0b", ats = "\x75\x33\x92\x03", max_read = 0xf6,
+                 size = None):
+        Emulator.__init__(self, iso14443a_target(uid, ats = ats))
+        self.max_read = max_read
+        self.size = size
+        self.files = {}
+        self.set_message(message)
+
+    def set_message(self, message):
+        """Replaces the NDEF message, preparing every response again"""
+        size = self.size or len(message) + 2
+        if len(message) + 2 > size or size > 0xfffe:
+            raise ValueError("NDEF message of %d bytes does not fit an NDEF file of %d bytes" % (len(message), size))
+        # CC length, mapping version, MLe, MLc, then the NDEF file control TLV (read only access)
+        cc = struct.pack(">HBHHBBHHBB", 15, 0x20, self.max_read, 0xff, 0x04, 6, 0xe104, size, 0x00, 0xff)
+        ndef = struct.pack(">H", len(message)) + message
+        self.files = {self.CC_FILE: cc, self.NDEF_FILE: ndef + "\x00" * (size - len(ndef))}
+        self.clear()
+
+        # Selects with and without Le, and of files with and without asking for their FCI
+        selects = ["\x00\xa4\x04\x00\x07" + self.NDEF_APPLICATION]
+        for fileid in self.files:
+            selects += ["\x00\xa4\x00\x0c\x02" + fileid, "\x00\xa4\x00\x00\x02" + fileid]
+        selects += [select + "\x00" for select in selects]
+        for state in self.STATES:
+            self.prepare(state, selects)
+        # Reading the length of the message, then the message in chunks from
+        # the start of the file or from just after the length
+        for state, length in (('cc', len(cc)), ('ndef', len(ndef))):
+            reads = [(0, 2)]
+            for start in (0, 2):
+                for offset in range(start, length, self.max_read):
+                    reads.append((offset, min(self.max_read, length - offset)))
+            self.prepare(state, [struct.pack(">BBHB", 0x00, 0xb0, offset, le) for offset, le in reads])
+
+    def _select(self, state, frame):
+        if len(frame) < 5 or len(frame) < 5 + ord(frame[4]):
+            return SW_WRONG_LENGTH, state
+        name = frame[5:5 + ord(frame[4])]
+        p1 = ord(frame[2])
+        if p1 == 0x04:
+            if name == self.NDEF_APPLICATION:
+                return SW_OK, 'application'
+            return SW_NOT_FOUND, None
+        if p1 == 0x00:
+            if state is None or name not in self.files:
+                return SW_NOT_FOUND, state
+            return SW_OK, self.FILE_STATES[name]
+        return SW_WRONG_P1P2, state
+
+    def _read(self, state, frame):
+        if state == 'cc':
+            data = self.files[self.CC_FILE]
+        elif state == 'ndef':
+            data = self.files[self.NDEF_FILE]
+        else:
+            return SW_NO_CURRENT_EF, state
+        offset, = struct.unpack(">H", frame[2:4])
+        if offset & 0x8000:
+            return SW_WRONG_P1P2, state
+        if offset > len(data):
+            return SW_OFFSET_OUT_OF_RANGE, state
+        le = (ord(frame[4]) or 256) if len(frame) > 4 else 256
+        return data[offset:offset + le] + SW_OK, state
+
+    def handle(self, state, frame):
+        if len(frame) < 4:
+            return SW_WRONG_LENGTH, state
+        ins = frame[1]
+        if ins == "\xa4":
+            return self._select(state, frame)
+        if ins == "\xb0":
+            return self._read(state, frame)
+        if ins == "\xd6":
+            return SW_SECURITY_NOT_SATISFIED, state
+        return SW_INS_NOT_SUPPORTED, state
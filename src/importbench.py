@@ -0,0 +1,66 @@
+"""Measures the cost of importing the nfc bindings"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import subprocess
+import optparse
+
+# Each scenario runs in a fresh interpreter, so that nothing is already imported or bound
+SCENARIOS = [
+    ("import", "import nfc"),
+    ("list_devices", "import nfc; nfc.nfc_init; nfc.nfc_list_devices; nfc.nfc_exit"),
+    ("bind_all", "import nfc; nfc.bind_all()"),
+]
+
+TIMER = """
+import time
+start = time.time()
+%s
+print repr(time.time() - start)
+"""
+
+def time_scenario(code, runs):
+    """Runs code in a fresh interpreter runs times and returns the list of timings"""
+    timings = []
+    here = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(runs):
+        proc = subprocess.Popen([sys.executable, "-c", TIMER % code], cwd = here,
+                                stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+        out, err = proc.communicate()
+        if proc.returncode:
+            raise RuntimeError(err.strip().splitlines()[-1])
+        timings.append(float(out))
+    return timings
+
+def main(args = None):
+    parser = optparse.OptionParser(description = __doc__)
+    parser.add_option("-n", "--runs", type = "int", default = 20, help = "Number of interpreters to start per scenario")
+    opts, _ = parser.parse_args(args)
+
+    for name, code in SCENARIOS:
+        try:
+            timings = sorted(time_scenario(code, opts.runs))
+        except RuntimeError, e:
+            print "%-14s failed: %s" % (name, e)
+            continue
+        print "%-14s median %8.3f ms   min %8.3f ms" % (name, timings[len(timings) // 2] * 1000, timings[0] * 1000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Inventory of every tag in a reader's field, reporting tags as they arrive and depart"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import time
+import collections
+
+import nfc
+
+ARRIVED = 'arrived'
+DEPARTED = 'departed'
+
+# A tag arriving in or departing from a reader's field, kind being ARRIVED or
+# DEPARTED and target its pynfc Target record
+InventoryEvent = collections.namedtuple('InventoryEvent', 'kind connstring uid target timestamp')
+
+class Inventory(object):
+    """Tracks every tag in the field of a pynfc.Device by listing them all in one call per scan
+
+       Each scan is compared with the one before, and an InventoryEvent is
+       returned (and put on events, if given) for each tag that has arrived
+       or departed since.  present maps the UID of each tag in the field to
+       its Target record.
+
+       libnfc halts each tag it lists, so by default the RF field is cycled
+       before each scan to wake every tag up again.
+    """
+    def __init__(self, device, modulation = 0, max_targets = 16, events = None, reset_field = True):
+        self.device = device
+        self.modulation = modulation
+        self.max_targets = max_targets
+        self.events = events
+        self.reset_field = reset_field
+        self.present = {}
+        self.scans = 0
+
+    def __len__(self):
+        return len(self.present)
+
+    def scan(self):
+        """Lists the tags in the field, returning the arrival and departure events since the last scan"""
+        if self.reset_field:
+            self.device.set_property(nfc.NP_ACTIVATE_FIELD, False)
+            self.device.set_property(nfc.NP_ACTIVATE_FIELD, True)
+        targets = self.device.list_targets(self.modulation, self.max_targets)
+        self.scans += 1
+        current = dict([(target.uid, target) for target in targets])
+        return self._update(current)
+
+    def clear(self):
+        """Forgets every tag, returning their departure events (for instance once the reader has failed)"""
+        return self._update({})
+
+    def _update(self, current):
+        now = time.time()
+        connstring = self.device.connstring
+        events = []
+        for uid, target in current.iteritems():
+            if uid not in self.present:
+                events.append(InventoryEvent(ARRIVED, connstring, uid, target, now))
+        for uid, target in self.present.iteritems():
+            if uid not in current:
+                events.append(InventoryEvent(DEPARTED, connstring, uid, target, now))
+        self.present = current
+        if self.events is not None:
+            for event in events:
+                self.events.put(event)
+        return events
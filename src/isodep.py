@@ -0,0 +1,223 @@
+"""ISO7816-4 APDU exchanges with ISO14443-4 targets, with command chaining and GET RESPONSE handled"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# With NP_AUTO_ISO14443_4 set when the target is selected (as it is after
+# nfc_initiator_init), the reader deals with the ISO14443-4 block protocol,
+# and nfc_initiator_transceive_bytes carries whole APDUs.  What is left is the
+# APDU layer: commands longer than a frame are split with command chaining,
+# and responses the card holds back (61xx) are collected with GET RESPONSE.
+#
+# Reading a large file is bound by the number of frames, so commands are made
+# as large as the card's frame size (FSC, from its ATS) allows, and responses
+# as large as the card will send.
+
+import ctypes
+import collections
+
+import nfc
+import pynfc
+
+# Frame sizes by FSCI, the low nibble of the ATS format byte
+FSC_TABLE = (16, 24, 32, 40, 48, 64, 96, 128, 256)
+# FSCI of a card that sends no format byte
+DEFAULT_FSCI = 2
+# Bytes of each frame taken by the ISO14443-4 block header (PCB, CID) and the CRC
+FRAME_OVERHEAD = 4
+
+CLA_CHAINING = 0x10
+INS_GET_RESPONSE = 0xC0
+INS_READ_BINARY = 0xB0
+
+SW_OK = 0x9000
+
+def fsc(ats):
+    """Returns the largest frame the card accepts, from its ATS (without the length byte, as libnfc gives it)"""
+    fsci = DEFAULT_FSCI
+    if ats:
+        fsci = ord(ats[0]) & 0x0f
+    return FSC_TABLE[min(fsci, len(FSC_TABLE) - 1)]
+
+class Response(collections.namedtuple('Response', 'data sw')):
+    """A response APDU: its data, and the status word as an integer"""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.sw == SW_OK
+
+    @property
+    def sw1(self):
+        return self.sw >> 8
+
+    @property
+    def sw2(self):
+        return self.sw & 0xff
+
+def build_apdu(out, cla, ins, p1, p2, data = "", le = None, extended = False):
+    """Encodes a command APDU into the bytearray out, returning its length
+
+       le is the number of response bytes expected (256, or 65536 for an
+       extended APDU, meaning as many as possible), or None for none.  Lc and
+       Le are encoded in the extended format if extended is set and either
+       needs it.
+    """
+    out[0] = cla
+    out[1] = ins
+    out[2] = p1
+    out[3] = p2
+    pos = 4
+    if extended and (len(data) > 255 or (le or 0) > 256):
+        if data:
+            out[4] = 0
+            out[5] = len(data) >> 8
+            out[6] = len(data) & 0xff
+            out[7:7 + len(data)] = data
+            pos = 7 + len(data)
+        if le is not None:
+            if not data:
+                out[pos] = 0
+                pos += 1
+            out[pos] = (le >> 8) & 0xff
+            out[pos + 1] = le & 0xff
+            pos += 2
+        return pos
+    if data:
+        out[4] = len(data)
+        out[5:5 + len(data)] = data
+        pos = 5 + len(data)
+    if le is not None:
+        out[pos] = le & 0xff
+        pos += 1
+    return pos
+
+class IsoDep(object):
+    """Exchanges APDUs with the ISO14443-4 target selected on a pynfc.Device
+
+       Commands with more data than fits in a frame are sent with command
+       chaining, 61xx responses are followed by GET RESPONSE until the card
+       has sent everything, and 6Cxx responses are retried with the Le the
+       card asks for.  If the card supports extended APDUs, extended lets
+       each command fill a whole frame of the reader (which splits it into
+       blocks of the card's frame size), and asks for responses up to the
+       reader's frame size; the reader's frames still limit both.
+
+       Commands are built in a buffer kept by the instance, so an IsoDep
+       should be made for each target and used from one thread at a time.
+    """
+    def __init__(self, device, extended = False):
+        self.device = device
+        self.extended = extended
+        self.fsc = fsc(device.decode_target().ats)
+        # Largest APDU that fits in a frame to the card
+        self.max_apdu = min(self.fsc, pynfc.MAX_FRAME_LEN) - FRAME_OVERHEAD
+        if extended:
+            self.max_apdu = pynfc.MAX_FRAME_LEN - FRAME_OVERHEAD
+        # Command data per APDU, leaving room for the header, Lc and Le
+        self.max_command_data = min(self.max_apdu - (9 if extended else 6), 65535 if extended else 255)
+        # Largest Le, so that responses come back in as few frames as possible,
+        # within what the device can receive
+        self.max_le = min(65536, pynfc.MAX_FRAME_LEN - 2) if extended else 256
+        self.frames = 0
+        self._tx = bytearray(pynfc.MAX_FRAME_LEN)
+        # ctypes views of the start of _tx, by length
+        self._views = {}
+        self._rx = bytearray()
+
+    def _send(self, cla, ins, p1, p2, data, le):
+        """Sends one command, returning the response as a (memoryview of the data, status word)"""
+        length = build_apdu(self._tx, cla, ins, p1, p2, data, le, self.extended)
+        view = self._views.get(length)
+        if view is None:
+            view = self._views[length] = (ctypes.c_uint8 * length).from_buffer(self._tx)
+        self.frames += 1
+        response = self.device.transceive(view)
+        if len(response) < 2:
+            raise IOError("Response APDU without status word")
+        return response[:-2], (ord(response[-2]) << 8) | ord(response[-1])
+
+    def exchange(self, cla, ins, p1, p2, data = "", le = None):
+        """Sends a command APDU and returns the complete Response
+
+           Raises IOError if the exchange fails, but status words other than
+           9000 are returned in the Response for the caller to deal with.
+        """
+        self.device.set_property(nfc.NP_EASY_FRAMING, True)
+        chunk = self.max_command_data
+        # Every part of a chained command but the last, each of which the card must accept
+        for start in range(0, len(data) - chunk, chunk):
+            body, sw = self._send(cla | CLA_CHAINING, ins, p1, p2, data[start:start + chunk], None)
+            if sw != SW_OK:
+                return Response(body.tobytes(), sw)
+        if len(data) > chunk:
+            data = data[(len(data) - 1) // chunk * chunk:]
+        body, sw = self._send(cla, ins, p1, p2, data, le)
+        if sw >> 8 == 0x6c:
+            body, sw = self._send(cla, ins, p1, p2, data, (sw & 0xff) or 256)
+        if sw >> 8 != 0x61:
+            return Response(body.tobytes(), sw)
+        rx = self._rx
+        del rx[:]
+        rx += body
+        while sw >> 8 == 0x61:
+            body, sw = self._send(cla & 0x03, INS_GET_RESPONSE, 0, 0, "", (sw & 0xff) or 256)
+            rx += body
+        return Response(str(rx), sw)
+
+    def exchange_many(self, commands, stop_on_error = True):
+        """Sends each command APDU in turn, returning the list of Responses
+
+           commands are (cla, ins, p1, p2[, data[, le]]) tuples.  Unless
+           stop_on_error is False, the exchanges stop after the first response
+           whose status word is not 9000 (or 61xx, which is followed up).
+        """
+        exchange = self.exchange
+        responses = []
+        for command in commands:
+            response = exchange(*command)
+            responses.append(response)
+            if stop_on_error and response.sw != SW_OK:
+                break
+        return responses
+
+    def read_binary(self, length, offset = 0, sfi = None):
+        """Reads length bytes of the current (or short file identifier sfi's) elementary file from offset
+
+           Each READ BINARY asks for as much as the card can return, so that
+           the file is read in as few frames as possible.  Raises IOError
+           carrying the status word if the card refuses a read.
+        """
+        out = bytearray()
+        while len(out) < length:
+            le = min(length - len(out), self.max_le)
+            position = offset + len(out)
+            if sfi is not None and not out:
+                # The first read selects the file, which only allows a one byte offset
+                if position > 0xff:
+                    raise ValueError("Offset %d is too large to read with a short file identifier" % position)
+                p1, p2 = 0x80 | sfi, position
+            else:
+                p1, p2 = position >> 8, position & 0xff
+            response = self.exchange(0x00, INS_READ_BINARY, p1, p2, "", le)
+            if not response.ok and not (response.sw == 0x6282 and response.data):
+                raise IOError(response.sw, "Error reading binary at offset %d" % position)
+            out += response.data
+            if not response.data or response.sw == 0x6282:
+                # End of file reached
+                break
+        return str(out)
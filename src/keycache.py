@@ -0,0 +1,142 @@
+"""Remembers which Mifare Classic key last opened each sector of a card"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import json
+import threading
+import collections
+
+def _entry(key):
+    """Returns key as a (key, use_b_key) tuple"""
+    if isinstance(key, tuple):
+        return (key[0], bool(key[1]))
+    return (key, False)
+
+class KeyCache(object):
+    """Per-card, per-sector record of the key that last authenticated successfully
+
+       Entries are kept per UID, evicting the least recently used card once
+       max_cards is exceeded.  The last working key for each sector is also
+       kept per card family (any string, such as the ATQA and SAK), so that
+       an unseen card from a known family tries its family's keys first.
+
+       If path is given the cache is loaded from it, and save() writes it back
+       (NFCReader does so when its run() finishes).
+    """
+    def __init__(self, max_cards = 4096, path = None):
+        self.max_cards = max_cards
+        self.path = path
+        self._cards = collections.OrderedDict()
+        self._families = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def candidates(self, uid, sector, keys, family = None):
+        """Returns keys reordered so the keys most likely to work come first
+
+           The key that last opened this sector of this card is first, then the
+           one that last opened it on any card of the same family, then the rest
+           of keys in their original order.  Every entry is a (key, use_b_key) tuple.
+        """
+        result = []
+        with self._lock:
+            card = self._cards.get(uid)
+            if card is not None:
+                # Refresh the card's position in the LRU order
+                del self._cards[uid]
+                self._cards[uid] = card
+                if sector in card:
+                    result.append(card[sector])
+            if family is not None:
+                known = self._families.get(family, {}).get(sector)
+                if known is not None and known not in result:
+                    result.append(known)
+        for key in keys:
+            key = _entry(key)
+            if key not in result:
+                result.append(key)
+        return result
+
+    def remember(self, uid, sector, key, family = None):
+        """Records that key opened sector on the card with the given uid"""
+        key = _entry(key)
+        with self._lock:
+            card = self._cards.pop(uid, None)
+            if card is None:
+                card = {}
+            card[sector] = key
+            self._cards[uid] = card
+            while len(self._cards) > self.max_cards:
+                self._cards.popitem(last = False)
+            if family is not None:
+                self._families.setdefault(family, {})[sector] = key
+
+    def forget(self, uid, sector = None):
+        """Forgets the keys of a whole card, or of just one of its sectors"""
+        with self._lock:
+            if sector is None:
+                self._cards.pop(uid, None)
+            elif uid in self._cards:
+                self._cards[uid].pop(sector, None)
+
+    @staticmethod
+    def _encode(keys):
+        return dict([(str(sector), [key.encode('hex'), use_b]) for sector, (key, use_b) in keys.items()])
+
+    @staticmethod
+    def _decode(keys):
+        return dict([(int(sector), (key.decode('hex'), bool(use_b))) for sector, (key, use_b) in keys.items()])
+
+    def load(self, path = None):
+        """Replaces the cache's contents with those saved at path"""
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to load the key cache from")
+        f = open(path)
+        try:
+            state = json.load(f)
+        finally:
+            f.close()
+        cards = collections.OrderedDict()
+        for uid, keys in state.get('cards', []):
+            cards[str(uid).decode('hex')] = self._decode(keys)
+        families = dict([(str(family), self._decode(keys)) for family, keys in state.get('families', {}).items()])
+        with self._lock:
+            self._cards = cards
+            self._families = families
+
+    def save(self, path = None):
+        """Writes the cache to path, replacing any previous contents atomically"""
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save the key cache to")
+        with self._lock:
+            state = {'cards': [(uid.encode('hex'), self._encode(keys)) for uid, keys in self._cards.items()],
+                     'families': dict([(family, self._encode(keys)) for family, keys in self._families.items()])}
+        tmpname = "%s.%d" % (path, os.getpid())
+        f = open(tmpname, 'w')
+        try:
+            json.dump(state, f)
+        finally:
+            f.close()
+        os.rename(tmpname, path)
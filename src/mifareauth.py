@@ -19,59 +19,88 @@
 
 import time
 import logging
-import ctypes
+import threading
+import collections
 import string
 import nfc
+import pynfc
+import presence
+import cardstore
 
 def hex_dump(string):
     """Dumps data as hexstrings"""
     return ' '.join(["%0.2X" % ord(x) for x in string])
 
+def mifare_sector(block):
+    """Returns the Mifare Classic sector containing block
+
+       The first 32 sectors hold 4 blocks each, the remaining (4K) sectors 16 blocks each.
+    """
+    if block < 128:
+        return block // 4
+    return 32 + (block - 128) // 16
+
+def mifare_sector_blocks(sector):
+    """Returns the blocks of a Mifare Classic sector, the last of which is the sector trailer"""
+    if sector < 32:
+        return range(sector * 4, sector * 4 + 4)
+    return range(128 + (sector - 32) * 16, 128 + (sector - 31) * 16)
+
 ### NFC device setup
 class NFCReader(object):
     MC_AUTH_A = 0x60
     MC_AUTH_B = 0x61
     MC_READ = 0x30
     MC_WRITE = 0xA0
+    DEFAULT_KEY = "\xff\xff\xff\xff\xff\xff"
     card_timeout = 10
+    # Seconds between checks that a card which has been read is still in the field
+    presence_interval = 0.05
+    # Number of cards whose last read contents are remembered for write_card
+    image_cache_size = 64
 
-    def __init__(self, logger):
+    def __init__(self, logger, keys = None, key_cache = None, card_store = None, device = None):
+        """Creates a reader that logs through logger
+
+           device is an open pynfc.Device to read and write cards with outside
+           run(), which opens the first reader it finds instead.
+        """
         self.__context = None
-        self.__device = None
+        self.__device = device
+        self.__presence = None
         self.log = logger
+        self.keys = keys or [self.DEFAULT_KEY]
+        self.key_cache = key_cache
+        self.card_store = card_store
+        self._images = collections.OrderedDict()
 
         self._card_present = False
         self._card_last_seen = None
         self._card_uid = None
         self._clean_card()
+        self.__stopping = False
+        # Guards __stopping and __polling, so stop only aborts a poll that is running
+        self.__lock = threading.Lock()
+        self.__polling = False
 
-        mods = [(nfc.NMT_ISO14443A, nfc.NBR_106)]
-
-        self.__modulations = (nfc.nfc_modulation * len(mods))()
-        for i in range(len(mods)):
-            self.__modulations[i].nmt = mods[i][0]
-            self.__modulations[i].nbr = mods[i][1]
+        self.__modulations = [(nfc.NMT_ISO14443A, nfc.NBR_106)]
 
     def run(self):
         """Starts the looping thread"""
-        self.__context = ctypes.pointer(nfc.nfc_context())
-        nfc.nfc_init(ctypes.byref(self.__context))
         loop = True
         try:
-            self._clean_card()
-            conn_strings = (nfc.nfc_connstring * 10)()
-            devices_found = nfc.nfc_list_devices(self.__context, conn_strings, 10)
-            if devices_found >= 1:
-                self.__device = nfc.nfc_open(self.__context, conn_strings[0])
-                try:
-                    _ = nfc.nfc_initiator_init(self.__device)
-                    while True:
-                        self._poll_loop()
-                finally:
-                    nfc.nfc_close(self.__device)
-            else:
-                self.log("NFC Waiting for device.")
-                time.sleep(5)
+            with pynfc.Context() as self.__context:
+                self._clean_card()
+                conn_strings = self.__context.list_devices(10)
+                if conn_strings:
+                    with self.__context.open(conn_strings[0], self.__modulations) as self.__device:
+                        self.__device.initiator_init()
+                        self.__presence = presence.PresenceTracker(self.__device, self.presence_interval)
+                        while not self.__stopping:
+                            self._poll_loop()
+                else:
+                    self.log("NFC Waiting for device.")
+                    time.sleep(5)
         except (KeyboardInterrupt, SystemExit):
             loop = False
         except IOError, e:
@@ -81,9 +110,26 @@ class NFCReader(object):
         # loop = True
         #    print "[!]", str(e)
         finally:
-            nfc.nfc_exit(self.__context)
+            self._save_key_cache()
             self.log("NFC Clean shutdown called")
-        return loop
+        return loop and not self.__stopping
+
+    def _save_key_cache(self):
+        """Writes the key cache back to its file, if it has one"""
+        if self.key_cache is None or self.key_cache.path is None:
+            return
+        try:
+            self.key_cache.save()
+        except (IOError, OSError), e:
+            self.log("Unable to save the key cache: " + str(e))
+
+    def stop(self):
+        """Stops the reader from another thread, aborting a poll in progress (a read or write is left to finish)"""
+        with self.__lock:
+            self.__stopping = True
+            # Aborting when no poll is running would abort a read or write (or the next command) instead
+            if self.__polling:
+                self.__device.abort()
 
     @staticmethod
     def _sanitize(bytesin):
@@ -96,25 +142,37 @@ class NFCReader(object):
         return "".join([x if x.lower() in 'abcdef0123456789' else '' for x in bytesin])
 
     def _poll_loop(self):
-        """Starts a loop that constantly polls for cards"""
-        nt = nfc.nfc_target()
-        res = nfc.nfc_initiator_poll_target(self.__device, self.__modulations, len(self.__modulations), 10, 2,
-                                            ctypes.byref(nt))
+        """Polls for a card, reads it, and then waits for it to leave the field"""
+        with self.__lock:
+            if self.__stopping:
+                return
+            self.__polling = True
+        try:
+            res = self.__device.poll(10, 2)
+        finally:
+            with self.__lock:
+                self.__polling = False
         # print "RES", res
-        if res < 0:
-            raise IOError("NFC Error whilst polling")
-        elif res >= 1:
-            uid = None
-            if nt.nti.nai.szUidLen == 4:
-                uid = "".join([chr(nt.nti.nai.abtUid[i]) for i in range(4)])
+        if res >= 1:
+            uid = self.__device.uid()
+            if len(uid) != 4:
+                uid = None
+            now = pynfc.monotonic()
             if uid:
                 if not ((self._card_uid and self._card_present and uid == self._card_uid) and \
-                                    time.mktime(time.gmtime()) <= self._card_last_seen + self.card_timeout):
+                                    now <= self._card_last_seen + self.card_timeout):
                     self._setup_device()
                     self.read_card(uid)
             self._card_uid = uid
             self._card_present = True
-            self._card_last_seen = time.mktime(time.gmtime())
+            self._card_last_seen = now
+            if uid and self.__presence.supported:
+                # Watching the card is far cheaper than polling for it again, but
+                # the read may have left it unselected, so select it first
+                if self.__device.select() >= 1 and self.__device.uid() == uid and \
+                        self.__presence.wait_for_removal(stopped = lambda: self.__stopping):
+                    self._card_present = False
+                    self._clean_card()
         else:
             self._card_present = False
             self._clean_card()
@@ -125,73 +183,54 @@ class NFCReader(object):
     def select_card(self):
         """Selects a card after a failed authentication attempt (aborted communications)
 
-           Returns the UID of the card selected
+           Returns the UID of the card selected, or '' if no card answered
         """
-        nt = nfc.nfc_target()
-        _ = nfc.nfc_initiator_select_passive_target(self.__device, self.__modulations[0], None, 0, ctypes.byref(nt))
-        uid = "".join([chr(nt.nti.nai.abtUid[i]) for i in range(nt.nti.nai.szUidLen)])
-        return uid
+        if self.__device.select() < 1:
+            return ''
+        return self.__device.uid()
 
     def _setup_device(self):
         """Sets all the NFC device settings for reading from Mifare cards"""
-        if nfc.nfc_device_set_property_bool(self.__device, nfc.NP_ACTIVATE_CRYPTO1, True) < 0:
-            raise Exception("Error setting Crypto1 enabled")
-        if nfc.nfc_device_set_property_bool(self.__device, nfc.NP_INFINITE_SELECT, False) < 0:
-            raise Exception("Error setting Single Select option")
-        if nfc.nfc_device_set_property_bool(self.__device, nfc.NP_AUTO_ISO14443_4, False) < 0:
-            raise Exception("Error setting No Auto ISO14443-A jiggery pokery")
-        if nfc.nfc_device_set_property_bool(self.__device, nfc.NP_HANDLE_PARITY, True) < 0:
-            raise Exception("Error setting Easy Framing property")
+        # The device skips any property that is already set, so this is cheap for every card after the first
+        self.__device.set_property(nfc.NP_ACTIVATE_CRYPTO1, True)
+        self.__device.set_property(nfc.NP_INFINITE_SELECT, False)
+        self.__device.set_property(nfc.NP_AUTO_ISO14443_4, False)
+        self.__device.set_property(nfc.NP_HANDLE_PARITY, True)
 
     def _read_block(self, block):
         """Reads a block from a Mifare Card after authentication
 
            Returns the data read or raises an exception
         """
-        if nfc.nfc_device_set_property_bool(self.__device, nfc.NP_EASY_FRAMING, True) < 0:
-            raise Exception("Error setting Easy Framing property")
-        abttx = (ctypes.c_uint8 * 2)()
-        abttx[0] = self.MC_READ
-        abttx[1] = block
-        abtrx = (ctypes.c_uint8 * 250)()
-        res = nfc.nfc_initiator_transceive_bytes(self.__device, ctypes.pointer(abttx), len(abttx),
-                                                 ctypes.pointer(abtrx), len(abtrx), 0)
-        if res < 0:
+        self.__device.set_property(nfc.NP_EASY_FRAMING, True)
+        try:
+            return self.__device.transceive(chr(self.MC_READ) + chr(block)).tobytes()
+        except IOError:
             raise IOError("Error reading data")
-        return "".join([chr(abtrx[i]) for i in range(res)])
 
     def __write_block(self, block, data):
         """Writes a block of data to a Mifare Card after authentication
 
            Raises an exception on error
         """
-        if nfc.nfc_device_set_property_bool(self.__device, nfc.NP_EASY_FRAMING, True) < 0:
-            raise Exception("Error setting Easy Framing property")
+        self.__device.set_property(nfc.NP_EASY_FRAMING, True)
         if len(data) > 16:
             raise ValueError("Data value to be written cannot be more than 16 characters.")
-        abttx = (ctypes.c_uint8 * 18)()
-        abttx[0] = self.MC_WRITE
-        abttx[1] = block
-        abtrx = (ctypes.c_uint8 * 250)()
-        for i in range(16):
-            abttx[i + 2] = ord((data + "\x00" * (16 - len(data)))[i])
-        return nfc.nfc_initiator_transceive_bytes(self.__device, ctypes.pointer(abttx), len(abttx),
-                                                  ctypes.pointer(abtrx), len(abtrx), 0)
+        abttx = chr(self.MC_WRITE) + chr(block) + data + "\x00" * (16 - len(data))
+        return self.__device.transceive_into(abttx)
 
     def _authenticate(self, block, uid, key = "\xff\xff\xff\xff\xff\xff", use_b_key = False):
-        """Authenticates to a particular block using a specified key"""
-        if nfc.nfc_device_set_property_bool(self.__device, nfc.NP_EASY_FRAMING, True) < 0:
-            raise Exception("Error setting Easy Framing property")
-        abttx = (ctypes.c_uint8 * 12)()
-        abttx[0] = self.MC_AUTH_A if not use_b_key else self.MC_AUTH_B
-        abttx[1] = block
-        for i in range(6):
-            abttx[i + 2] = ord(key[i])
-        for i in range(4):
-            abttx[i + 8] = ord(uid[i])
-        abtrx = (ctypes.c_uint8 * 250)()
-        return nfc.nfc_initiator_transceive_bytes(self.__device, ctypes.pointer(abttx), len(abttx),
-                                                  ctypes.pointer(abtrx), len(abtrx), 0)
+        """Authenticates to a particular block using a specified key
+
+           The key must be at least 6 bytes and the uid at least 4, raises ValueError otherwise
+        """
+        if len(key) < 6:
+            raise ValueError("Mifare keys are 6 bytes long, got %d" % len(key))
+        if len(uid) < 4:
+            raise ValueError("Mifare authentication needs a UID of at least 4 bytes, got %d" % len(uid))
+        self.__device.set_property(nfc.NP_EASY_FRAMING, True)
+        abttx = chr(self.MC_AUTH_A if not use_b_key else self.MC_AUTH_B) + chr(block) + key[:6] + uid[:4]
+        return self.__device.transceive_into(abttx)
 
     def auth_and_read(self, block, uid, key = "\xff\xff\xff\xff\xff\xff"):
         """Authenticates and then reads a block
@@ -215,20 +254,179 @@ class NFCReader(object):
         self.select_card()
         return ""
 
+    def _card_family(self):
+        """Returns a string identifying the type of the selected card, from its ATQA and SAK"""
+        target = self.__device.decode_target()
+        return "%s:%02x" % (target.atqa.encode('hex'), target.sak)
+
+    def _authenticate_sector(self, sector, uid, keys):
+        """Tries each of keys against a sector until one is accepted
+
+           keys holds either keys, used as A keys, or (key, use_b_key) tuples.
+           The card is reselected after each rejected key, since a failed
+           authentication halts it.  Returns the accepted entry of keys, or None.
+        """
+        block = mifare_sector_blocks(sector)[0]
+        for key in keys:
+            if isinstance(key, tuple):
+                res = self._authenticate(block, uid, key[0], key[1])
+            else:
+                res = self._authenticate(block, uid, key)
+            if res >= 0:
+                return key
+            self.select_card()
+        return None
+
+    def _open_sector(self, sector, uid, keys, family):
+        """Authenticates to a sector, consulting and updating the key cache if there is one"""
+        candidates = keys
+        if self.key_cache is not None:
+            candidates = self.key_cache.candidates(uid, sector, keys, family)
+        key = self._authenticate_sector(sector, uid, candidates)
+        if key is not None and self.key_cache is not None:
+            self.key_cache.remember(uid, sector, key, family)
+        return key
+
+    def _image(self, uid):
+        """Returns the remembered contents of the card with the given uid, as a dictionary of block to data
+
+           Cards not read since the reader started are looked up in the card store, if there is one.
+        """
+        image = self._images.pop(uid, None)
+        if image is None:
+            stored = self.card_store.get(uid) if self.card_store is not None else None
+            image = stored.blocks() if stored is not None else {}
+        self._images[uid] = image
+        while len(self._images) > self.image_cache_size:
+            self._images.popitem(last = False)
+        return image
+
+    def read_blocks(self, uid, blocks, keys = None):
+        """Reads several blocks, authenticating only once for each sector
+
+           The card must already be selected.  keys is a list of candidate keys
+           as taken by _authenticate_sector, defaulting to the reader's keys.
+           If the reader has a key cache, the key that last opened each sector
+           is tried first and the accepted key is remembered.
+           Blocks within a sector are read back to back; the card is only
+           reselected and reauthenticated after a failure.
+
+           Returns a dictionary of block number to data, '' for unreadable blocks
+        """
+        if keys is None:
+            keys = self.keys
+        family = self._card_family() if self.key_cache is not None else None
+        sectors = {}
+        for block in sorted(set(blocks)):
+            sectors.setdefault(mifare_sector(block), []).append(block)
+
+        result = {}
+        image = self._image(uid)
+        for sector in sorted(sectors):
+            key = self._open_sector(sector, uid, keys, family)
+            for block in sectors[sector]:
+                data = ''
+                for _ in range(2):
+                    if key is None:
+                        break
+                    try:
+                        data = self._read_block(block)
+                        break
+                    except IOError:
+                        # The card drops out of the authenticated state on error
+                        self.select_card()
+                        key = self._authenticate_sector(sector, uid, [key])
+                result[block] = data
+                if data:
+                    image[block] = data
+        return result
+
     def read_card(self, uid):
-        """Takes a uid, reads the card and return data for use in writing the card"""
-        key = "\xff\xff\xff\xff\xff\xff"
+        """Takes a uid, reads the card and return data for use in writing the card
+
+           If the reader has a card store, the image read is appended to it, and
+           blocks that changed since the card was last stored are marked with *.
+        """
         print "Reading card", uid.encode("hex")
+        previous = self.card_store.get(uid) if self.card_store is not None else None
         self._card_uid = self.select_card()
-        self._authenticate(0x00, uid, key)
-        block = 0
+        blocks = self.read_blocks(uid, range(64))
+        changed = set(cardstore.diff(previous, blocks)) if previous is not None else set()
         for block in range(64):
-            data = self.auth_and_read(block, uid, key)
-            print block, data.encode("hex"), "".join([ x if x in string.printable else "." for x in data])
+            data = blocks[block]
+            print block, data.encode("hex"), "".join([ x if x in string.printable else "." for x in data]), \
+                "*" if block in changed else ""
+        if self.card_store is not None:
+            self.card_store.append(uid, cardstore.CLASSIC_1K, blocks)
+        return blocks
+
+    def write_card(self, uid, data, keys = None, write_trailers = False, verify = False):
+        """Accepts data of the recently read card with UID uid, and writes any changes necessary to it
+
+           data is either a dictionary of block number to data, as returned by
+           read_card, or the whole card image as a single string.  Every block
+           must be given as 16 bytes, or as '' (as read_card reports unreadable
+           blocks) to leave it alone.  Only blocks that were read from the card
+           and differ from that read are written, grouped so that each sector
+           is authenticated once.  Block 0 is never written, and sector
+           trailers are skipped unless write_trailers is set.  With verify set,
+           each written data block is read back and compared.
 
-    def write_card(self, uid, data):
-        """Accepts data of the recently read card with UID uid, and writes any changes necessary to it"""
-        raise NotImplementedError
+           Returns the list of blocks written, or raises IOError naming the
+           blocks that could not be written (the others are still written).
+           Raises ValueError, before writing anything, if a block is not 16 bytes.
+        """
+        if keys is None:
+            keys = self.keys
+        if isinstance(data, basestring):
+            data = dict([(i // 16, data[i:i + 16]) for i in range(0, len(data), 16)])
+        for block in sorted(data):
+            if len(data[block]) not in (0, 16):
+                raise ValueError("Block %d is %d bytes long, blocks are written 16 bytes at a time" % (block, len(data[block])))
+        image = self._image(uid)
+
+        sectors = {}
+        for block in sorted(data):
+            value = data[block]
+            # Blocks that were never read (or could not be) have nothing to compare against
+            if block == 0 or not value or not image.get(block) or value == image[block]:
+                continue
+            trailer = block == mifare_sector_blocks(mifare_sector(block))[-1]
+            if trailer and not write_trailers:
+                continue
+            sectors.setdefault(mifare_sector(block), []).append((block, value, trailer))
+        if not sectors:
+            return []
+
+        self.select_card()
+        family = self._card_family() if self.key_cache is not None else None
+        written, failed = [], []
+        for sector in sorted(sectors):
+            key = self._open_sector(sector, uid, keys, family)
+            for block, value, trailer in sectors[sector]:
+                ok = False
+                for _ in range(2):
+                    if key is None:
+                        break
+                    try:
+                        ok = self.__write_block(block, value) >= 0
+                        if ok and verify and not trailer:
+                            ok = self._read_block(block) == value
+                    except IOError:
+                        ok = False
+                    if ok:
+                        break
+                    # The card drops out of the authenticated state on error
+                    self.select_card()
+                    key = self._authenticate_sector(sector, uid, [key])
+                if ok:
+                    written.append(block)
+                    image[block] = value
+                else:
+                    failed.append(block)
+        if failed:
+            raise IOError("Error writing blocks %s" % ", ".join([str(block) for block in failed]))
+        return written
 
 if __name__ == '__main__':
     logger = logging.getLogger("cardhandler").info
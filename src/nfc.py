@@ -302,9 +302,43 @@ class _variadic_function(object):
 
 # End preamble
 
-_libs = {}
+class _LibraryTable(dict):
+    """Loads each library the first time it is looked up, rather than at import"""
+    def __missing__(self, libname):
+        lib = self[libname] = load_library(libname)
+        return lib
+
+_libs = _LibraryTable()
 _libdirs = []
 
+# Function prototypes, bound to the library on first attribute access
+_prototypes = {}
+
+# Called with the name and function each time a function is bound, each
+# returning the function to use in its place (nfcstats wraps them this way)
+_bind_hooks = []
+
+def _prototype(libname, name, argtypes, restype, errcheck = None):
+    _prototypes[name] = (libname, argtypes, restype, errcheck)
+
+def _bind(name):
+    """Looks up a prototyped function in its library and sets its argument and return types
+
+       Raises AttributeError if the function is unknown or not exported by the library
+    """
+    if name not in _prototypes:
+        raise AttributeError("'module' object has no attribute '%s'" % name)
+    libname, argtypes, restype, errcheck = _prototypes[name]
+    func = getattr(_libs[libname], name)
+    func.argtypes = argtypes
+    if errcheck is not None and sizeof(c_int) == sizeof(c_void_p):
+        func.restype = errcheck
+    else:
+        func.restype = restype
+        if errcheck is not None:
+            func.errcheck = errcheck
+    return func
+
 # Begin loader
 
 # ----------------------------------------------------------------------------
@@ -454,6 +488,100 @@ class DarwinLibraryLoader(LibraryLoader):
 class PosixLibraryLoader(LibraryLoader):
     _ld_so_cache = None
 
+    # Sonames that the dynamic linker can resolve directly from ld.so.cache,
+    # tried before any directory scanning takes place
+    name_formats = ["lib%s.so"]
+    sonames = {"nfc": ["libnfc.so.5"]}
+
+    ld_so_cache_path = "/etc/ld.so.cache"
+
+    def load_library(self, libname):
+        """Given the name of a library, load it.
+
+           Resolution is tried in order of cost: the path remembered from a
+           previous run, the bare sonames (resolved by the dynamic linker),
+           and only then the slow directory scan and ldconfig lookup.
+        """
+        if os.path.isabs(libname):
+            return LibraryLoader.load_library(self, libname)
+
+        key = self._resolve_cache_key()
+        path = self._read_resolve_cache(libname, key)
+        if path:
+            try:
+                return self.load(path)
+            except ImportError:
+                pass
+
+        for name in self.sonames.get(libname, []) + [fmt % libname for fmt in self.name_formats]:
+            try:
+                result = self.load(name)
+            except ImportError:
+                continue
+            self._write_resolve_cache(libname, key, name)
+            return result
+
+        for path in self.getpaths(libname):
+            if os.path.exists(path):
+                result = self.load(path)
+                self._write_resolve_cache(libname, key, path)
+                return result
+
+        raise ImportError("%s not found." % libname)
+
+    def _resolve_cache_file(self, libname):
+        """Returns the file used to remember where libname was found, or None if disabled"""
+        cache_dir = os.environ.get("PYNFC_LIBCACHE")
+        if cache_dir is None:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+            cache_dir = os.path.join(cache_home, "pynfc")
+        if not cache_dir:
+            return None
+        return os.path.join(cache_dir, "lib%s.path" % libname)
+
+    def _resolve_cache_key(self):
+        """Returns a key that changes whenever the linker's view of the system may have changed"""
+        try:
+            mtime = os.stat(self.ld_so_cache_path).st_mtime
+        except OSError:
+            mtime = 0
+        return "%r:%s" % (mtime, os.environ.get("LD_LIBRARY_PATH", ""))
+
+    def _read_resolve_cache(self, libname, key):
+        filename = self._resolve_cache_file(libname)
+        if filename is None:
+            return None
+        try:
+            f = open(filename)
+            try:
+                lines = f.read().splitlines()
+            finally:
+                f.close()
+        except IOError:
+            return None
+        if len(lines) == 2 and lines[0] == key:
+            return lines[1]
+        return None
+
+    def _write_resolve_cache(self, libname, key, path):
+        filename = self._resolve_cache_file(libname)
+        if filename is None:
+            return
+        # The cache is purely an optimization, so read-only or missing
+        # home directories must never stop the library from loading
+        try:
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            tmpname = "%s.%d" % (filename, os.getpid())
+            f = open(tmpname, "w")
+            try:
+                f.write("%s\n%s\n" % (key, path))
+            finally:
+                f.close()
+            os.rename(tmpname, filename)
+        except (IOError, OSError):
+            pass
+
     def _create_ld_so_cache(self):
         # Recreate search path followed by ld.so.  This is going to be
         # slow to build, and incorrect (ld.so uses ld.so.cache, which may
@@ -604,7 +732,7 @@ add_library_search_dirs([])
 
 # Begin libraries
 
-_libs["nfc"] = load_library("nfc")
+# Loaded on first use by _LibraryTable
 
 # 1 libraries
 # End libraries
@@ -933,298 +1061,139 @@ struct_anon_33._fields_ = [
 nfc_target = struct_anon_33 # /usr/include/nfc/nfc-types.h: 326
 
 # /usr/include/nfc/nfc.h: 80
-if hasattr(_libs['nfc'], 'nfc_init'):
-    nfc_init = _libs['nfc'].nfc_init
-    nfc_init.argtypes = [POINTER(POINTER(nfc_context))]
-    nfc_init.restype = None
+_prototype('nfc', 'nfc_init', [POINTER(POINTER(nfc_context))], None)
 
 # /usr/include/nfc/nfc.h: 81
-if hasattr(_libs['nfc'], 'nfc_exit'):
-    nfc_exit = _libs['nfc'].nfc_exit
-    nfc_exit.argtypes = [POINTER(nfc_context)]
-    nfc_exit.restype = None
+_prototype('nfc', 'nfc_exit', [POINTER(nfc_context)], None)
 
 # /usr/include/nfc/nfc.h: 82
-if hasattr(_libs['nfc'], 'nfc_register_driver'):
-    nfc_register_driver = _libs['nfc'].nfc_register_driver
-    nfc_register_driver.argtypes = [POINTER(nfc_driver)]
-    nfc_register_driver.restype = c_int
+_prototype('nfc', 'nfc_register_driver', [POINTER(nfc_driver)], c_int)
 
 # /usr/include/nfc/nfc.h: 85
-if hasattr(_libs['nfc'], 'nfc_open'):
-    nfc_open = _libs['nfc'].nfc_open
-    nfc_open.argtypes = [POINTER(nfc_context), nfc_connstring]
-    nfc_open.restype = POINTER(nfc_device)
+_prototype('nfc', 'nfc_open', [POINTER(nfc_context), nfc_connstring], POINTER(nfc_device))
 
 # /usr/include/nfc/nfc.h: 86
-if hasattr(_libs['nfc'], 'nfc_close'):
-    nfc_close = _libs['nfc'].nfc_close
-    nfc_close.argtypes = [POINTER(nfc_device)]
-    nfc_close.restype = None
+_prototype('nfc', 'nfc_close', [POINTER(nfc_device)], None)
 
 # /usr/include/nfc/nfc.h: 87
-if hasattr(_libs['nfc'], 'nfc_abort_command'):
-    nfc_abort_command = _libs['nfc'].nfc_abort_command
-    nfc_abort_command.argtypes = [POINTER(nfc_device)]
-    nfc_abort_command.restype = c_int
+_prototype('nfc', 'nfc_abort_command', [POINTER(nfc_device)], c_int)
 
 # /usr/include/nfc/nfc.h: 88
-if hasattr(_libs['nfc'], 'nfc_list_devices'):
-    nfc_list_devices = _libs['nfc'].nfc_list_devices
-    nfc_list_devices.argtypes = [POINTER(nfc_context), POINTER(nfc_connstring), c_size_t]
-    nfc_list_devices.restype = c_size_t
+_prototype('nfc', 'nfc_list_devices', [POINTER(nfc_context), POINTER(nfc_connstring), c_size_t], c_size_t)
 
 # /usr/include/nfc/nfc.h: 89
-if hasattr(_libs['nfc'], 'nfc_idle'):
-    nfc_idle = _libs['nfc'].nfc_idle
-    nfc_idle.argtypes = [POINTER(nfc_device)]
-    nfc_idle.restype = c_int
+_prototype('nfc', 'nfc_idle', [POINTER(nfc_device)], c_int)
 
 # /usr/include/nfc/nfc.h: 92
-if hasattr(_libs['nfc'], 'nfc_initiator_init'):
-    nfc_initiator_init = _libs['nfc'].nfc_initiator_init
-    nfc_initiator_init.argtypes = [POINTER(nfc_device)]
-    nfc_initiator_init.restype = c_int
+_prototype('nfc', 'nfc_initiator_init', [POINTER(nfc_device)], c_int)
 
 # /usr/include/nfc/nfc.h: 93
-if hasattr(_libs['nfc'], 'nfc_initiator_init_secure_element'):
-    nfc_initiator_init_secure_element = _libs['nfc'].nfc_initiator_init_secure_element
-    nfc_initiator_init_secure_element.argtypes = [POINTER(nfc_device)]
-    nfc_initiator_init_secure_element.restype = c_int
+_prototype('nfc', 'nfc_initiator_init_secure_element', [POINTER(nfc_device)], c_int)
 
 # /usr/include/nfc/nfc.h: 94
-if hasattr(_libs['nfc'], 'nfc_initiator_select_passive_target'):
-    nfc_initiator_select_passive_target = _libs['nfc'].nfc_initiator_select_passive_target
-    nfc_initiator_select_passive_target.argtypes = [POINTER(nfc_device), nfc_modulation, POINTER(c_uint8), c_size_t, POINTER(nfc_target)]
-    nfc_initiator_select_passive_target.restype = c_int
+_prototype('nfc', 'nfc_initiator_select_passive_target', [POINTER(nfc_device), nfc_modulation, POINTER(c_uint8), c_size_t, POINTER(nfc_target)], c_int)
 
 # /usr/include/nfc/nfc.h: 95
-if hasattr(_libs['nfc'], 'nfc_initiator_list_passive_targets'):
-    nfc_initiator_list_passive_targets = _libs['nfc'].nfc_initiator_list_passive_targets
-    nfc_initiator_list_passive_targets.argtypes = [POINTER(nfc_device), nfc_modulation, POINTER(nfc_target), c_size_t]
-    nfc_initiator_list_passive_targets.restype = c_int
+_prototype('nfc', 'nfc_initiator_list_passive_targets', [POINTER(nfc_device), nfc_modulation, POINTER(nfc_target), c_size_t], c_int)
 
 # /usr/include/nfc/nfc.h: 96
-if hasattr(_libs['nfc'], 'nfc_initiator_poll_target'):
-    nfc_initiator_poll_target = _libs['nfc'].nfc_initiator_poll_target
-    nfc_initiator_poll_target.argtypes = [POINTER(nfc_device), POINTER(nfc_modulation), c_size_t, c_uint8, c_uint8, POINTER(nfc_target)]
-    nfc_initiator_poll_target.restype = c_int
+_prototype('nfc', 'nfc_initiator_poll_target', [POINTER(nfc_device), POINTER(nfc_modulation), c_size_t, c_uint8, c_uint8, POINTER(nfc_target)], c_int)
 
 # /usr/include/nfc/nfc.h: 97
-if hasattr(_libs['nfc'], 'nfc_initiator_select_dep_target'):
-    nfc_initiator_select_dep_target = _libs['nfc'].nfc_initiator_select_dep_target
-    nfc_initiator_select_dep_target.argtypes = [POINTER(nfc_device), nfc_dep_mode, nfc_baud_rate, POINTER(nfc_dep_info), POINTER(nfc_target), c_int]
-    nfc_initiator_select_dep_target.restype = c_int
+_prototype('nfc', 'nfc_initiator_select_dep_target', [POINTER(nfc_device), nfc_dep_mode, nfc_baud_rate, POINTER(nfc_dep_info), POINTER(nfc_target), c_int], c_int)
 
 # /usr/include/nfc/nfc.h: 98
-if hasattr(_libs['nfc'], 'nfc_initiator_poll_dep_target'):
-    nfc_initiator_poll_dep_target = _libs['nfc'].nfc_initiator_poll_dep_target
-    nfc_initiator_poll_dep_target.argtypes = [POINTER(nfc_device), nfc_dep_mode, nfc_baud_rate, POINTER(nfc_dep_info), POINTER(nfc_target), c_int]
-    nfc_initiator_poll_dep_target.restype = c_int
+_prototype('nfc', 'nfc_initiator_poll_dep_target', [POINTER(nfc_device), nfc_dep_mode, nfc_baud_rate, POINTER(nfc_dep_info), POINTER(nfc_target), c_int], c_int)
 
 # /usr/include/nfc/nfc.h: 99
-if hasattr(_libs['nfc'], 'nfc_initiator_deselect_target'):
-    nfc_initiator_deselect_target = _libs['nfc'].nfc_initiator_deselect_target
-    nfc_initiator_deselect_target.argtypes = [POINTER(nfc_device)]
-    nfc_initiator_deselect_target.restype = c_int
+_prototype('nfc', 'nfc_initiator_deselect_target', [POINTER(nfc_device)], c_int)
 
 # /usr/include/nfc/nfc.h: 100
-if hasattr(_libs['nfc'], 'nfc_initiator_transceive_bytes'):
-    nfc_initiator_transceive_bytes = _libs['nfc'].nfc_initiator_transceive_bytes
-    nfc_initiator_transceive_bytes.argtypes = [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8), c_size_t, c_int]
-    nfc_initiator_transceive_bytes.restype = c_int
+_prototype('nfc', 'nfc_initiator_transceive_bytes', [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8), c_size_t, c_int], c_int)
 
 # /usr/include/nfc/nfc.h: 101
-if hasattr(_libs['nfc'], 'nfc_initiator_transceive_bits'):
-    nfc_initiator_transceive_bits = _libs['nfc'].nfc_initiator_transceive_bits
-    nfc_initiator_transceive_bits.argtypes = [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8), POINTER(c_uint8), c_size_t, POINTER(c_uint8)]
-    nfc_initiator_transceive_bits.restype = c_int
+_prototype('nfc', 'nfc_initiator_transceive_bits', [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8), POINTER(c_uint8), c_size_t, POINTER(c_uint8)], c_int)
 
 # /usr/include/nfc/nfc.h: 102
-if hasattr(_libs['nfc'], 'nfc_initiator_transceive_bytes_timed'):
-    nfc_initiator_transceive_bytes_timed = _libs['nfc'].nfc_initiator_transceive_bytes_timed
-    nfc_initiator_transceive_bytes_timed.argtypes = [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8), c_size_t, POINTER(c_uint32)]
-    nfc_initiator_transceive_bytes_timed.restype = c_int
+_prototype('nfc', 'nfc_initiator_transceive_bytes_timed', [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8), c_size_t, POINTER(c_uint32)], c_int)
 
 # /usr/include/nfc/nfc.h: 103
-if hasattr(_libs['nfc'], 'nfc_initiator_transceive_bits_timed'):
-    nfc_initiator_transceive_bits_timed = _libs['nfc'].nfc_initiator_transceive_bits_timed
-    nfc_initiator_transceive_bits_timed.argtypes = [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8), POINTER(c_uint8), c_size_t, POINTER(c_uint8), POINTER(c_uint32)]
-    nfc_initiator_transceive_bits_timed.restype = c_int
+_prototype('nfc', 'nfc_initiator_transceive_bits_timed', [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8), POINTER(c_uint8), c_size_t, POINTER(c_uint8), POINTER(c_uint32)], c_int)
 
 # /usr/include/nfc/nfc.h: 104
-if hasattr(_libs['nfc'], 'nfc_initiator_target_is_present'):
-    nfc_initiator_target_is_present = _libs['nfc'].nfc_initiator_target_is_present
-    nfc_initiator_target_is_present.argtypes = [POINTER(nfc_device), nfc_target]
-    nfc_initiator_target_is_present.restype = c_int
+_prototype('nfc', 'nfc_initiator_target_is_present', [POINTER(nfc_device), nfc_target], c_int)
 
 # /usr/include/nfc/nfc.h: 107
-if hasattr(_libs['nfc'], 'nfc_target_init'):
-    nfc_target_init = _libs['nfc'].nfc_target_init
-    nfc_target_init.argtypes = [POINTER(nfc_device), POINTER(nfc_target), POINTER(c_uint8), c_size_t, c_int]
-    nfc_target_init.restype = c_int
+_prototype('nfc', 'nfc_target_init', [POINTER(nfc_device), POINTER(nfc_target), POINTER(c_uint8), c_size_t, c_int], c_int)
 
 # /usr/include/nfc/nfc.h: 108
-if hasattr(_libs['nfc'], 'nfc_target_send_bytes'):
-    nfc_target_send_bytes = _libs['nfc'].nfc_target_send_bytes
-    nfc_target_send_bytes.argtypes = [POINTER(nfc_device), POINTER(c_uint8), c_size_t, c_int]
-    nfc_target_send_bytes.restype = c_int
+_prototype('nfc', 'nfc_target_send_bytes', [POINTER(nfc_device), POINTER(c_uint8), c_size_t, c_int], c_int)
 
 # /usr/include/nfc/nfc.h: 109
-if hasattr(_libs['nfc'], 'nfc_target_receive_bytes'):
-    nfc_target_receive_bytes = _libs['nfc'].nfc_target_receive_bytes
-    nfc_target_receive_bytes.argtypes = [POINTER(nfc_device), POINTER(c_uint8), c_size_t, c_int]
-    nfc_target_receive_bytes.restype = c_int
+_prototype('nfc', 'nfc_target_receive_bytes', [POINTER(nfc_device), POINTER(c_uint8), c_size_t, c_int], c_int)
 
 # /usr/include/nfc/nfc.h: 110
-if hasattr(_libs['nfc'], 'nfc_target_send_bits'):
-    nfc_target_send_bits = _libs['nfc'].nfc_target_send_bits
-    nfc_target_send_bits.argtypes = [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8)]
-    nfc_target_send_bits.restype = c_int
+_prototype('nfc', 'nfc_target_send_bits', [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8)], c_int)
 
 # /usr/include/nfc/nfc.h: 111
-if hasattr(_libs['nfc'], 'nfc_target_receive_bits'):
-    nfc_target_receive_bits = _libs['nfc'].nfc_target_receive_bits
-    nfc_target_receive_bits.argtypes = [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8)]
-    nfc_target_receive_bits.restype = c_int
+_prototype('nfc', 'nfc_target_receive_bits', [POINTER(nfc_device), POINTER(c_uint8), c_size_t, POINTER(c_uint8)], c_int)
 
 # /usr/include/nfc/nfc.h: 114
-if hasattr(_libs['nfc'], 'nfc_strerror'):
-    nfc_strerror = _libs['nfc'].nfc_strerror
-    nfc_strerror.argtypes = [POINTER(nfc_device)]
-    if sizeof(c_int) == sizeof(c_void_p):
-        nfc_strerror.restype = ReturnString
-    else:
-        nfc_strerror.restype = String
-        nfc_strerror.errcheck = ReturnString
+_prototype('nfc', 'nfc_strerror', [POINTER(nfc_device)], String, ReturnString)
 
 # /usr/include/nfc/nfc.h: 115
-if hasattr(_libs['nfc'], 'nfc_strerror_r'):
-    nfc_strerror_r = _libs['nfc'].nfc_strerror_r
-    nfc_strerror_r.argtypes = [POINTER(nfc_device), String, c_size_t]
-    nfc_strerror_r.restype = c_int
+_prototype('nfc', 'nfc_strerror_r', [POINTER(nfc_device), String, c_size_t], c_int)
 
 # /usr/include/nfc/nfc.h: 116
-if hasattr(_libs['nfc'], 'nfc_perror'):
-    nfc_perror = _libs['nfc'].nfc_perror
-    nfc_perror.argtypes = [POINTER(nfc_device), String]
-    nfc_perror.restype = None
+_prototype('nfc', 'nfc_perror', [POINTER(nfc_device), String], None)
 
 # /usr/include/nfc/nfc.h: 117
-if hasattr(_libs['nfc'], 'nfc_device_get_last_error'):
-    nfc_device_get_last_error = _libs['nfc'].nfc_device_get_last_error
-    nfc_device_get_last_error.argtypes = [POINTER(nfc_device)]
-    nfc_device_get_last_error.restype = c_int
+_prototype('nfc', 'nfc_device_get_last_error', [POINTER(nfc_device)], c_int)
 
 # /usr/include/nfc/nfc.h: 120
-if hasattr(_libs['nfc'], 'nfc_device_get_name'):
-    nfc_device_get_name = _libs['nfc'].nfc_device_get_name
-    nfc_device_get_name.argtypes = [POINTER(nfc_device)]
-    if sizeof(c_int) == sizeof(c_void_p):
-        nfc_device_get_name.restype = ReturnString
-    else:
-        nfc_device_get_name.restype = String
-        nfc_device_get_name.errcheck = ReturnString
+_prototype('nfc', 'nfc_device_get_name', [POINTER(nfc_device)], String, ReturnString)
 
 # /usr/include/nfc/nfc.h: 121
-if hasattr(_libs['nfc'], 'nfc_device_get_connstring'):
-    nfc_device_get_connstring = _libs['nfc'].nfc_device_get_connstring
-    nfc_device_get_connstring.argtypes = [POINTER(nfc_device)]
-    if sizeof(c_int) == sizeof(c_void_p):
-        nfc_device_get_connstring.restype = ReturnString
-    else:
-        nfc_device_get_connstring.restype = String
-        nfc_device_get_connstring.errcheck = ReturnString
+_prototype('nfc', 'nfc_device_get_connstring', [POINTER(nfc_device)], String, ReturnString)
 
 # /usr/include/nfc/nfc.h: 122
-if hasattr(_libs['nfc'], 'nfc_device_get_supported_modulation'):
-    nfc_device_get_supported_modulation = _libs['nfc'].nfc_device_get_supported_modulation
-    nfc_device_get_supported_modulation.argtypes = [POINTER(nfc_device), nfc_mode, POINTER(POINTER(nfc_modulation_type))]
-    nfc_device_get_supported_modulation.restype = c_int
+_prototype('nfc', 'nfc_device_get_supported_modulation', [POINTER(nfc_device), nfc_mode, POINTER(POINTER(nfc_modulation_type))], c_int)
 
 # /usr/include/nfc/nfc.h: 123
-if hasattr(_libs['nfc'], 'nfc_device_get_supported_baud_rate'):
-    nfc_device_get_supported_baud_rate = _libs['nfc'].nfc_device_get_supported_baud_rate
-    nfc_device_get_supported_baud_rate.argtypes = [POINTER(nfc_device), nfc_modulation_type, POINTER(POINTER(nfc_baud_rate))]
-    nfc_device_get_supported_baud_rate.restype = c_int
+_prototype('nfc', 'nfc_device_get_supported_baud_rate', [POINTER(nfc_device), nfc_modulation_type, POINTER(POINTER(nfc_baud_rate))], c_int)
 
 # /usr/include/nfc/nfc.h: 126
-if hasattr(_libs['nfc'], 'nfc_device_set_property_int'):
-    nfc_device_set_property_int = _libs['nfc'].nfc_device_set_property_int
-    nfc_device_set_property_int.argtypes = [POINTER(nfc_device), nfc_property, c_int]
-    nfc_device_set_property_int.restype = c_int
+_prototype('nfc', 'nfc_device_set_property_int', [POINTER(nfc_device), nfc_property, c_int], c_int)
 
 # /usr/include/nfc/nfc.h: 127
-if hasattr(_libs['nfc'], 'nfc_device_set_property_bool'):
-    nfc_device_set_property_bool = _libs['nfc'].nfc_device_set_property_bool
-    nfc_device_set_property_bool.argtypes = [POINTER(nfc_device), nfc_property, c_uint8]
-    nfc_device_set_property_bool.restype = c_int
+_prototype('nfc', 'nfc_device_set_property_bool', [POINTER(nfc_device), nfc_property, c_uint8], c_int)
 
 # /usr/include/nfc/nfc.h: 130
-if hasattr(_libs['nfc'], 'iso14443a_crc'):
-    iso14443a_crc = _libs['nfc'].iso14443a_crc
-    iso14443a_crc.argtypes = [POINTER(c_uint8), c_size_t, POINTER(c_uint8)]
-    iso14443a_crc.restype = None
+_prototype('nfc', 'iso14443a_crc', [POINTER(c_uint8), c_size_t, POINTER(c_uint8)], None)
 
 # /usr/include/nfc/nfc.h: 131
-if hasattr(_libs['nfc'], 'iso14443a_crc_append'):
-    iso14443a_crc_append = _libs['nfc'].iso14443a_crc_append
-    iso14443a_crc_append.argtypes = [POINTER(c_uint8), c_size_t]
-    iso14443a_crc_append.restype = None
+_prototype('nfc', 'iso14443a_crc_append', [POINTER(c_uint8), c_size_t], None)
 
 # /usr/include/nfc/nfc.h: 132
-if hasattr(_libs['nfc'], 'iso14443a_locate_historical_bytes'):
-    iso14443a_locate_historical_bytes = _libs['nfc'].iso14443a_locate_historical_bytes
-    iso14443a_locate_historical_bytes.argtypes = [POINTER(c_uint8), c_size_t, POINTER(c_size_t)]
-    iso14443a_locate_historical_bytes.restype = POINTER(c_uint8)
+_prototype('nfc', 'iso14443a_locate_historical_bytes', [POINTER(c_uint8), c_size_t, POINTER(c_size_t)], POINTER(c_uint8))
 
 # /usr/include/nfc/nfc.h: 134
-if hasattr(_libs['nfc'], 'nfc_free'):
-    nfc_free = _libs['nfc'].nfc_free
-    nfc_free.argtypes = [POINTER(None)]
-    nfc_free.restype = None
+_prototype('nfc', 'nfc_free', [POINTER(None)], None)
 
 # /usr/include/nfc/nfc.h: 135
-if hasattr(_libs['nfc'], 'nfc_version'):
-    nfc_version = _libs['nfc'].nfc_version
-    nfc_version.argtypes = []
-    if sizeof(c_int) == sizeof(c_void_p):
-        nfc_version.restype = ReturnString
-    else:
-        nfc_version.restype = String
-        nfc_version.errcheck = ReturnString
+_prototype('nfc', 'nfc_version', [], String, ReturnString)
 
 # /usr/include/nfc/nfc.h: 136
-if hasattr(_libs['nfc'], 'nfc_device_get_information_about'):
-    nfc_device_get_information_about = _libs['nfc'].nfc_device_get_information_about
-    nfc_device_get_information_about.argtypes = [POINTER(nfc_device), POINTER(POINTER(c_char))]
-    nfc_device_get_information_about.restype = c_int
+_prototype('nfc', 'nfc_device_get_information_about', [POINTER(nfc_device), POINTER(POINTER(c_char))], c_int)
 
 # /usr/include/nfc/nfc.h: 139
-if hasattr(_libs['nfc'], 'str_nfc_modulation_type'):
-    str_nfc_modulation_type = _libs['nfc'].str_nfc_modulation_type
-    str_nfc_modulation_type.argtypes = [nfc_modulation_type]
-    if sizeof(c_int) == sizeof(c_void_p):
-        str_nfc_modulation_type.restype = ReturnString
-    else:
-        str_nfc_modulation_type.restype = String
-        str_nfc_modulation_type.errcheck = ReturnString
+_prototype('nfc', 'str_nfc_modulation_type', [nfc_modulation_type], String, ReturnString)
 
 # /usr/include/nfc/nfc.h: 140
-if hasattr(_libs['nfc'], 'str_nfc_baud_rate'):
-    str_nfc_baud_rate = _libs['nfc'].str_nfc_baud_rate
-    str_nfc_baud_rate.argtypes = [nfc_baud_rate]
-    if sizeof(c_int) == sizeof(c_void_p):
-        str_nfc_baud_rate.restype = ReturnString
-    else:
-        str_nfc_baud_rate.restype = String
-        str_nfc_baud_rate.errcheck = ReturnString
+_prototype('nfc', 'str_nfc_baud_rate', [nfc_baud_rate], String, ReturnString)
 
 # /usr/include/nfc/nfc.h: 141
-if hasattr(_libs['nfc'], 'str_nfc_target'):
-    str_nfc_target = _libs['nfc'].str_nfc_target
-    str_nfc_target.argtypes = [POINTER(POINTER(c_char)), nfc_target, c_uint8]
-    str_nfc_target.restype = c_int
+_prototype('nfc', 'str_nfc_target', [POINTER(POINTER(c_char)), nfc_target, c_uint8], c_int)
 
 # /usr/include/nfc/nfc-emulation.h: 43
 class struct_nfc_emulator(Structure):
@@ -1255,10 +1224,7 @@ struct_nfc_emulation_state_machine._fields_ = [
 ]
 
 # /usr/include/nfc/nfc-emulation.h: 58
-if hasattr(_libs['nfc'], 'nfc_emulate_target'):
-    nfc_emulate_target = _libs['nfc'].nfc_emulate_target
-    nfc_emulate_target.argtypes = [POINTER(nfc_device), POINTER(struct_nfc_emulator), c_int]
-    nfc_emulate_target.restype = c_int
+_prototype('nfc', 'nfc_emulate_target', [POINTER(nfc_device), POINTER(struct_nfc_emulator), c_int], c_int)
 
 # /usr/include/nfc/nfc-types.h: 36
 try:
@@ -1366,3 +1332,45 @@ nfc_emulation_state_machine = struct_nfc_emulation_state_machine # /usr/include/
 
 # No inserted files
 
+def bind_all():
+    """Binds every prototyped function immediately rather than on first use
+
+       Returns the names of the functions the library does not export
+    """
+    module = sys.modules[__name__]
+    missing = []
+    for name in sorted(_prototypes):
+        try:
+            getattr(module, name)
+        except AttributeError:
+            missing.append(name)
+    return missing
+
+import types
+
+class _LazyModule(types.ModuleType):
+    """Module proxy that binds library functions on first attribute access
+
+       Binding every function at import costs a symbol lookup and prototype
+       setup per function, which short-lived tools that only use one or two
+       calls should not have to pay.
+    """
+    def __init__(self, module):
+        types.ModuleType.__init__(self, module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # Python 2 clears a module's globals once the module object is
+        # freed, so the original must outlive the proxy
+        self.__dict__['_module'] = module
+
+    def __getattr__(self, name):
+        func = _bind(name)
+        for hook in list(_bind_hooks):
+            func = hook(name, func)
+        setattr(self, name, func)
+        return func
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_prototypes))
+
+sys.modules[__name__] = _LazyModule(sys.modules[__name__])
+
@@ -0,0 +1,158 @@
+"""Asyncio interface for polling and exchanging frames with NFC readers"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import trollius as asyncio
+
+from poller import PollEvent
+
+class StopArrivals(Exception):
+    """Raised by TagArrivals.next_arrival once the AsyncDevice is closed"""
+
+class _Call(object):
+    """Tracks whether a call handed to the executor has been cancelled
+
+       ended is the exception raised if the call is cancelled, or the device
+       closed, before it produces a result.
+    """
+    __slots__ = ['cancelled', 'ended']
+
+    def __init__(self, ended):
+        self.cancelled = False
+        self.ended = ended
+
+class AsyncDevice(object):
+    """Runs the blocking calls of a pynfc.Device on a dedicated thread and returns asyncio futures
+
+       Every method returns a future that can be awaited (or yielded from).
+       Cancelling a future whose call is already running calls nfc_abort_command,
+       so the hardware wait really ends rather than leaving the thread blocked.
+
+       The futures belong to loop, or if it is not given, to the current event loop.
+    """
+    def __init__(self, device, loop = None):
+        self.device = device
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        # One thread per device: libnfc devices must not be used concurrently
+        self._executor = ThreadPoolExecutor(1)
+        self._lock = threading.Lock()
+        self._active = None
+        self.closed = False
+
+    def _submit(self, func, *args, **kwargs):
+        call = _Call(kwargs.get('ended', asyncio.CancelledError))
+        future = self.loop.run_in_executor(self._executor, self._run, call, func, args)
+        future.add_done_callback(lambda f: f.cancelled() and self._cancel(call))
+        return future
+
+    def _run(self, call, func, args):
+        with self._lock:
+            if call.cancelled or self.closed:
+                raise call.ended()
+            self._active = call
+        try:
+            return func(call, *args)
+        finally:
+            with self._lock:
+                self._active = None
+
+    def _cancel(self, call):
+        with self._lock:
+            call.cancelled = True
+            # Aborting when nothing is running would abort the next command instead
+            if self._active is call:
+                self.device.abort()
+
+    def _poll(self, call, poll_nr, period):
+        try:
+            if self.device.poll(poll_nr, period) < 1:
+                return None
+        except IOError:
+            if call.cancelled:
+                raise call.ended()
+            raise
+        return self.device.decode_target()
+
+    def _transceive(self, call, tx, timeout):
+        return self.device.transceive(tx, timeout).tobytes()
+
+    def _wait_for_arrival(self, call, arrivals):
+        while not call.cancelled:
+            try:
+                res = self.device.poll(arrivals.poll_nr, arrivals.period)
+            except IOError:
+                if call.cancelled:
+                    raise call.ended()
+                raise
+            if res < 1:
+                arrivals.last_uid = None
+                continue
+            uid = self.device.uid()
+            if uid != arrivals.last_uid:
+                arrivals.last_uid = uid
+                return PollEvent(self.device.connstring, uid, self.device.decode_target(), time.time())
+        raise call.ended()
+
+    def poll(self, poll_nr = 10, period = 2):
+        """Polls once for a target, resolving to the pynfc Target record of the target found, or None"""
+        return self._submit(self._poll, poll_nr, period)
+
+    def transceive(self, tx, timeout = 0):
+        """Sends tx to the selected target, resolving to the response bytes"""
+        return self._submit(self._transceive, tx, timeout)
+
+    def arrivals(self, poll_nr = 10, period = 2):
+        """Returns a TagArrivals giving PollEvents, one per tag arriving on the reader"""
+        return TagArrivals(self, poll_nr, period)
+
+    def close(self):
+        """Aborts any running call and shuts down the device's thread
+
+           The underlying pynfc.Device is left open, it remains owned by the caller.
+        """
+        self.closed = True
+        with self._lock:
+            if self._active is not None:
+                self._active.cancelled = True
+                self.device.abort()
+        self._executor.shutdown(wait = True)
+
+class TagArrivals(object):
+    """Tag arrivals on an AsyncDevice, awaited one at a time with next_arrival
+
+       A tag is reported when it is first seen, and again only after it has left the field.
+       Coroutines yield From(next_arrival()) in a loop until it raises
+       StopArrivals, which happens once the AsyncDevice is closed.
+    """
+    def __init__(self, device, poll_nr = 10, period = 2):
+        self.device = device
+        self.poll_nr = poll_nr
+        self.period = period
+        self.last_uid = None
+
+    def next_arrival(self):
+        """Returns a future resolving to the next PollEvent, or raising StopArrivals once the device is closed"""
+        if self.device.closed:
+            future = asyncio.Future(loop = self.device.loop)
+            future.set_exception(StopArrivals())
+            return future
+        return self.device._submit(self.device._wait_for_arrival, self, ended = StopArrivals)
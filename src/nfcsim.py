@@ -0,0 +1,751 @@
+"""Simulated NFC readers and tags standing in for libnfc, for testing and benchmarking without hardware"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# Usage:
+#
+#   import nfcsim
+#   reader = nfcsim.SimReader(tags = [nfcsim.MifareClassicTag("\x01\x02\x03\x04")])
+#   nfcsim.install(reader)
+#
+# after which pynfc, poller, mifareauth and the raw nfc functions all talk to
+# the simulated reader until nfcsim.uninstall() is called.
+
+import sys
+import ctypes
+import threading
+import traceback
+import collections
+
+import nfc
+import py14443a
+
+class SimTag(object):
+    """An ISO14443A tag that can be placed in the field of a SimReader
+
+       Tags see frames as libnfc would deliver them, the reader having dealt
+       with CRCs, parity and Crypto1 (see SimReader.transceive for the frames
+       the reader itself refuses).  This base class answers nothing once
+       selected.
+    """
+    nmt = nfc.NMT_ISO14443A
+
+    def __init__(self, uid, atqa = "\x00\x04", sak = 0x08, ats = ""):
+        self.uid = uid
+        self.atqa = atqa
+        self.sak = sak
+        self.ats = ats
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.uid.encode('hex'))
+
+    def fill_target(self, target):
+        """Describes the tag in an nfc_target, as libnfc does when selecting it"""
+        target.nm.nmt = self.nmt
+        target.nm.nbr = nfc.NBR_106
+        nai = target.nti.nai
+        ctypes.memmove(nai.abtAtqa, self.atqa, 2)
+        nai.btSak = self.sak
+        nai.szUidLen = len(self.uid)
+        ctypes.memmove(nai.abtUid, self.uid, len(self.uid))
+        nai.szAtsLen = len(self.ats)
+        ctypes.memmove(nai.abtAts, self.ats, len(self.ats))
+
+    def select(self):
+        """Called when a reader selects the tag"""
+        pass
+
+    def transceive(self, data):
+        """Returns the tag's response to data, or a negative libnfc error code"""
+        return nfc.NFC_ERFTRANS
+
+class MifareClassicTag(SimTag):
+    """A Mifare Classic 1K or 4K card
+
+       Authentication checks the key against the sector trailer, but access
+       bits are not enforced, except that key A always reads back as zeros.
+       As on a real card, a failed authentication or an access to a sector
+       that is not authenticated halts the card until it is selected again.
+    """
+    DEFAULT_KEY = "\xff" * 6
+    MC_AUTH_A = 0x60
+    MC_AUTH_B = 0x61
+    MC_READ = 0x30
+    MC_WRITE = 0xA0
+
+    def __init__(self, uid, size = 1024, data = None, key_a = DEFAULT_KEY, key_b = DEFAULT_KEY):
+        """Makes a blank card with the given keys in every sector, or one holding a copy of data"""
+        if size > 1024:
+            SimTag.__init__(self, uid, "\x00\x02", 0x18)
+        else:
+            SimTag.__init__(self, uid, "\x00\x04", 0x08)
+        self.blocks = size // 16
+        if data is None:
+            self.data = bytearray(size)
+            bcc = 0
+            for c in uid[:4]:
+                bcc ^= ord(c)
+            self.data[0:8] = uid[:4] + chr(bcc) + chr(self.sak) + self.atqa[::-1]
+            for sector in range(self.sectors()):
+                self.set_keys(sector, key_a, key_b)
+        else:
+            self.data = bytearray(data)
+            if len(self.data) != size:
+                raise ValueError("Card data must be %d bytes long" % size)
+        self.authenticated = None
+        self.halted = False
+
+    @staticmethod
+    def trailer(block):
+        """Returns the sector trailer block for block"""
+        if block < 128:
+            return block | 3
+        return block | 15
+
+    def sectors(self):
+        """Returns the number of sectors on the card"""
+        if self.blocks > 128:
+            return 32 + (self.blocks - 128) // 16
+        return self.blocks // 4
+
+    def set_keys(self, sector, key_a, key_b):
+        """Sets a sector's keys, giving it the transport configuration access bits"""
+        if sector < 32:
+            offset = (sector * 4 + 3) * 16
+        else:
+            offset = (128 + (sector - 32) * 16 + 15) * 16
+        self.data[offset:offset + 16] = key_a + "\xff\x07\x80\x69" + key_b
+
+    def select(self):
+        self.authenticated = None
+        self.halted = False
+
+    def _halt(self, error):
+        self.authenticated = None
+        self.halted = True
+        return error
+
+    def transceive(self, data):
+        if self.halted or len(data) < 2:
+            return nfc.NFC_ERFTRANS
+        cmd, block = ord(data[0]), ord(data[1])
+        if block >= self.blocks:
+            return self._halt(nfc.NFC_ERFTRANS)
+        trailer = self.trailer(block)
+        if cmd in (self.MC_AUTH_A, self.MC_AUTH_B):
+            offset = trailer * 16 + (0 if cmd == self.MC_AUTH_A else 10)
+            if len(data) < 8 or data[2:8] != str(self.data[offset:offset + 6]):
+                return self._halt(nfc.NFC_EMFCAUTHFAIL)
+            self.authenticated = trailer
+            return ""
+        if self.authenticated != trailer:
+            return self._halt(nfc.NFC_ERFTRANS)
+        if cmd == self.MC_READ:
+            result = self.data[block * 16:block * 16 + 16]
+            if block == trailer:
+                result[0:6] = "\x00" * 6
+            return str(result)
+        if cmd == self.MC_WRITE and len(data) == 18 and block != 0:
+            self.data[block * 16:block * 16 + 16] = data[2:]
+            return ""
+        return self._halt(nfc.NFC_ERFTRANS)
+
+class UltralightTag(SimTag):
+    """A Mifare Ultralight or NTAG21x tag, with a 7 byte UID
+
+       user_memory is the size of the user memory, starting at page 4, and
+       data (if given) its contents.  version is the response to GET_VERSION
+       (by default an NTAG213's), or None for a tag that does not support it,
+       or FAST_READ.  Unknown commands and pages out of range halt the tag
+       until it is selected again.
+    """
+    UL_READ = 0x30
+    UL_FAST_READ = 0x3A
+    UL_GET_VERSION = 0x60
+    NTAG213_VERSION = "\x00\x04\x04\x02\x01\x00\x0f\x03"
+
+    def __init__(self, uid, user_memory = 144, data = None, version = NTAG213_VERSION):
+        SimTag.__init__(self, uid, "\x00\x44", 0x00)
+        self.version = version
+        # Tags with GET_VERSION have configuration pages after the user memory
+        self.pages = 4 + user_memory // 4 + (5 if version is not None else 0)
+        self.data = bytearray(self.pages * 4)
+        bcc0 = 0x88 ^ ord(uid[0]) ^ ord(uid[1]) ^ ord(uid[2])
+        bcc1 = ord(uid[3]) ^ ord(uid[4]) ^ ord(uid[5]) ^ ord(uid[6])
+        self.data[0:9] = uid[:3] + chr(bcc0) + uid[3:7] + chr(bcc1)
+        self.data[12:16] = "\xe1\x10" + chr(user_memory // 8) + "\x00"
+        if data is not None:
+            self.data[16:16 + len(data)] = data
+        self.halted = False
+
+    def select(self):
+        self.halted = False
+
+    def transceive(self, data):
+        if self.halted or not data:
+            return nfc.NFC_ERFTRANS
+        cmd = ord(data[0])
+        if cmd == self.UL_READ and len(data) == 2 and ord(data[1]) < self.pages:
+            start = ord(data[1]) * 4
+            # Reads wrap around to page 0
+            return str((self.data + self.data[:16])[start:start + 16])
+        if cmd == self.UL_FAST_READ and self.version is not None and len(data) == 3 and \
+                ord(data[1]) <= ord(data[2]) < self.pages:
+            return str(self.data[ord(data[1]) * 4:(ord(data[2]) + 1) * 4])
+        if cmd == self.UL_GET_VERSION and self.version is not None:
+            return self.version
+        self.halted = True
+        return nfc.NFC_ERFTRANS
+
+class IsoDepTag(SimTag):
+    """An ISO14443-4 tag answering APDUs, as seen with NP_AUTO_ISO14443_4 set
+
+       responses maps command APDUs to their responses.  If responder is given
+       it is called with each command APDU and returns the response instead.
+       Unknown commands are answered with 6A82 (file not found).
+    """
+    def __init__(self, uid, ats = "\x75\x77\x81\x02\x80", responses = None, responder = None,
+                 atqa = "\x00\x04", sak = 0x20):
+        SimTag.__init__(self, uid, atqa, sak, ats)
+        self.responses = responses or {}
+        self.responder = responder
+
+    def transceive(self, data):
+        if self.responder is not None:
+            return self.responder(data)
+        return self.responses.get(data, "\x6a\x82")
+
+class SimReader(object):
+    """A simulated reader, holding the tags currently in its field
+
+       tags is the initial contents of the field.  If script is given, every
+       call that watches the field for changes (polling, listing targets and
+       presence checks) first takes the next entry from it as the new contents
+       of the field: a tag, a list of tags, or None for an empty field.  Once
+       the script runs out the field stays empty.  Selecting a target just
+       looks at the current contents of the field.
+
+       When the reader emulates a target, a simulated initiator sends it each
+       frame in initiator, a list of strings, and the responses (None where
+       the target sent none) are recorded in responses.
+
+       latency maps the operations in DEFAULT_LATENCY to the seconds each call
+       takes.  Any wait ends early, failing with NFC_EOPABORTED, if the
+       command is aborted from another thread.
+    """
+    DEFAULT_LATENCY = {'init': 0.0,
+                       'idle': 0.0,
+                       'property': 0.0,
+                       'poll': 0.0,
+                       'poll_empty': 0.0,
+                       'select': 0.0,
+                       'transceive': 0.0,
+                       'present': 0.0}
+
+    # Properties as left by nfc_initiator_init
+    INITIATOR_PROPERTIES = {nfc.NP_ACTIVATE_FIELD: True,
+                            nfc.NP_ACTIVATE_CRYPTO1: False,
+                            nfc.NP_INFINITE_SELECT: True,
+                            nfc.NP_AUTO_ISO14443_4: True,
+                            nfc.NP_FORCE_ISO14443_A: True,
+                            nfc.NP_FORCE_SPEED_106: True,
+                            nfc.NP_ACCEPT_INVALID_FRAMES: False,
+                            nfc.NP_ACCEPT_MULTIPLE_FRAMES: False,
+                            nfc.NP_HANDLE_CRC: True,
+                            nfc.NP_HANDLE_PARITY: True,
+                            nfc.NP_EASY_FRAMING: True}
+
+    def __init__(self, connstring = "sim:0", tags = None, script = None, latency = None,
+                 name = "pynfc simulated reader", initiator = None):
+        self.connstring = connstring
+        self.name = name
+        self.tags = list(tags or [])
+        self.script = iter(script) if script is not None else None
+        self.initiator = list(initiator or [])
+        self.responses = []
+        self.latency = dict(self.DEFAULT_LATENCY)
+        self.latency.update(latency or {})
+        self.properties = {}
+        self.selected = None
+        self.is_open = False
+        self.last_error = nfc.NFC_SUCCESS
+        # Number of calls made to each libnfc function
+        self.calls = collections.Counter()
+        self._aborted = threading.Event()
+
+    def __repr__(self):
+        return "<SimReader %s>" % self.connstring
+
+    def place(self, *tags):
+        """Puts tags into the field"""
+        self.tags.extend(tags)
+
+    def remove(self, *tags):
+        """Takes tags, or every tag, out of the field"""
+        if tags:
+            self.tags = [tag for tag in self.tags if tag not in tags]
+        else:
+            self.tags = []
+        if self.selected not in self.tags:
+            self.selected = None
+
+    def _field(self, nmt = None):
+        """Returns the tags in the field with the given modulation type"""
+        return [tag for tag in self.tags if nmt is None or tag.nmt == nmt]
+
+    def _sense(self, nmt = None):
+        """Advances the script, and returns the tags in the field with the given modulation type"""
+        if self.script is not None:
+            try:
+                entry = next(self.script)
+            except StopIteration:
+                entry = None
+                self.script = None
+            if entry is None:
+                entry = []
+            elif not isinstance(entry, (list, tuple)):
+                entry = [entry]
+            self.tags = list(entry)
+            if self.selected not in self.tags:
+                self.selected = None
+        return self._field(nmt)
+
+    def _wait(self, operation, scale = 1):
+        """Spends an operation's latency, returning True if it was aborted"""
+        delay = self.latency.get(operation, 0.0) * scale
+        if delay and self._aborted.wait(delay):
+            self._aborted.clear()
+            return True
+        return False
+
+    def _select(self, tag):
+        self.selected = tag
+        tag.select()
+        return tag
+
+    def open(self):
+        self.is_open = True
+        self.selected = None
+        self._aborted.clear()
+
+    def close(self):
+        self.is_open = False
+        self.selected = None
+
+    def abort(self):
+        self._aborted.set()
+        return nfc.NFC_SUCCESS
+
+    def initiator_init(self):
+        self.selected = None
+        self.properties.update(self.INITIATOR_PROPERTIES)
+        if self._wait('init'):
+            return nfc.NFC_EOPABORTED
+        return nfc.NFC_SUCCESS
+
+    def idle(self):
+        self.selected = None
+        self.properties[nfc.NP_ACTIVATE_FIELD] = False
+        if self._wait('idle'):
+            return nfc.NFC_EOPABORTED
+        return nfc.NFC_SUCCESS
+
+    def set_property(self, prop, value):
+        self.properties[prop] = value
+        if prop == nfc.NP_ACTIVATE_FIELD and not value:
+            self.selected = None
+        if self._wait('property'):
+            return nfc.NFC_EOPABORTED
+        return nfc.NFC_SUCCESS
+
+    def poll(self, nmts, poll_nr, period):
+        """Returns the first tag in the field with one of the modulation types, None, or an error code"""
+        # As with a PN53x polling in software, polling leaves NP_INFINITE_SELECT set
+        self.properties[nfc.NP_INFINITE_SELECT] = True
+        for nmt in nmts:
+            found = self._sense(nmt)
+            if found:
+                if self._wait('poll'):
+                    return nfc.NFC_EOPABORTED
+                return self._select(found[0])
+        if self._wait('poll_empty'):
+            return nfc.NFC_EOPABORTED
+        return None
+
+    def select(self, nmt, uid = None):
+        """Returns the selected tag with the modulation type (and uid if given), None, or an error code"""
+        for tag in self._field(nmt):
+            if uid is None or tag.uid == uid:
+                if self._wait('select'):
+                    return nfc.NFC_EOPABORTED
+                return self._select(tag)
+        return None
+
+    def list_targets(self, nmt, max_targets):
+        """Returns the tags in the field with the modulation type, or an error code"""
+        found = self._sense(nmt)[:max_targets]
+        if self._wait('select', len(found)):
+            return nfc.NFC_EOPABORTED
+        if found:
+            self._select(found[-1])
+        return found
+
+    def deselect(self):
+        self.selected = None
+        return nfc.NFC_SUCCESS
+
+    def is_present(self, uid = None):
+        """Returns NFC_SUCCESS if the selected tag (with the uid, if given) is still in the field"""
+        tags = self._sense()
+        if self._wait('present'):
+            return nfc.NFC_EOPABORTED
+        if self.selected is None or self.selected not in tags or (uid is not None and self.selected.uid != uid):
+            self.selected = None
+            return nfc.NFC_ETGRELEASED
+        return nfc.NFC_SUCCESS
+
+    def transceive(self, data):
+        """Returns the selected tag's response to data, or an error code
+
+           As on a PN53x, with NP_EASY_FRAMING set frames starting 0x60 or
+           0x61 are taken for Mifare Classic authentication, and fail unless
+           they carry a key and UID.  With it unset, frames sent without
+           NP_HANDLE_CRC lack the CRC tags expect, and go unanswered.
+        """
+        if self._wait('transceive'):
+            return nfc.NFC_EOPABORTED
+        if self.selected is None or self.selected not in self.tags:
+            return nfc.NFC_ERFTRANS
+        if self.properties.get(nfc.NP_EASY_FRAMING, True):
+            if data[:1] in ("\x60", "\x61") and len(data) < 12:
+                return nfc.NFC_EMFCAUTHFAIL
+        elif not self.properties.get(nfc.NP_HANDLE_CRC, True):
+            return nfc.NFC_ERFTRANS
+        return self.selected.transceive(data)
+
+    def transceive_bits(self, data, bits, parity = None):
+        """Exchanges a frame of bits with the field, returning (data, bits) or an error code
+
+           REQA and WUPA are answered with the ATQA of a tag in the field.  Any
+           other frame must be whole bytes, and goes to the selected tag.  With
+           NP_HANDLE_PARITY unset, parity holds the frame's parity bits, and with
+           NP_HANDLE_CRC unset the frame carries its CRC_A, as does the response;
+           a frame with a wrong parity bit or CRC_A goes unanswered.
+        """
+        if self._wait('transceive'):
+            return nfc.NFC_EOPABORTED
+        if bits == 7 and data[:1] in ("\x26", "\x52"):
+            tags = self._field(nfc.NMT_ISO14443A)
+            if not tags:
+                return nfc.NFC_ERFTRANS
+            return tags[0].atqa[::-1], 16
+        if bits % 8:
+            return nfc.NFC_ENOTIMPL
+        if self.selected is None or self.selected not in self.tags:
+            return nfc.NFC_ERFTRANS
+        if not self.properties.get(nfc.NP_HANDLE_PARITY, True) and not py14443a.check_parity(data, parity or ""):
+            return nfc.NFC_ERFTRANS
+        handle_crc = self.properties.get(nfc.NP_HANDLE_CRC, True)
+        if not handle_crc:
+            if not py14443a.check_crc_a(data):
+                return nfc.NFC_ERFTRANS
+            data = data[:-2]
+        res = self.selected.transceive(data)
+        if isinstance(res, (int, long)):
+            return res
+        if res and not handle_crc:
+            res = py14443a.append_crc_a(res)
+        return res, len(res) * 8
+
+    def emulate(self, exchange):
+        """Sends the initiator's frames to an emulated target
+
+           exchange is called with each frame, and returns the target's
+           response, None for no response, or a negative result ending the
+           emulation.  Once the initiator runs out of frames it leaves the
+           field, failing the emulation with NFC_ETGRELEASED.
+        """
+        self.selected = None
+        self.properties = {}
+        self.responses = []
+        for frame in self.initiator:
+            if self._wait('transceive'):
+                return nfc.NFC_EOPABORTED
+            res = exchange(frame)
+            if isinstance(res, (int, long)):
+                return res
+            self.responses.append(res)
+        return nfc.NFC_ETGRELEASED
+
+def _callback_type(ctype, result = False):
+    """Returns the type a callback implementing an argument (or result) of type ctype should use
+
+       ctypes callbacks cannot take arrays or return pointers, so those (and
+       pointers to opaque handles) are passed as plain addresses.
+    """
+    if ctype is None:
+        return None
+    if ctype is nfc.String:
+        return ctypes.c_void_p if result else ctypes.c_char_p
+    if issubclass(ctype, ctypes._Pointer):
+        target = ctype._type_
+        if result or (issubclass(target, (ctypes.Structure, ctypes.Union)) and not hasattr(target, '_fields_')):
+            return ctypes.c_void_p
+        return ctype
+    if issubclass(ctype, (ctypes.Structure, ctypes.Union)):
+        return ctype
+    if isinstance(getattr(ctype, '_type_', None), str) and ctype._type_ not in ('P', 'z'):
+        return ctype
+    return ctypes.c_void_p
+
+class SimLibrary(object):
+    """Stands in for the libnfc shared library, serving each function from simulated readers
+
+       The functions are real ctypes callbacks with libnfc's signatures, so
+       callers go through exactly the argument conversion they would with
+       libnfc.  Functions that are not simulated raise AttributeError, as if
+       the library did not export them.
+    """
+    version = "1.7.1-pynfc-sim"
+
+    def __init__(self, readers = None):
+        self.readers = list(readers) if readers else [SimReader()]
+        self._contexts = {}
+        self._devices = {}
+        self._strings = {}
+
+    def __getattr__(self, name):
+        impl = getattr(self, '_' + name, None) if not name.startswith('_') else None
+        if impl is None or name not in nfc._prototypes:
+            raise AttributeError("Simulated library has no function '%s'" % name)
+        _libname, argtypes, restype, _errcheck = nfc._prototypes[name]
+        restype = _callback_type(restype, result = True)
+        functype = ctypes.CFUNCTYPE(restype, *[_callback_type(argtype) for argtype in argtypes])
+        func = functype(self._guard(name, impl, restype))
+        # Cached so the callback outlives every caller that bound it
+        self.__dict__[name] = func
+        return func
+
+    def _guard(self, name, impl, restype):
+        """Wraps impl so that exceptions cannot escape into ctypes, and strings are kept alive"""
+        def call(*args):
+            try:
+                result = impl(*args)
+            except Exception:
+                traceback.print_exc()
+                result = nfc.NFC_ESOFT if restype is ctypes.c_int else None
+            if isinstance(result, str) and restype is ctypes.c_void_p:
+                buf = self._strings[name] = ctypes.create_string_buffer(result)
+                result = ctypes.addressof(buf)
+            return result
+        return call
+
+    def _reader(self, device, name):
+        reader = self._devices[device][1]
+        reader.calls[name] += 1
+        return reader
+
+    def _result(self, reader, res):
+        if res < 0:
+            reader.last_error = res
+        return res
+
+    ### Library and device management
+
+    def _nfc_init(self, context):
+        buf = ctypes.create_string_buffer(1)
+        self._contexts[ctypes.addressof(buf)] = buf
+        context[0] = ctypes.cast(buf, ctypes.POINTER(nfc.nfc_context))
+
+    def _nfc_exit(self, context):
+        for device, (_buf, reader, owner) in self._devices.items():
+            if owner == context:
+                self._nfc_close(device)
+        self._contexts.pop(context, None)
+
+    def _nfc_version(self):
+        return self.version
+
+    def _nfc_list_devices(self, context, connstrings, max_devices):
+        readers = self.readers[:max_devices]
+        for i, reader in enumerate(readers):
+            connstrings[i].value = reader.connstring
+        return len(readers)
+
+    def _nfc_open(self, context, connstring):
+        connstring = ctypes.string_at(connstring) if connstring else ""
+        for reader in self.readers:
+            if not connstring or reader.connstring == connstring:
+                break
+        else:
+            return None
+        if reader.is_open:
+            return None
+        reader.open()
+        buf = ctypes.create_string_buffer(1)
+        self._devices[ctypes.addressof(buf)] = (buf, reader, context)
+        return ctypes.addressof(buf)
+
+    def _nfc_close(self, device):
+        _buf, reader, _context = self._devices.pop(device)
+        reader.calls['nfc_close'] += 1
+        reader.close()
+
+    def _nfc_abort_command(self, device):
+        return self._reader(device, 'nfc_abort_command').abort()
+
+    def _nfc_device_get_name(self, device):
+        return self._reader(device, 'nfc_device_get_name').name
+
+    def _nfc_device_get_connstring(self, device):
+        return self._reader(device, 'nfc_device_get_connstring').connstring
+
+    def _nfc_device_get_last_error(self, device):
+        return self._reader(device, 'nfc_device_get_last_error').last_error
+
+    def _nfc_strerror(self, device):
+        return "Simulated error %d" % self._reader(device, 'nfc_strerror').last_error
+
+    def _nfc_perror(self, device, message):
+        sys.stderr.write("%s: %s\n" % (message, self._nfc_strerror(device)))
+
+    def _nfc_idle(self, device):
+        reader = self._reader(device, 'nfc_idle')
+        return self._result(reader, reader.idle())
+
+    def _nfc_initiator_init(self, device):
+        reader = self._reader(device, 'nfc_initiator_init')
+        return self._result(reader, reader.initiator_init())
+
+    def _nfc_device_set_property_bool(self, device, prop, value):
+        reader = self._reader(device, 'nfc_device_set_property_bool')
+        return self._result(reader, reader.set_property(prop, bool(value)))
+
+    def _nfc_device_set_property_int(self, device, prop, value):
+        reader = self._reader(device, 'nfc_device_set_property_int')
+        return self._result(reader, reader.set_property(prop, value))
+
+    ### Initiator
+
+    def _found(self, reader, result, target):
+        if result is None:
+            return 0
+        if isinstance(result, (int, long)):
+            return self._result(reader, result)
+        if target:
+            result.fill_target(target[0])
+        return 1
+
+    def _nfc_initiator_poll_target(self, device, modulations, count, poll_nr, period, target):
+        reader = self._reader(device, 'nfc_initiator_poll_target')
+        nmts = [modulations[i].nmt for i in range(count)]
+        return self._found(reader, reader.poll(nmts, poll_nr, period), target)
+
+    def _nfc_initiator_select_passive_target(self, device, modulation, init_data, init_len, target):
+        reader = self._reader(device, 'nfc_initiator_select_passive_target')
+        uid = ctypes.string_at(init_data, init_len) if init_data and init_len else None
+        return self._found(reader, reader.select(modulation.nmt, uid), target)
+
+    def _nfc_initiator_list_passive_targets(self, device, modulation, targets, max_targets):
+        reader = self._reader(device, 'nfc_initiator_list_passive_targets')
+        found = reader.list_targets(modulation.nmt, max_targets)
+        if isinstance(found, (int, long)):
+            return self._result(reader, found)
+        for i, tag in enumerate(found):
+            tag.fill_target(targets[i])
+        return len(found)
+
+    def _nfc_initiator_deselect_target(self, device):
+        return self._reader(device, 'nfc_initiator_deselect_target').deselect()
+
+    def _nfc_initiator_target_is_present(self, device, target):
+        reader = self._reader(device, 'nfc_initiator_target_is_present')
+        nai = target.nti.nai
+        uid = None
+        if nai.szUidLen:
+            uid = ctypes.string_at(ctypes.addressof(nai.abtUid), min(nai.szUidLen, len(nai.abtUid)))
+        return self._result(reader, reader.is_present(uid))
+
+    def _nfc_initiator_transceive_bytes(self, device, tx, tx_len, rx, rx_len, timeout):
+        reader = self._reader(device, 'nfc_initiator_transceive_bytes')
+        res = reader.transceive(ctypes.string_at(tx, tx_len))
+        if isinstance(res, (int, long)):
+            return self._result(reader, res)
+        if len(res) > rx_len:
+            return self._result(reader, nfc.NFC_EOVFLOW)
+        ctypes.memmove(rx, res, len(res))
+        return len(res)
+
+    def _nfc_initiator_transceive_bits(self, device, tx, tx_bits, tx_parity, rx, rx_len, rx_parity):
+        reader = self._reader(device, 'nfc_initiator_transceive_bits')
+        nbytes = (tx_bits + 7) // 8
+        parity = ctypes.string_at(tx_parity, nbytes) if tx_parity else None
+        res = reader.transceive_bits(ctypes.string_at(tx, nbytes), tx_bits, parity)
+        if isinstance(res, (int, long)):
+            return self._result(reader, res)
+        data, bits = res
+        if len(data) > rx_len:
+            return self._result(reader, nfc.NFC_EOVFLOW)
+        ctypes.memmove(rx, data, len(data))
+        if rx_parity:
+            parity = py14443a.parity(data)
+            ctypes.memmove(rx_parity, parity, len(parity))
+        return bits
+
+    def _nfc_emulate_target(self, device, emulator, timeout):
+        reader = self._reader(device, 'nfc_emulate_target')
+        io = emulator.contents.state_machine.contents.io
+        # The buffers libnfc passes to the io function
+        rx = (ctypes.c_uint8 * 258)()
+        tx = (ctypes.c_uint8 * 261)()
+        def exchange(frame):
+            ctypes.memmove(rx, frame, len(frame))
+            res = io(emulator, rx, len(frame), tx, len(tx))
+            if res < 0:
+                return res
+            return ctypes.string_at(tx, res) if res else None
+        return self._result(reader, reader.emulate(exchange))
+
+    ### Helpers exported by libnfc
+
+    def _iso14443a_crc(self, data, length, crc):
+        ctypes.memmove(crc, py14443a.crc_a_bytes(ctypes.string_at(data, length)), 2)
+
+    def _iso14443a_crc_append(self, data, length):
+        ctypes.memmove(ctypes.addressof(data.contents) + length,
+                       py14443a.crc_a_bytes(ctypes.string_at(data, length)), 2)
+
+def _unbind():
+    """Forgets the functions already bound on the nfc module, so they are looked up again"""
+    for name in nfc._prototypes:
+        nfc.__dict__.pop(name, None)
+
+def install(*readers):
+    """Replaces libnfc with a simulation of readers (one empty reader if none are given)
+
+       Returns the SimLibrary, whose readers attribute holds the SimReaders.
+    """
+    lib = SimLibrary(readers)
+    nfc._libs['nfc'] = lib
+    _unbind()
+    return lib
+
+def uninstall():
+    """Removes the simulation, so that libnfc is loaded again on next use"""
+    nfc._libs.pop('nfc', None)
+    _unbind()
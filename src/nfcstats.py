@@ -0,0 +1,194 @@
+"""Opt-in call counts, latency histograms and error codes for every libnfc function"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# Nothing is wrapped until enable() is called, and disable() puts the
+# original functions back, so there is no cost at all while disabled.
+# Callers look the functions up on the nfc module on every call, so the
+# wrappers take effect immediately, including for already open devices.
+#
+# Functions are wrapped as nfc binds them, through nfc._bind_hooks, so
+# enabling does not load libnfc or bind anything early, and functions bound
+# again later (nfcsim.install() and uninstall() forget every binding) are
+# recorded too.
+
+import bisect
+import ctypes
+import threading
+
+import nfc
+import pynfc
+
+# Upper bounds, in seconds, of the latency histogram buckets (a final +Inf bucket is implied)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class CallStats(object):
+    """Counters for one libnfc function"""
+    __slots__ = ['name', 'calls', 'seconds', 'errors', 'bounds', 'counts', 'lock']
+
+    def __init__(self, name, bounds = DEFAULT_BUCKETS):
+        self.name = name
+        self.bounds = bounds
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.seconds = 0.0
+            # Error code to number of calls returning it
+            self.errors = {}
+            self.counts = [0] * (len(self.bounds) + 1)
+
+    def record(self, elapsed, error = None):
+        bucket = bisect.bisect_left(self.bounds, elapsed)
+        with self.lock:
+            self.calls += 1
+            self.seconds += elapsed
+            self.counts[bucket] += 1
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def snapshot(self):
+        """Returns the counters as a dictionary, with the histogram as cumulative (upper bound, count) pairs"""
+        with self.lock:
+            counts = list(self.counts)
+            result = {'calls': self.calls,
+                      'seconds': self.seconds,
+                      'errors': dict(self.errors)}
+        buckets = []
+        total = 0
+        for bound, count in zip(self.bounds + (float('inf'), ), counts):
+            total += count
+            buckets.append((bound, total))
+        result['buckets'] = buckets
+        return result
+
+def timed(func, record, errors = False, name = None):
+    """Returns func wrapped to call record(seconds, error) after every call
+
+       error is 'exception' if func raised, the result if errors is set and
+       func returned a negative number (a libnfc error code), and otherwise None.
+    """
+    clock = pynfc.monotonic
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            record(clock() - start, 'exception')
+            raise
+        record(clock() - start, result if errors and result < 0 else None)
+        return result
+    wrapper.__name__ = name or getattr(func, '__name__', 'wrapper')
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+_lock = threading.Lock()
+_stats = {}
+# Names of the functions being recorded, None while disabled
+_names = None
+_buckets = DEFAULT_BUCKETS
+# Function name to the last wrapper put on the nfc module, and the function it wraps
+_wrapped = {}
+
+def _wrap(name, func):
+    """Returns func wrapped to record each call, if name is being recorded (called with _lock held)"""
+    if _names is None or name not in _names:
+        return func
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats[name] = CallStats(name, _buckets)
+    # Only functions returning an int report errors through their result
+    wrapper = timed(func, stats.record, nfc._prototypes[name][2] is ctypes.c_int, name)
+    _wrapped[name] = (wrapper, func)
+    return wrapper
+
+def _bind_hook(name, func):
+    with _lock:
+        return _wrap(name, func)
+
+def enable(names = None, buckets = DEFAULT_BUCKETS):
+    """Starts recording calls to the named libnfc functions, or all of them
+
+       Functions already bound are wrapped at once, the rest as they are
+       first used.  Returns the names of the functions being recorded.
+    """
+    global _names, _buckets
+    with _lock:
+        _buckets = buckets
+        wanted = set(nfc._prototypes) if names is None else set(names) & set(nfc._prototypes)
+        _names = (_names or set()) | wanted
+        if _bind_hook not in nfc._bind_hooks:
+            nfc._bind_hooks.append(_bind_hook)
+        for name in sorted(wanted):
+            func = nfc.__dict__.get(name)
+            if func is not None and _wrapped.get(name, (None, ))[0] is not func:
+                setattr(nfc, name, _wrap(name, func))
+        return sorted(_names)
+
+def disable():
+    """Stops recording, putting the original functions back (the counters are kept)"""
+    global _names
+    with _lock:
+        if _bind_hook in nfc._bind_hooks:
+            nfc._bind_hooks.remove(_bind_hook)
+        for name, (wrapper, func) in _wrapped.items():
+            # Bindings forgotten since (by nfcsim) are left for nfc to bind afresh
+            if nfc.__dict__.get(name) is wrapper:
+                setattr(nfc, name, func)
+        _wrapped.clear()
+        _names = None
+
+def enabled():
+    """Returns whether calls are being recorded"""
+    return _names is not None
+
+def reset():
+    """Zeroes every counter"""
+    with _lock:
+        for stats in _stats.values():
+            stats.reset()
+
+def snapshot():
+    """Returns the counters of every function called so far, keyed by function name"""
+    with _lock:
+        stats = list(_stats.values())
+    return dict([(s.name, s.snapshot()) for s in stats if s.calls])
+
+def _bound(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(value)
+
+def prometheus(prefix = "pynfc"):
+    """Returns the counters in the Prometheus text exposition format"""
+    stats = snapshot()
+    lines = ["# HELP %s_call_seconds Latency of libnfc function calls" % prefix,
+             "# TYPE %s_call_seconds histogram" % prefix]
+    for name in sorted(stats):
+        for bound, count in stats[name]['buckets']:
+            lines.append('%s_call_seconds_bucket{function="%s",le="%s"} %d' % (prefix, name, _bound(bound), count))
+        lines.append('%s_call_seconds_sum{function="%s"} %r' % (prefix, name, stats[name]['seconds']))
+        lines.append('%s_call_seconds_count{function="%s"} %d' % (prefix, name, stats[name]['calls']))
+    lines.append("# HELP %s_call_errors_total libnfc function calls failing, by error code" % prefix)
+    lines.append("# TYPE %s_call_errors_total counter" % prefix)
+    for name in sorted(stats):
+        for code, count in sorted(stats[name]['errors'].items()):
+            lines.append('%s_call_errors_total{function="%s",code="%s"} %d' % (prefix, name, code, count))
+    return "\n".join(lines) + "\n"
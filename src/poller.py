@@ -0,0 +1,214 @@
+"""Concurrent polling of every attached NFC reader"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import time
+import Queue
+import threading
+import collections
+
+# A tag arriving on one of the readers, target being its pynfc Target record
+PollEvent = collections.namedtuple('PollEvent', 'connstring uid target timestamp')
+
+class DevicePoller(threading.Thread):
+    """Polls a single device in its own thread, putting a PollEvent on events for every tag arrival
+
+       ctypes releases the GIL for the duration of each nfc_initiator_poll_target
+       call, so one poller per reader lets a single process keep every reader busy.
+
+       If idle_time is set, the reader is put into nfc_idle (RF field off, low
+       power) for that many seconds whenever a poll finds nothing.
+    """
+    error_backoff = 0.5
+
+    def __init__(self, device, events, poll_nr = 10, period = 2, idle_time = 0):
+        threading.Thread.__init__(self, name = "poller-%s" % device.connstring)
+        self.daemon = True
+        self.device = device
+        self.events = events
+        self.poll_nr = poll_nr
+        self.period = period
+        self.idle_time = idle_time
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._polling = False
+
+        self.polls = 0
+        self.detections = 0
+        self.errors = 0
+        self.poll_time = 0.0
+        self.idles = 0
+        self.wakeup_time = 0.0
+        self.wakeup_max = 0.0
+        self.started = None
+        self.finished = None
+        self.stop_requested = None
+
+    def run(self):
+        self.started = time.time()
+        last_uid = None
+        while True:
+            with self._lock:
+                if self._stopping.is_set():
+                    break
+                self._polling = True
+            start = time.time()
+            try:
+                res = self.device.poll(self.poll_nr, self.period)
+            except IOError:
+                if self._stopping.is_set():
+                    break
+                self.errors += 1
+                last_uid = None
+                self._stopping.wait(self.error_backoff)
+                continue
+            finally:
+                with self._lock:
+                    self._polling = False
+                self.poll_time += time.time() - start
+                self.polls += 1
+            if res < 1:
+                last_uid = None
+                if self.idle_time:
+                    self._idle()
+                continue
+            uid = self.device.uid()
+            if uid != last_uid:
+                self.detections += 1
+                self.events.put(PollEvent(self.device.connstring, uid, self.device.decode_target(), time.time()))
+            last_uid = uid
+        self.finished = time.time()
+
+    def _idle(self):
+        """Idles the reader until idle_time passes or the poller is stopped, then wakes it"""
+        try:
+            self.device.idle()
+        except IOError:
+            self.errors += 1
+            return
+        self.idles += 1
+        if self._stopping.wait(self.idle_time):
+            return
+        start = time.time()
+        try:
+            self.device.initiator_init()
+        except IOError:
+            self.errors += 1
+            return
+        wakeup = time.time() - start
+        self.wakeup_time += wakeup
+        self.wakeup_max = max(self.wakeup_max, wakeup)
+
+    def stop(self):
+        """Stops the poller, aborting any poll in progress so the thread finishes promptly"""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            self.stop_requested = time.time()
+            self._stopping.set()
+            # Aborting when no poll is running would abort the next command instead
+            if self._polling:
+                self.device.abort()
+
+    def stats(self):
+        """Returns the poller's throughput and latency counters"""
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        stop_latency = None
+        if self.finished and self.stop_requested:
+            stop_latency = self.finished - self.stop_requested
+        return {'polls': self.polls,
+                'detections': self.detections,
+                'errors': self.errors,
+                'poll_time': self.poll_time,
+                'elapsed': elapsed,
+                'detections_per_second': (self.detections / elapsed) if elapsed else 0.0,
+                'idles': self.idles,
+                'wakeup_latency_avg': (self.wakeup_time / self.idles) if self.idles else 0.0,
+                'wakeup_latency_max': self.wakeup_max,
+                'stop_latency': stop_latency}
+
+class MultiPoller(object):
+    """Opens every reader found (or those listed in connstrings) and polls them all concurrently
+
+       Arrivals from all readers are delivered through the single events queue,
+       or by iterating over the poller.
+    """
+    def __init__(self, context, connstrings = None, modulations = None, poll_nr = 10, period = 2,
+                 max_devices = 16, events = None, idle_time = 0):
+        self.context = context
+        self.connstrings = connstrings
+        self.modulations = modulations
+        self.poll_nr = poll_nr
+        self.period = period
+        self.max_devices = max_devices
+        self.idle_time = idle_time
+        self.events = events if events is not None else Queue.Queue()
+        self.pollers = []
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __iter__(self):
+        while self.running:
+            try:
+                yield self.events.get(timeout = 0.5)
+            except Queue.Empty:
+                pass
+
+    def start(self):
+        """Opens the readers and starts one polling thread per reader"""
+        self.pollers = []
+        connstrings = self.connstrings
+        if connstrings is None:
+            connstrings = self.context.list_devices(self.max_devices)
+        try:
+            for connstring in connstrings:
+                device = self.context.open(connstring, self.modulations)
+                try:
+                    device.initiator_init()
+                except IOError:
+                    device.close()
+                    raise
+                self.pollers.append(DevicePoller(device, self.events, self.poll_nr, self.period, self.idle_time))
+        except IOError:
+            for poller in self.pollers:
+                poller.device.close()
+            self.pollers = []
+            raise
+        for poller in self.pollers:
+            poller.start()
+        self.running = True
+
+    def stop(self, timeout = None):
+        """Stops every polling thread and closes the readers"""
+        self.running = False
+        for poller in self.pollers:
+            poller.stop()
+        for poller in self.pollers:
+            poller.join(timeout)
+            if not poller.is_alive():
+                poller.device.close()
+
+    def stats(self):
+        """Returns each reader's throughput counters, keyed by connection string"""
+        return dict([(poller.device.connstring, poller.stats()) for poller in self.pollers])
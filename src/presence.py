@@ -0,0 +1,95 @@
+"""Watches a selected tag until it leaves the field, without polling for it again"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import time
+
+import nfc
+from pynfc import monotonic
+
+class PresenceTracker(object):
+    """Checks the target selected on a pynfc.Device every interval seconds until it leaves the field
+
+       A poll runs through every modulation and reselects the tag, whereas
+       nfc_initiator_target_is_present is a single short exchange with the
+       selected tag, leaving the reader free for other work between checks.
+       The interval has millisecond resolution, and checks are scheduled on a
+       monotonic clock so that changes to the system time do not disturb them.
+
+       The tag counts as gone after misses consecutive failed checks, so a
+       single lost frame is not taken for a removal.  If the reader cannot
+       check presence, supported becomes False and callers should go back to
+       polling.
+    """
+    def __init__(self, device, interval = 0.05, misses = 2):
+        self.device = device
+        self.interval = interval
+        self.misses = misses
+        self.supported = True
+        self.checks = 0
+        # Monotonic times the tag was last seen, and its removal noticed
+        self.last_seen = None
+        self.removed = None
+
+    def present(self):
+        """Checks once whether the selected tag is still in the field"""
+        try:
+            res = self.device.is_present()
+        except IOError, e:
+            if e.errno in (nfc.NFC_ENOTIMPL, nfc.NFC_EDEVNOTSUPP):
+                self.supported = False
+            raise
+        self.checks += 1
+        if res:
+            self.last_seen = monotonic()
+        return res
+
+    def wait_for_removal(self, timeout = None, stopped = None):
+        """Waits for the selected tag to leave the field
+
+           Returns True once it has left, or False if timeout seconds pass,
+           stopped (a function) returns True, or the reader cannot check presence.
+        """
+        if not self.supported:
+            return False
+        now = monotonic()
+        deadline = (now + timeout) if timeout is not None else None
+        next_check = now
+        missed = 0
+        while True:
+            try:
+                ok = self.present()
+            except IOError:
+                if not self.supported:
+                    return False
+                raise
+            missed = 0 if ok else missed + 1
+            if missed >= self.misses:
+                self.removed = monotonic()
+                return True
+            if stopped is not None and stopped():
+                return False
+            now = monotonic()
+            if deadline is not None and now >= deadline:
+                return False
+            next_check += self.interval
+            if next_check > now:
+                time.sleep(next_check - now)
+            else:
+                # Checking took longer than the interval, so do not try to catch up
+                next_check = now
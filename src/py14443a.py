@@ -0,0 +1,206 @@
+"""ISO14443-A framing: CRC_A, parity bits and raw frames for nfc_initiator_transceive_bits"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# Functions take any buffer (str, bytearray or memoryview).  Parity is represented
+# the way nfc_initiator_transceive_bits expects it: one byte (0 or 1) per data byte.
+# Frames built for Device.transceive_bits are bytearrays, which it passes to libnfc
+# without copying.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CRC_A_INIT = 0x6363
+
+def _crc_a_entry(index):
+    crc = index
+    for _ in range(8):
+        crc = (crc >> 1) ^ (0x8408 if crc & 1 else 0)
+    return crc
+
+# CRC_A is the reflected CCITT polynomial, so the table is applied low byte first
+_CRC_A_TABLE = [_crc_a_entry(i) for i in range(256)]
+
+# Odd parity of each byte, and a translate table mapping each byte to its parity bit
+_ODD_PARITY = [(0x9669 >> ((i ^ (i >> 4)) & 0xf)) & 1 for i in range(256)]
+_PARITY_TRANS = "".join([chr(p) for p in _ODD_PARITY])
+
+def _translatable(data):
+    """Returns data as a str or bytearray, copying memoryviews, which have no translate"""
+    return data.tobytes() if isinstance(data, memoryview) else data
+
+def crc_a(data, crc = CRC_A_INIT):
+    """Returns the 16 bit CRC_A of data, optionally continuing from a previous crc"""
+    table = _CRC_A_TABLE
+    for c in bytearray(data):
+        crc = (crc >> 8) ^ table[(crc ^ c) & 0xff]
+    return crc
+
+def crc_a_bytes(data):
+    """Returns the two CRC_A bytes to append to data, least significant first"""
+    crc = crc_a(data)
+    return chr(crc & 0xff) + chr(crc >> 8)
+
+def append_crc_a(data):
+    """Returns data with its CRC_A appended"""
+    return data + crc_a_bytes(data)
+
+def check_crc_a(frame):
+    """Returns whether the last two bytes of frame are a valid CRC_A of the rest
+
+       The CRC of a frame including its correct CRC is always zero.
+    """
+    return len(frame) >= 2 and crc_a(frame) == 0
+
+def parity(data):
+    """Returns the odd parity bits of data, one byte per data byte"""
+    return _translatable(data).translate(_PARITY_TRANS)
+
+def check_parity(data, parity_bits):
+    """Returns whether parity_bits are the correct odd parity bits for data"""
+    return _translatable(data).translate(_PARITY_TRANS) == _translatable(parity_bits)[:len(data)]
+
+def wrap_frame(data, crc = True):
+    """Builds a raw frame for Device.transceive_bits, with NP_HANDLE_CRC and NP_HANDLE_PARITY off
+
+       The CRC_A is appended to data unless crc is False, and the parity bit
+       of every byte is computed.  Returns the frame and its parity bits as
+       bytearrays, to pass as the tx and tx_parity of transceive_bits.
+    """
+    frame = bytearray(data)
+    if crc:
+        value = crc_a(frame)
+        frame.append(value & 0xff)
+        frame.append(value >> 8)
+    return frame, frame.translate(_PARITY_TRANS)
+
+def unwrap_frame(frame, parity_bits, bits = None, crc = True):
+    """Checks a raw frame received by Device.transceive_bits
+
+       frame, parity_bits and bits are as returned by transceive_bits (bits
+       defaults to all of frame).  A frame of less than a byte, such as a four
+       bit ACK, has no parity or CRC_A and is returned as it is.  Otherwise the
+       parity bits, and the CRC_A unless crc is False, are checked.
+       Returns the data without its CRC_A as a bytearray, or None if the frame is corrupt.
+    """
+    data = bytearray(frame)
+    if bits is not None and bits < 8:
+        return data
+    if data.translate(_PARITY_TRANS) != bytearray(parity_bits)[:len(data)]:
+        return None
+    if crc:
+        if not check_crc_a(data):
+            return None
+        del data[-2:]
+    return data
+
+def crypto1_encrypt(cipher, data):
+    """Encrypts a frame for a card using Mifare Classic Crypto1
+
+       cipher is a pycrypto1.Crypto1 state.  The parity bits are computed over
+       the plain text and encrypted with the keystream bit that follows each
+       byte, as the card expects.  Returns the encrypted frame and parity bits
+       as bytearrays, ready for Device.transceive_bits.
+    """
+    byte, peek = cipher.byte, cipher.peek
+    out = bytearray(data)
+    out_parity = out.translate(_PARITY_TRANS)
+    for i in range(len(out)):
+        out[i] ^= byte()
+        out_parity[i] ^= peek()
+    return out, out_parity
+
+def crypto1_decrypt(cipher, data, parity_bits):
+    """Decrypts a frame received from a card using Mifare Classic Crypto1
+
+       Returns the plain text as a bytearray and whether all its parity bits were correct.
+    """
+    byte, peek = cipher.byte, cipher.peek
+    out = bytearray(data)
+    parity_bits = bytearray(parity_bits)
+    ok = True
+    for i in range(len(out)):
+        out[i] ^= byte()
+        ok = ok and (parity_bits[i] ^ peek()) == _ODD_PARITY[out[i]]
+    return out, ok
+
+### Bulk operations over buffers of fixed size frames
+
+# Each operation works on a whole buffer of frames at once: the CRC_A of every
+# frame is computed together with numpy, one byte position at a time, and the
+# parity bits of the whole buffer with a single translate.
+
+_crc_a_array = None
+
+def _frame_rows(buffer, size):
+    """Returns buffer as a numpy array with one frame of size bytes per row"""
+    if numpy is None:
+        raise ImportError("Bulk framing requires numpy")
+    buffer = _translatable(buffer)
+    if size < 1 or len(buffer) % size:
+        raise ValueError("Buffer length %d is not a multiple of the frame size %d" % (len(buffer), size))
+    return numpy.frombuffer(buffer, dtype = numpy.uint8).reshape(-1, size)
+
+def split_frames(buffer, size):
+    """Splits a buffer of fixed size frames into a list of frames"""
+    return [buffer[i:i + size] for i in range(0, len(buffer), size)]
+
+def crc_a_all(buffer, size):
+    """Returns the CRC_A of every frame of size bytes in buffer, as a uint16 array"""
+    global _crc_a_array
+    rows = _frame_rows(buffer, size)
+    if _crc_a_array is None:
+        _crc_a_array = numpy.array(_CRC_A_TABLE, dtype = numpy.uint16)
+    table = _crc_a_array
+    crc = numpy.empty(len(rows), dtype = numpy.uint16)
+    crc.fill(CRC_A_INIT)
+    eight = numpy.uint16(8)
+    for column in rows.T:
+        crc = (crc >> eight) ^ table[(crc ^ column) & 0xff]
+    return crc
+
+def wrap_frames(buffer, size, crc = True):
+    """Builds raw frames for Device.transceive_bits from a buffer of frames of size bytes
+
+       The CRC_A of each frame is appended unless crc is False.  Returns the
+       frames and their parity bits as bytearrays, each frame taking size + 2
+       bytes (size without CRCs); split_frames separates them.
+    """
+    rows = _frame_rows(buffer, size)
+    if crc:
+        crcs = crc_a_all(buffer, size)
+        rows = numpy.column_stack((rows, (crcs & 0xff).astype(numpy.uint8), (crcs >> 8).astype(numpy.uint8)))
+    frames = bytearray(rows.tostring())
+    return frames, frames.translate(_PARITY_TRANS)
+
+def unwrap_frames(frames, parity_bits, size, crc = True):
+    """Checks a buffer of raw frames of size bytes each, including their CRC_A unless crc is False
+
+       Returns the data of every frame without its CRC_A, as one bytearray,
+       and a list of whether each frame had correct parity bits and CRC_A.
+    """
+    rows = _frame_rows(frames, size)
+    expected = numpy.frombuffer(_translatable(frames).translate(_PARITY_TRANS), dtype = numpy.uint8)
+    received = numpy.frombuffer(_translatable(parity_bits), dtype = numpy.uint8)[:len(expected)]
+    intact = (expected == received).reshape(-1, size).all(axis = 1)
+    if crc:
+        intact &= crc_a_all(frames, size) == 0
+        rows = rows[:, :-2]
+    return bytearray(rows.tostring()), intact.tolist()
@@ -0,0 +1,393 @@
+"""Crypto1 stream cipher and nonce PRNG used by Mifare Classic cards"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#  PyCrypto1 is based on public domain optimized code by I.C.Weiner
+#  See (http://cryptolib.com/ciphers/crypto1/crypto1.c)
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The 48 bit LFSR is kept as two 24 bit halves, holding its odd and even
+# numbered bits.  The filter function only reads the odd half, and after
+# every step the halves swap roles, so neither half ever needs shuffling.
+
+MASK24 = 0xffffff
+
+LF_POLY_ODD = 0x29CE5C
+LF_POLY_EVEN = 0x870804
+
+def _parity(x):
+    x ^= x >> 16
+    x ^= x >> 8
+    x ^= x >> 4
+    return (0x6996 >> (x & 0xf)) & 1
+
+### Lookup tables
+
+# The filter reads 20 bits of the odd half: the bottom 8 bits and the next
+# 12 each contribute part of an index into the final 32 entry function
+_FILTER_LO = [((0xf22c0 >> (x & 0xf)) & 16) | ((0x6c9c0 >> (x >> 4)) & 8) for x in range(0x100)]
+_FILTER_HI = [((0x3c8b0 >> (x & 0xf)) & 4) | ((0x1e458 >> (x >> 4 & 0xf)) & 2) | ((0x0d938 >> (x >> 8)) & 1)
+              for x in range(0x1000)]
+_FILTER_FC = [(0xEC57E80A >> f) & 1 for f in range(32)]
+
+def _feedback_basis(odd, even, inbyte):
+    """Runs 8 unencrypted steps from the given state, returning the 8 feedback bits produced"""
+    result = 0
+    for i in range(8):
+        feedin = _parity((odd & LF_POLY_ODD) ^ (even & LF_POLY_EVEN)) ^ ((inbyte >> i) & 1)
+        even = ((even << 1) | feedin) & MASK24
+        odd, even = even, odd
+        result |= feedin << i
+    return result
+
+def _linear_tables(basis):
+    """Expands the feedback produced by each single bit into a table for each byte"""
+    tables = []
+    for shift in (0, 8, 16):
+        table = [0] * 256
+        for value in range(1, 256):
+            low = value & -value
+            table[value] = table[value ^ low] ^ basis(low << shift)
+        tables.append(table)
+    return tables
+
+# Feedback bits produced over 8 unencrypted steps depend linearly on the state
+# and the input, so each byte of the state contributes independently
+_FB_ODD = _linear_tables(lambda bit: _feedback_basis(bit, 0, 0))
+_FB_EVEN = _linear_tables(lambda bit: _feedback_basis(0, bit, 0))
+_FB_IN = _linear_tables(lambda bit: _feedback_basis(0, 0, bit))[0]
+
+# Feedback bits 2, 4, 6, 8 end up in the odd half and 1, 3, 5, 7 in the even half, earliest highest
+_DEINT_ODD = [((fb >> 1) & 1) << 3 | ((fb >> 3) & 1) << 2 | ((fb >> 5) & 1) << 1 | ((fb >> 7) & 1) for fb in range(256)]
+_DEINT_EVEN = [(fb & 1) << 3 | ((fb >> 2) & 1) << 2 | ((fb >> 4) & 1) << 1 | ((fb >> 6) & 1) for fb in range(256)]
+
+def filter_bit(x):
+    """Returns the Crypto1 filter function of the odd half x"""
+    return _FILTER_FC[_FILTER_LO[x & 0xff] | _FILTER_HI[(x >> 8) & 0xfff]]
+
+def swap_endian(x):
+    """Reverses the byte order of a 32 bit value"""
+    return ((x & 0xff) << 24) | ((x & 0xff00) << 8) | ((x >> 8) & 0xff00) | ((x >> 24) & 0xff)
+
+def prng_successor(x, n):
+    """Returns the nonce the card's 16 bit PRNG produces n steps after x
+
+       Eight steps are taken at a time: the feedback taps are all at least
+       ten bits below the top of the 32 bit window, so the next eight
+       feedback bits only depend on bits already present.
+    """
+    x = swap_endian(x)
+    while n >= 8:
+        y = x >> 16
+        x = (x >> 8) | (((y ^ (y >> 2) ^ (y >> 3) ^ (y >> 5)) & 0xff) << 24)
+        n -= 8
+    while n:
+        x = (x >> 1) | ((((x >> 16) ^ (x >> 18) ^ (x >> 19) ^ (x >> 21)) & 1) << 31)
+        n -= 1
+    return swap_endian(x)
+
+# Name used for the PRNG successor in the authentication traces
+Next = prng_successor
+
+def key_to_int(key):
+    """Converts a 6 byte key string to the 48 bit integer form used by Crypto1"""
+    if isinstance(key, (int, long)):
+        return key
+    return int(key.encode('hex'), 16)
+
+class Crypto1(object):
+    """A Crypto1 cipher state
+
+       The key may be given as a 6 byte string or a 48 bit integer.  bit, byte
+       and word follow the crapto1 conventions: they feed in the input (or the
+       ciphertext, if encrypted is set, as the card does with the reader nonce)
+       and return the keystream produced.  Unencrypted bytes are processed
+       eight steps at a time using precomputed tables.
+    """
+    __slots__ = ['odd', 'even']
+
+    def __init__(self, key = 0):
+        key = key_to_int(key)
+        odd = even = 0
+        for i in range(47, 0, -2):
+            odd = (odd << 1) | ((key >> ((i - 1) ^ 7)) & 1)
+            even = (even << 1) | ((key >> (i ^ 7)) & 1)
+        self.odd = odd
+        self.even = even
+
+    def copy(self):
+        """Returns an independent copy of the cipher state"""
+        result = Crypto1.__new__(Crypto1)
+        result.odd = self.odd
+        result.even = self.even
+        return result
+
+    @property
+    def lfsr(self):
+        """The 48 bit LFSR contents"""
+        lfsr = 0
+        for i in range(23, -1, -1):
+            lfsr = (lfsr << 1) | ((self.odd >> (i ^ 3)) & 1)
+            lfsr = (lfsr << 1) | ((self.even >> (i ^ 3)) & 1)
+        return lfsr
+
+    def peek(self):
+        """Returns the next keystream bit without advancing the cipher (used to encrypt parity bits)"""
+        return filter_bit(self.odd)
+
+    def bit(self, inbit = 0, encrypted = False):
+        """Advances the cipher one step, returning the keystream bit"""
+        odd, even = self.odd, self.even
+        ret = _FILTER_FC[_FILTER_LO[odd & 0xff] | _FILTER_HI[(odd >> 8) & 0xfff]]
+        feedin = _parity((odd & LF_POLY_ODD) ^ (even & LF_POLY_EVEN)) ^ (inbit & 1)
+        if encrypted:
+            feedin ^= ret
+        self.odd = ((even << 1) | feedin) & MASK24
+        self.even = odd
+        return ret
+
+    def byte(self, inbyte = 0, encrypted = False):
+        """Advances the cipher eight steps feeding in inbyte least significant bit first
+
+           Returns the keystream byte
+        """
+        if encrypted:
+            ret = 0
+            for i in range(8):
+                ret |= self.bit(inbyte >> i, True) << i
+            return ret
+        odd, even = self.odd, self.even
+        fo, fe = _FB_ODD, _FB_EVEN
+        fb = (fo[0][odd & 0xff] ^ fo[1][(odd >> 8) & 0xff] ^ fo[2][odd >> 16] ^
+              fe[0][even & 0xff] ^ fe[1][(even >> 8) & 0xff] ^ fe[2][even >> 16] ^ _FB_IN[inbyte & 0xff])
+        odd = (odd << 4) | _DEINT_ODD[fb]
+        even = (even << 4) | _DEINT_EVEN[fb]
+        lo, hi, fc = _FILTER_LO, _FILTER_HI, _FILTER_FC
+        ret = (fc[lo[(odd >> 4) & 0xff] | hi[(odd >> 12) & 0xfff]] |
+               fc[lo[(even >> 3) & 0xff] | hi[(even >> 11) & 0xfff]] << 1 |
+               fc[lo[(odd >> 3) & 0xff] | hi[(odd >> 11) & 0xfff]] << 2 |
+               fc[lo[(even >> 2) & 0xff] | hi[(even >> 10) & 0xfff]] << 3 |
+               fc[lo[(odd >> 2) & 0xff] | hi[(odd >> 10) & 0xfff]] << 4 |
+               fc[lo[(even >> 1) & 0xff] | hi[(even >> 9) & 0xfff]] << 5 |
+               fc[lo[(odd >> 1) & 0xff] | hi[(odd >> 9) & 0xfff]] << 6 |
+               fc[lo[even & 0xff] | hi[(even >> 8) & 0xfff]] << 7)
+        self.odd = odd & MASK24
+        self.even = even & MASK24
+        return ret
+
+    def word(self, inword = 0, encrypted = False):
+        """Advances the cipher 32 steps feeding in inword, most significant byte first
+
+           Returns the keystream word, with each byte in the position of the input byte it covers
+        """
+        byte = self.byte
+        return (byte(inword >> 24, encrypted) << 24 | byte((inword >> 16) & 0xff, encrypted) << 16 |
+                byte((inword >> 8) & 0xff, encrypted) << 8 | byte(inword & 0xff, encrypted))
+
+    def keystream(self, length):
+        """Returns the next length bytes of keystream as a string"""
+        byte = self.byte
+        return "".join([chr(byte()) for _ in range(length)])
+
+    def crypt(self, data):
+        """Encrypts or decrypts a string of data (parity bits are not handled)"""
+        byte = self.byte
+        return "".join([chr(ord(c) ^ byte()) for c in data])
+
+### Batch mode
+
+_batch_tables = None
+
+def _get_batch_tables():
+    """Returns the lookup tables as numpy arrays, building them on first use"""
+    global _batch_tables
+    if _batch_tables is None:
+        u64 = lambda table: numpy.array(table, dtype = numpy.uint64)
+        x = numpy.arange(1 << 20, dtype = numpy.uint32)
+        # A single lookup filter, indexed by the bottom 20 bits of the odd half
+        filter20 = u64(_FILTER_FC).astype(numpy.uint8)[u64(_FILTER_LO)[x & 0xff] | u64(_FILTER_HI)[x >> 8]]
+        _batch_tables = {'filter': filter20,
+                         'fb_odd': [u64(t) for t in _FB_ODD],
+                         'fb_even': [u64(t) for t in _FB_EVEN],
+                         'fb_in': u64(_FB_IN),
+                         'deint_odd': u64(_DEINT_ODD),
+                         'deint_even': u64(_DEINT_EVEN),
+                         'parity4': u64([(0x6996 >> i) & 1 for i in range(16)])}
+    return _batch_tables
+
+class Crypto1Batch(object):
+    """Many independent Crypto1 states advanced together using numpy
+
+       Each session occupies one lane of a pair of uint64 arrays holding the
+       odd and even halves, and every step is a handful of whole-array table
+       lookups, so the per-session cost of a step is a few machine operations
+       rather than a few Python ones.  Inputs may be scalars (fed to every
+       session) or arrays with one value per session; outputs are arrays.
+
+       keys is a sequence of 48 bit integers or 6 byte strings, or a uint64 array.
+    """
+    def __init__(self, keys):
+        if numpy is None:
+            raise ImportError("Crypto1Batch requires numpy")
+        self._tables = _get_batch_tables()
+        if not isinstance(keys, numpy.ndarray):
+            keys = [key_to_int(key) for key in keys]
+        keys = numpy.asarray(keys, dtype = numpy.uint64)
+        odd = numpy.zeros(len(keys), dtype = numpy.uint64)
+        even = numpy.zeros(len(keys), dtype = numpy.uint64)
+        one = numpy.uint64(1)
+        for i in range(47, 0, -2):
+            odd = (odd << one) | ((keys >> numpy.uint64((i - 1) ^ 7)) & one)
+            even = (even << one) | ((keys >> numpy.uint64(i ^ 7)) & one)
+        self.odd = odd
+        self.even = even
+
+    def __len__(self):
+        return len(self.odd)
+
+    def __getitem__(self, index):
+        """Returns the state of a single session as a Crypto1 object"""
+        result = Crypto1.__new__(Crypto1)
+        result.odd = int(self.odd[index])
+        result.even = int(self.even[index])
+        return result
+
+    def bit(self, inbits = 0, encrypted = False):
+        """Advances every session one step, returning the keystream bits"""
+        t = self._tables
+        odd, even = self.odd, self.even
+        ret = t['filter'][odd & numpy.uint64(0xfffff)]
+        x = (odd & numpy.uint64(LF_POLY_ODD)) ^ (even & numpy.uint64(LF_POLY_EVEN))
+        x ^= x >> numpy.uint64(16)
+        x ^= x >> numpy.uint64(8)
+        x ^= x >> numpy.uint64(4)
+        feedin = t['parity4'][x & numpy.uint64(0xf)] ^ (numpy.asarray(inbits, dtype = numpy.uint64) & numpy.uint64(1))
+        if encrypted:
+            feedin ^= ret
+        self.odd = ((even << numpy.uint64(1)) | feedin) & numpy.uint64(MASK24)
+        self.even = odd
+        return ret
+
+    def byte(self, inbytes = 0, encrypted = False):
+        """Advances every session eight steps, returning the keystream bytes as a uint8 array"""
+        if encrypted:
+            inbytes = numpy.asarray(inbytes, dtype = numpy.uint64)
+            ret = numpy.zeros(len(self), dtype = numpy.uint8)
+            for i in range(8):
+                ret |= self.bit(inbytes >> numpy.uint64(i), True) << numpy.uint8(i)
+            return ret
+        t = self._tables
+        fo, fe, ff = t['fb_odd'], t['fb_even'], t['filter']
+        m8, m20 = numpy.uint64(0xff), numpy.uint64(0xfffff)
+        s8, s16 = numpy.uint64(8), numpy.uint64(16)
+        odd, even = self.odd, self.even
+        fb = (fo[0][odd & m8] ^ fo[1][(odd >> s8) & m8] ^ fo[2][odd >> s16] ^
+              fe[0][even & m8] ^ fe[1][(even >> s8) & m8] ^ fe[2][even >> s16])
+        if not numpy.isscalar(inbytes) or inbytes:
+            fb ^= t['fb_in'][numpy.asarray(inbytes, dtype = numpy.uint64) & m8]
+        odd = (odd << numpy.uint64(4)) | t['deint_odd'][fb]
+        even = (even << numpy.uint64(4)) | t['deint_even'][fb]
+        # The state each step's filter saw is a window of the widened halves, as in Crypto1.byte
+        ret = ff[(odd >> numpy.uint64(4)) & m20]
+        steps = ((even, 3), (odd, 3), (even, 2), (odd, 2), (even, 1), (odd, 1), (even, 0))
+        for i, (half, shift) in enumerate(steps):
+            ret |= ff[(half >> numpy.uint64(shift)) & m20] << numpy.uint8(i + 1)
+        self.odd = odd & numpy.uint64(MASK24)
+        self.even = even & numpy.uint64(MASK24)
+        return ret
+
+    def word(self, inwords = 0, encrypted = False):
+        """Advances every session 32 steps feeding in inwords, returning the keystream words as a uint32 array"""
+        inwords = numpy.asarray(inwords, dtype = numpy.uint64)
+        ret = numpy.zeros(len(self), dtype = numpy.uint32)
+        for shift in (24, 16, 8, 0):
+            ks = self.byte((inwords >> numpy.uint64(shift)) & numpy.uint64(0xff), encrypted)
+            ret |= ks.astype(numpy.uint32) << numpy.uint32(shift)
+        return ret
+
+    def keystream(self, length):
+        """Returns the next length bytes of keystream for every session, as an array of shape (sessions, length)"""
+        ret = numpy.empty((len(self), length), dtype = numpy.uint8)
+        for i in range(length):
+            ret[:, i] = self.byte()
+        return ret
+
+def simulate_authentications(keys, uids, nts, nrs):
+    """Simulates the reader side of many three pass authentications at once
+
+       All arguments are sequences (or arrays) with one entry per session.
+       Returns the encrypted reader nonce, the encrypted reader answer and the
+       encrypted tag answer a genuine card would send, each as a uint32 array.
+    """
+    uids = numpy.asarray(uids, dtype = numpy.uint64)
+    nts = numpy.asarray(nts, dtype = numpy.uint64)
+    nrs = numpy.asarray(nrs, dtype = numpy.uint64)
+    batch = Crypto1Batch(keys)
+    batch.word(uids ^ nts)
+    nr_enc = nrs.astype(numpy.uint32) ^ batch.word(nrs)
+    ar_enc = prng_successor(nts, 64).astype(numpy.uint32) ^ batch.word()
+    at_enc = prng_successor(nts, 96).astype(numpy.uint32) ^ batch.word()
+    return nr_enc, ar_enc, at_enc
+
+def benchmark(seconds = 1.0, sessions = 4096):
+    """Measures keystream generation and full authentication simulation rates
+
+       Batch rates (when numpy is available) are totals across all sessions.
+       Returns a dictionary of operation name to operations per second.
+    """
+    import time
+
+    def rate(func):
+        count = 0
+        start = time.time()
+        while time.time() - start < seconds:
+            for _ in range(100):
+                func()
+            count += 100
+        return count / (time.time() - start)
+
+    cipher = Crypto1(0xffffffffffff)
+
+    def auth():
+        # Reader side of a three pass authentication
+        uid, nt, nr = 0x9c599b32, 0x82a4166c, 0x12345678
+        state = Crypto1(0xffffffffffff)
+        state.word(uid ^ nt)
+        state.word(nr)
+        state.word(0)
+        prng_successor(nt, 64)
+        state.word(0)
+        prng_successor(nt, 96)
+
+    result = {'bytes_per_second': rate(cipher.byte),
+              'bits_per_second': rate(cipher.bit),
+              'authentications_per_second': rate(auth)}
+    if numpy is not None:
+        keys = numpy.arange(sessions, dtype = numpy.uint64)
+        nonces = numpy.arange(sessions, dtype = numpy.uint64)
+        batch = Crypto1Batch(keys)
+        result['batch_bytes_per_second'] = rate(batch.byte) * sessions
+        result['batch_authentications_per_second'] = rate(lambda: simulate_authentications(keys, nonces, nonces, nonces)) * sessions
+    return result
+
+if __name__ == '__main__':
+    for name, value in sorted(benchmark().items()):
+        print "%-28s %12.0f" % (name, value)
@@ -0,0 +1,418 @@
+"""NDEF messages: incremental parsing from Type 2 and Type 4 tag memory, lazy records and encoding"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# Reading a tag is dominated by the frames exchanged with it, so the decoders
+# are fed tag memory as it is read, and say when the message is complete (and
+# how much more is needed until then), letting the reader stop as soon as it
+# has the message instead of reading the whole tag:
+#
+#   decoder = pyndef.Type2Decoder()
+#   page = 4
+#   while not decoder.feed(read_pages(page)):
+#       page += 4
+#   for record in decoder.message:
+#       ...
+#
+# Parsed records only decode their headers; their type, id and payload are
+# memoryview slices of the tag memory, copied only if the caller asks.
+
+import struct
+import collections
+
+# Type name formats
+TNF_EMPTY = 0x00
+TNF_WELL_KNOWN = 0x01
+TNF_MIME = 0x02
+TNF_URI = 0x03
+TNF_EXTERNAL = 0x04
+TNF_UNKNOWN = 0x05
+TNF_UNCHANGED = 0x06
+
+# Record header flags
+FLAG_MB = 0x80
+FLAG_ME = 0x40
+FLAG_CF = 0x20
+FLAG_SR = 0x10
+FLAG_IL = 0x08
+
+# Type 2 TLV types
+TLV_NULL = 0x00
+TLV_LOCK_CONTROL = 0x01
+TLV_MEMORY_CONTROL = 0x02
+TLV_NDEF = 0x03
+TLV_PROPRIETARY = 0xfd
+TLV_TERMINATOR = 0xfe
+
+# URI identifier codes for the abbreviations in URI records
+URI_PREFIXES = ("", "http://www.", "https://www.", "http://", "https://", "tel:", "mailto:",
+                "ftp://anonymous:anonymous@", "ftp://ftp.", "ftps://", "sftp://", "smb://", "nfs://", "ftp://",
+                "dav://", "news:", "telnet://", "imap:", "rtsp://", "urn:", "pop:", "sip:", "sips:", "tftp:",
+                "btspp://", "btl2cap://", "btgoep://", "tcpobex://", "irdaobex://", "file://", "urn:epc:id:",
+                "urn:epc:tag:", "urn:epc:pat:", "urn:epc:raw:", "urn:epc:", "urn:nfc:")
+
+class Record(collections.namedtuple('Record', 'tnf type id payload')):
+    """An NDEF record to be encoded, the type, id and payload being any buffers"""
+    __slots__ = ()
+
+class RecordView(object):
+    """A record parsed lazily from a buffer
+
+       Only the header is decoded; type, id and payload are memoryviews of
+       the buffer, and stay valid only as long as it is unchanged.  Chunked
+       records (chunked is True) are not joined.
+    """
+    __slots__ = ['_buf', '_view', 'flags', 'tnf', 'offset', 'size', '_type', '_id', '_payload']
+
+    def __init__(self, buf, view, offset, end):
+        if offset + 3 > end:
+            raise ValueError("Truncated NDEF record header at offset %d" % offset)
+        flags, type_len = struct.unpack_from(">BB", buf, offset)
+        pos = offset + 2
+        if flags & FLAG_SR:
+            payload_len, = struct.unpack_from(">B", buf, pos)
+            pos += 1
+        else:
+            if pos + 4 > end:
+                raise ValueError("Truncated NDEF record header at offset %d" % offset)
+            payload_len, = struct.unpack_from(">I", buf, pos)
+            pos += 4
+        id_len = 0
+        if flags & FLAG_IL:
+            if pos + 1 > end:
+                raise ValueError("Truncated NDEF record header at offset %d" % offset)
+            id_len, = struct.unpack_from(">B", buf, pos)
+            pos += 1
+        self._buf = buf
+        self._view = view
+        self.flags = flags
+        self.tnf = flags & 0x07
+        self.offset = offset
+        # Positions of the type, id and payload
+        self._type = pos
+        self._id = pos + type_len
+        self._payload = self._id + id_len
+        self.size = self._payload + payload_len - offset
+        if offset + self.size > end:
+            raise ValueError("Truncated NDEF record at offset %d" % offset)
+
+    def __repr__(self):
+        return "<RecordView tnf=%d type=%r %d byte payload>" % (self.tnf, self.type.tobytes(), len(self.payload))
+
+    @property
+    def type(self):
+        return self._view[self._type:self._id]
+
+    @property
+    def id(self):
+        return self._view[self._id:self._payload]
+
+    @property
+    def payload(self):
+        return self._view[self._payload:self.offset + self.size]
+
+    @property
+    def begins(self):
+        return bool(self.flags & FLAG_MB)
+
+    @property
+    def ends(self):
+        return bool(self.flags & FLAG_ME)
+
+    @property
+    def chunked(self):
+        return bool(self.flags & FLAG_CF)
+
+    def copy(self):
+        """Returns the record as a Record of strings, independent of the buffer"""
+        return Record(self.tnf, self.type.tobytes(), self.id.tobytes(), self.payload.tobytes())
+
+class Message(object):
+    """An NDEF message parsed lazily from length bytes of buf (a str or bytearray) from offset
+
+       Records are only parsed as they are iterated over or indexed.
+    """
+    def __init__(self, buf, offset = 0, length = None):
+        if length is None:
+            length = len(buf) - offset
+        self._buf = buf
+        self._view = memoryview(buf)
+        self.offset = offset
+        self.length = length
+        self._records = []
+        # Offset of the next record to parse, or None once the last one has been
+        self._next = offset if length else None
+
+    def __repr__(self):
+        return "<Message %d bytes>" % self.length
+
+    def _parse(self):
+        record = RecordView(self._buf, self._view, self._next, self.offset + self.length)
+        self._records.append(record)
+        self._next = record.offset + record.size
+        if record.ends or self._next >= self.offset + self.length:
+            self._next = None
+        return record
+
+    def __iter__(self):
+        for record in self._records:
+            yield record
+        while self._next is not None:
+            yield self._parse()
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        while index >= len(self._records) and self._next is not None:
+            self._parse()
+        return self._records[index]
+
+    def __len__(self):
+        while self._next is not None:
+            self._parse()
+        return len(self._records)
+
+    def tobytes(self):
+        """Returns the encoded message as a string"""
+        return self._view[self.offset:self.offset + self.length].tobytes()
+
+### Decoders
+
+class Type2Decoder(object):
+    """Finds the NDEF message TLV in the data area of an NFC Forum Type 2 tag, fed as it is read
+
+       The data area starts at page 4.  Lock and memory control TLVs are
+       skipped over, but the reserved areas they describe are not, so the
+       message is expected to be in one contiguous area (as on Ultralight
+       and NTAG tags).
+    """
+    def __init__(self):
+        self.buf = bytearray()
+        self.pos = 0
+        self.done = False
+        self.message = None
+        # Bytes needed before any more progress can be made
+        self.needed = 1
+
+    def feed(self, data):
+        """Adds the next bytes of tag memory, returning True once no more are needed
+
+           message is then the NDEF message, or None if the tag holds none.
+        """
+        if self.done:
+            return True
+        self.buf += data
+        buf = self.buf
+        while True:
+            available = len(buf) - self.pos
+            # Bytes of the current TLV needed to make progress
+            wanted = 1
+            if available >= 1:
+                tlv = buf[self.pos]
+                if tlv == TLV_NULL:
+                    self.pos += 1
+                    continue
+                if tlv == TLV_TERMINATOR:
+                    self.done = True
+                    break
+                wanted = 2
+            if available >= 2:
+                length = buf[self.pos + 1]
+                header = 2
+                if length == 0xff:
+                    header = 4
+                    wanted = 4
+                    if available >= 4:
+                        length, = struct.unpack_from(">H", buf, self.pos + 2)
+                if available >= header:
+                    wanted = header + length
+                    if available >= wanted:
+                        if tlv == TLV_NDEF:
+                            self.message = Message(buf, self.pos + header, length)
+                            self.done = True
+                            break
+                        self.pos += wanted
+                        continue
+            self.needed = wanted - available
+            return False
+        self.needed = 0
+        return True
+
+class Type4Decoder(object):
+    """Reads the NDEF message from the NDEF file of an NFC Forum Type 4 tag, fed as it is read from offset 0"""
+    def __init__(self):
+        self.buf = bytearray()
+        self.done = False
+        self.message = None
+        # Bytes needed before any more progress can be made (the NLEN field first)
+        self.needed = 2
+
+    def feed(self, data):
+        """Adds the next bytes of the NDEF file, returning True once no more are needed
+
+           message is then the NDEF message, or None if the file is empty.
+        """
+        if self.done:
+            return True
+        self.buf += data
+        length = None
+        if len(self.buf) >= 2:
+            length, = struct.unpack_from(">H", self.buf, 0)
+            self.done = len(self.buf) >= 2 + length
+        if self.done:
+            self.needed = 0
+            if length:
+                self.message = Message(self.buf, 2, length)
+        elif length is None:
+            self.needed = 2 - len(self.buf)
+        else:
+            self.needed = 2 + length - len(self.buf)
+        return self.done
+
+def _decode(decoder, chunks):
+    for chunk in chunks:
+        if decoder.feed(chunk):
+            return decoder.message
+    raise ValueError("Tag memory ended before the NDEF message")
+
+def decode_type2(chunks):
+    """Returns the NDEF message (or None) from an iterable of Type 2 tag memory chunks, starting at page 4
+
+       Chunks are only taken from the iterable until the message is complete,
+       so a generator reading the tag stops reading as soon as possible.
+    """
+    return _decode(Type2Decoder(), chunks)
+
+def decode_type4(chunks):
+    """Returns the NDEF message (or None) from an iterable of chunks of a Type 4 NDEF file, starting at offset 0"""
+    return _decode(Type4Decoder(), chunks)
+
+### Encoding
+
+def _fields(record):
+    return record.tnf, record.type, record.id, record.payload
+
+def record_size(record):
+    """Returns the number of bytes record encodes to"""
+    _tnf, rtype, rid, payload = _fields(record)
+    size = 2 + (1 if len(payload) < 256 else 4) + len(rtype) + len(payload)
+    if len(rid):
+        size += 1 + len(rid)
+    return size
+
+def encoded_size(records):
+    """Returns the number of bytes a message of records encodes to"""
+    return sum([record_size(record) for record in records])
+
+def encode_into(records, buf, offset = 0):
+    """Encodes a message of records into the writable buffer buf at offset, returning the offset after it"""
+    records = list(records)
+    if not records:
+        raise ValueError("An NDEF message must hold at least one record")
+    for index, record in enumerate(records):
+        tnf, rtype, rid, payload = _fields(record)
+        flags = tnf & 0x07
+        if len(rid):
+            flags |= FLAG_IL
+        if index == 0:
+            flags |= FLAG_MB
+        if index == len(records) - 1:
+            flags |= FLAG_ME
+        if len(payload) < 256:
+            struct.pack_into(">BBB", buf, offset, flags | FLAG_SR, len(rtype), len(payload))
+            offset += 3
+        else:
+            struct.pack_into(">BBI", buf, offset, flags, len(rtype), len(payload))
+            offset += 6
+        if len(rid):
+            struct.pack_into(">B", buf, offset, len(rid))
+            offset += 1
+        for field in (rtype, rid, payload):
+            buf[offset:offset + len(field)] = field
+            offset += len(field)
+    return offset
+
+def encode(records):
+    """Returns a message of records encoded into a new bytearray"""
+    buf = bytearray(encoded_size(records))
+    encode_into(records, buf)
+    return buf
+
+def type2_size(records):
+    """Returns the number of bytes encode_type2_into writes for records"""
+    size = encoded_size(records)
+    return size + (2 if size < 0xff else 4) + 1
+
+def encode_type2_into(records, buf, offset = 0):
+    """Encodes records as an NDEF message TLV followed by a terminator TLV, for the data area of a Type 2 tag
+
+       Returns the offset after the terminator.
+    """
+    size = encoded_size(records)
+    if size < 0xff:
+        struct.pack_into(">BB", buf, offset, TLV_NDEF, size)
+        offset += 2
+    else:
+        struct.pack_into(">BBH", buf, offset, TLV_NDEF, 0xff, size)
+        offset += 4
+    offset = encode_into(records, buf, offset)
+    struct.pack_into(">B", buf, offset, TLV_TERMINATOR)
+    return offset + 1
+
+def encode_type4_into(records, buf, offset = 0):
+    """Encodes records preceded by their length (NLEN), for the NDEF file of a Type 4 tag
+
+       Returns the offset after the message.
+    """
+    end = encode_into(records, buf, offset + 2)
+    struct.pack_into(">H", buf, offset, end - offset - 2)
+    return end
+
+### Well known records
+
+def _bytes(buf):
+    if isinstance(buf, memoryview):
+        return buf.tobytes()
+    return str(buf)
+
+def uri_record(uri):
+    """Returns a URI record for uri, abbreviating its prefix"""
+    code = 0
+    for i, prefix in enumerate(URI_PREFIXES):
+        if prefix and uri.startswith(prefix) and len(prefix) > len(URI_PREFIXES[code]):
+            code = i
+    return Record(TNF_WELL_KNOWN, "U", "", chr(code) + uri[len(URI_PREFIXES[code]):])
+
+def decode_uri(payload):
+    """Returns the URI from the payload of a URI record"""
+    payload = _bytes(payload)
+    code = ord(payload[0])
+    prefix = URI_PREFIXES[code] if code < len(URI_PREFIXES) else ""
+    return prefix + payload[1:]
+
+def text_record(text, language = "en"):
+    """Returns a text record holding text (unicode), encoded as UTF-8"""
+    return Record(TNF_WELL_KNOWN, "T", "", chr(len(language)) + language + text.encode('utf-8'))
+
+def decode_text(payload):
+    """Returns the (text, language) from the payload of a text record"""
+    payload = _bytes(payload)
+    status = ord(payload[0])
+    language_len = status & 0x3f
+    encoding = 'utf-16' if status & 0x80 else 'utf-8'
+    return payload[1 + language_len:].decode(encoding), payload[1:1 + language_len]
@@ -0,0 +1,495 @@
+"""Pythonic helpers layered over the raw libnfc bindings"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import sys
+import time
+import struct
+import ctypes
+import collections
+import nfc
+
+# Largest frame a PN53x based reader will return
+MAX_FRAME_LEN = 264
+
+# Errors caused by the card rather than the reader, which leave the reader's settings intact
+CARD_ERRORS = (nfc.NFC_ETIMEOUT, nfc.NFC_ERFTRANS, nfc.NFC_EMFCAUTHFAIL, nfc.NFC_ETGRELEASED)
+
+def _monotonic_clock():
+    """Returns a clock function unaffected by changes to the system time, in seconds"""
+    try:
+        return time.monotonic
+    except AttributeError:
+        pass
+    # Python 2 has no monotonic clock, so call clock_gettime directly
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+    clock_id = {'darwin': 6}.get(sys.platform, 1)
+    clock_gettime = None
+    for libname in (None, "librt.so.1"):
+        try:
+            clock_gettime = ctypes.CDLL(libname).clock_gettime
+            break
+        except (OSError, AttributeError):
+            pass
+    if clock_gettime is None:
+        return time.time
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    ts = timespec()
+    if clock_gettime(clock_id, ctypes.byref(ts)) != 0:
+        return time.time
+    def monotonic():
+        ts = timespec()
+        clock_gettime(clock_id, ctypes.byref(ts))
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+    return monotonic
+
+monotonic = _monotonic_clock()
+
+def uint8_view(buf):
+    """Returns a c_uint8 array over the contents of buf
+
+       Writable buffers (bytearray, ctypes arrays) are shared rather than copied,
+       read-only ones (str, memoryview) are copied once.
+    """
+    try:
+        return (ctypes.c_uint8 * len(buf)).from_buffer(buf)
+    except TypeError:
+        pass
+    try:
+        return (ctypes.c_uint8 * len(buf)).from_buffer_copy(buf)
+    except TypeError:
+        # Python 2 memoryviews do not expose the old buffer interface
+        return (ctypes.c_uint8 * len(buf)).from_buffer_copy(buf.tobytes())
+
+def transceive_into(device, tx, rx, timeout = 0):
+    """Sends tx to the selected target and writes the response into rx
+
+       rx must be a writable buffer (ideally a bytearray reused across calls),
+       tx may be any buffer.  Returns the libnfc result: the number of bytes
+       received, or a negative libnfc error code.
+    """
+    abtrx = rx if isinstance(rx, ctypes.Array) else (ctypes.c_uint8 * len(rx)).from_buffer(rx)
+    abttx = uint8_view(tx)
+    return nfc.nfc_initiator_transceive_bytes(device, abttx, len(abttx), abtrx, len(abtrx), timeout)
+
+def transceive(device, tx, rx = None, timeout = 0):
+    """Sends tx to the selected target and returns the response
+
+       The response is written into rx, a bytearray that callers should keep and
+       reuse between frames; a new one of MAX_FRAME_LEN bytes is made if none is given.
+       Returns a memoryview of rx covering just the bytes received, or raises
+       IOError carrying the libnfc error code.
+    """
+    if rx is None:
+        rx = bytearray(MAX_FRAME_LEN)
+    res = transceive_into(device, tx, rx, timeout)
+    if res < 0:
+        raise IOError(res, "Error transceiving bytes")
+    return memoryview(rx)[:res]
+
+### Target records
+
+# An nfc_target is a ~300 byte union, most of which is unused padding for any
+# one modulation, so targets that are kept (for instance in event queues) are
+# decoded into small immutable records instead.  The fields of each record
+# mirror the members of its nfc_target_info structure, in order, with byte
+# arrays as strings trimmed to their length members.
+
+class Target(collections.namedtuple('Target', 'modulation baud_rate')):
+    """A target of a modulation type with no specific record"""
+    __slots__ = ()
+
+class ISO14443ATarget(collections.namedtuple('ISO14443ATarget', 'modulation baud_rate atqa sak uid ats')):
+    """An ISO14443A target, decoded from nfc_iso14443a_info"""
+    __slots__ = ()
+
+class FelicaTarget(collections.namedtuple('FelicaTarget', 'modulation baud_rate res_code id pad sys_code')):
+    """A FeliCa target, decoded from nfc_felica_info"""
+    __slots__ = ()
+    uid = property(lambda self: self.id)
+
+class ISO14443BTarget(collections.namedtuple('ISO14443BTarget',
+                                             'modulation baud_rate pupi application_data protocol_info card_identifier')):
+    """An ISO14443B target, decoded from nfc_iso14443b_info"""
+    __slots__ = ()
+    uid = property(lambda self: self.pupi)
+
+class ISO14443BITarget(collections.namedtuple('ISO14443BITarget', 'modulation baud_rate div ver_log config atr')):
+    """An ISO14443B' target, decoded from nfc_iso14443bi_info"""
+    __slots__ = ()
+    uid = property(lambda self: self.div)
+
+class ISO14443B2SRTarget(collections.namedtuple('ISO14443B2SRTarget', 'modulation baud_rate uid')):
+    """An ST SRx target, decoded from nfc_iso14443b2sr_info"""
+    __slots__ = ()
+
+class ISO14443B2CTTarget(collections.namedtuple('ISO14443B2CTTarget', 'modulation baud_rate uid prod_code fab_code')):
+    """An ASK CTx target, decoded from nfc_iso14443b2ct_info"""
+    __slots__ = ()
+
+class JewelTarget(collections.namedtuple('JewelTarget', 'modulation baud_rate sens_res id')):
+    """An Innovision Jewel target, decoded from nfc_jewel_info"""
+    __slots__ = ()
+    uid = property(lambda self: self.id)
+
+class DEPTarget(collections.namedtuple('DEPTarget', 'modulation baud_rate nfcid3 did bs br to pp gb ndm')):
+    """An NFC-DEP target, decoded from nfc_dep_info"""
+    __slots__ = ()
+    uid = property(lambda self: self.nfcid3)
+
+def _target_decoder(record, info, members):
+    """Returns a function decoding the raw bytes of an nfc_target into record
+
+       members names the members of the nfc_target_info structure info making up
+       the record's fields.  An array can be given as (array, length member) to
+       trim it to the length held in the other member.
+    """
+    types = dict(info._fields_)
+    steps = []
+    for member in members:
+        length = None
+        if isinstance(member, tuple):
+            member, length = member
+            length = (getattr(info, length).offset, struct.Struct(types[length]._type_).unpack_from)
+        field = getattr(info, member)
+        if issubclass(types[member], ctypes.Array):
+            steps.append((field.offset, field.size, None, length))
+        else:
+            steps.append((field.offset, field.size, struct.Struct(types[member]._type_).unpack_from, None))
+
+    def decode(raw, modulation, baud_rate):
+        values = [modulation, baud_rate]
+        for offset, size, unpack, length in steps:
+            if unpack is not None:
+                values.append(unpack(raw, offset)[0])
+                continue
+            if length is not None:
+                size = min(size, length[1](raw, length[0])[0])
+            values.append(raw[offset:offset + size])
+        return record._make(values)
+    return decode
+
+_TARGET_DECODERS = {
+    nfc.NMT_ISO14443A: _target_decoder(ISO14443ATarget, nfc.nfc_iso14443a_info,
+                                       ['abtAtqa', 'btSak', ('abtUid', 'szUidLen'), ('abtAts', 'szAtsLen')]),
+    nfc.NMT_FELICA: _target_decoder(FelicaTarget, nfc.nfc_felica_info,
+                                    ['btResCode', 'abtId', 'abtPad', 'abtSysCode']),
+    nfc.NMT_ISO14443B: _target_decoder(ISO14443BTarget, nfc.nfc_iso14443b_info,
+                                       ['abtPupi', 'abtApplicationData', 'abtProtocolInfo', 'ui8CardIdentifier']),
+    nfc.NMT_ISO14443BI: _target_decoder(ISO14443BITarget, nfc.nfc_iso14443bi_info,
+                                        ['abtDIV', 'btVerLog', 'btConfig', ('abtAtr', 'szAtrLen')]),
+    nfc.NMT_ISO14443B2SR: _target_decoder(ISO14443B2SRTarget, nfc.nfc_iso14443b2sr_info, ['abtUID']),
+    nfc.NMT_ISO14443B2CT: _target_decoder(ISO14443B2CTTarget, nfc.nfc_iso14443b2ct_info,
+                                          ['abtUID', 'btProdCode', 'btFabCode']),
+    nfc.NMT_JEWEL: _target_decoder(JewelTarget, nfc.nfc_jewel_info, ['btSensRes', 'btId']),
+    nfc.NMT_DEP: _target_decoder(DEPTarget, nfc.nfc_dep_info,
+                                 ['abtNFCID3', 'btDID', 'btBS', 'btBR', 'btTO', 'btPP', ('abtGB', 'szGB'), 'ndm']),
+}
+
+_TARGET_SIZE = ctypes.sizeof(nfc.nfc_target)
+_MODULATION_OFFSET = nfc.nfc_target.nm.offset
+_MODULATION = struct.Struct(nfc.nfc_modulation_type._type_ + nfc.nfc_baud_rate._type_)
+
+def decode_target(target):
+    """Returns an immutable record of an nfc_target, chosen by its modulation type
+
+       The target is copied out with a single string_at, and the record keeps
+       none of the ctypes structure.
+    """
+    raw = ctypes.string_at(ctypes.addressof(target), _TARGET_SIZE)
+    modulation, baud_rate = _MODULATION.unpack_from(raw, _MODULATION_OFFSET)
+    decoder = _TARGET_DECODERS.get(modulation)
+    if decoder is None:
+        return Target(modulation, baud_rate)
+    return decoder(raw, modulation, baud_rate)
+
+class Context(object):
+    """A libnfc context, released with nfc_exit when closed
+
+       Instances can be passed directly to the raw nfc functions, and used
+       as context managers so that nfc_exit is called even on error paths.
+    """
+    def __init__(self):
+        self._as_parameter_ = ctypes.POINTER(nfc.nfc_context)()
+        nfc.nfc_init(ctypes.byref(self._as_parameter_))
+        if not self._as_parameter_:
+            raise IOError("Unable to initialize libnfc")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        return not self._as_parameter_
+
+    def list_devices(self, max_devices = 10):
+        """Returns the connection strings of up to max_devices attached readers"""
+        conn_strings = (nfc.nfc_connstring * max_devices)()
+        found = nfc.nfc_list_devices(self, conn_strings, max_devices)
+        return [conn_strings[i].value for i in range(min(found, max_devices))]
+
+    def open(self, connstring = None, modulations = None):
+        """Opens the reader at connstring, or the first one found if connstring is None"""
+        return Device(self, connstring, modulations)
+
+    def close(self):
+        """Releases the context, it must not be used afterwards"""
+        if self._as_parameter_:
+            nfc.nfc_exit(self)
+            self._as_parameter_ = ctypes.POINTER(nfc.nfc_context)()
+
+class Device(object):
+    """An open reader, closed with nfc_close when no longer needed
+
+       The device owns the native structures needed to talk to targets (the
+       modulation list, the nfc_target filled in by polling and selecting,
+       and the receive buffer) and reuses them for its whole lifetime, so
+       polling and exchanging frames does not allocate.
+
+       The value last set for each nfc_property is remembered, and setting a
+       property to the value it already has is skipped (and counted in
+       elided_properties), since each set is a round trip to the reader.  The
+       record is forgotten by initiator_init and idle, after polling and listing
+       targets (libnfc sets properties such as NP_INFINITE_SELECT itself while
+       doing so), and whenever the reader reports an error, so properties must
+       only be set through the Device.
+    """
+    DEFAULT_MODULATIONS = [(nfc.NMT_ISO14443A, nfc.NBR_106)]
+
+    def __init__(self, context, connstring = None, modulations = None):
+        if connstring is None:
+            connstrings = context.list_devices(1)
+            if not connstrings:
+                raise IOError("No NFC device found")
+            connstring = connstrings[0]
+        self.context = context
+        self.connstring = connstring
+
+        abtconn = nfc.nfc_connstring()
+        abtconn.value = connstring
+        self._as_parameter_ = nfc.nfc_open(context, abtconn)
+        if not self._as_parameter_:
+            raise IOError("Unable to open NFC device %s" % connstring)
+
+        self.target = nfc.nfc_target()
+        self.rx = bytearray(MAX_FRAME_LEN)
+        self._abtrx = (ctypes.c_uint8 * MAX_FRAME_LEN).from_buffer(self.rx)
+        # Only bit level exchanges need a parity buffer, made on first use
+        self.rx_parity = None
+        self._abtrx_parity = None
+        self._properties = {}
+        self.elided_properties = 0
+        # Array for listing targets into, made on first use
+        self._targets = None
+        self.modulations = None
+        self.set_modulations(modulations or self.DEFAULT_MODULATIONS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        return not self._as_parameter_
+
+    def close(self):
+        """Closes the device, it must not be used afterwards"""
+        self._properties.clear()
+        if self._as_parameter_:
+            nfc.nfc_close(self)
+            self._as_parameter_ = ctypes.POINTER(nfc.nfc_device)()
+
+    def set_modulations(self, modulations):
+        """Sets the (modulation type, baud rate) pairs used when polling and selecting"""
+        self.modulations = (nfc.nfc_modulation * len(modulations))()
+        for i, (nmt, nbr) in enumerate(modulations):
+            self.modulations[i].nmt = nmt
+            self.modulations[i].nbr = nbr
+
+    def _failed(self, res):
+        """Forgets the property values unless error code res was caused by the card"""
+        if res not in CARD_ERRORS:
+            self._properties.clear()
+
+    def initiator_init(self):
+        """Puts the device into initiator mode, which resets its properties"""
+        self._properties.clear()
+        if nfc.nfc_initiator_init(self) < 0:
+            raise IOError("Error initializing device as initiator")
+
+    def emulate(self, emulator, timeout = 0):
+        """Emulates a target with an nfc_emulator until its io function or the initiator ends it
+
+           Target mode reconfigures the device, so initiator_init must be
+           called again before the device is next used as an initiator.
+           Returns the libnfc result, 0 or a negative error code.
+        """
+        self._properties.clear()
+        return nfc.nfc_emulate_target(self, emulator, timeout)
+
+    def abort(self):
+        """Aborts the command currently running on the device
+
+           This is the only call that may be made while another thread is blocked on the device.
+        """
+        return nfc.nfc_abort_command(self)
+
+    def idle(self):
+        """Turns off the RF field and puts the device into its low power mode
+
+           initiator_init must be called again before the device is next used.
+        """
+        self._properties.clear()
+        if nfc.nfc_idle(self) < 0:
+            raise IOError("Error idling device")
+
+    def set_property(self, prop, value):
+        """Sets a boolean nfc_property on the device, unless it is already set to value"""
+        value = bool(value)
+        if self._properties.get(prop) is value:
+            self.elided_properties += 1
+            return
+        res = nfc.nfc_device_set_property_bool(self, prop, value)
+        if res < 0:
+            self._properties.clear()
+            raise IOError(res, "Error setting device property %d" % prop)
+        self._properties[prop] = value
+
+    def set_property_int(self, prop, value):
+        """Sets an integer nfc_property (such as a timeout) on the device, unless it is already set to value"""
+        if prop in self._properties and self._properties[prop] == value:
+            self.elided_properties += 1
+            return
+        res = nfc.nfc_device_set_property_int(self, prop, value)
+        if res < 0:
+            self._properties.clear()
+            raise IOError(res, "Error setting device property %d" % prop)
+        self._properties[prop] = value
+
+    def poll(self, poll_nr = 10, period = 2):
+        """Polls for a target using each of the device's modulations in turn
+
+           Returns the number of targets found, the found target is left in self.target
+        """
+        res = nfc.nfc_initiator_poll_target(self, self.modulations, len(self.modulations), poll_nr, period,
+                                            ctypes.byref(self.target))
+        self._properties.clear()
+        if res < 0:
+            self._failed(res)
+            raise IOError(res, "NFC Error whilst polling")
+        return res
+
+    def select(self, modulation = 0):
+        """Selects a passive target using the modulation at the given index
+
+           Returns the number of targets selected, the target is left in self.target
+        """
+        res = nfc.nfc_initiator_select_passive_target(self, self.modulations[modulation], None, 0,
+                                                      ctypes.byref(self.target))
+        if res < 0:
+            self._failed(res)
+        return res
+
+    def is_present(self):
+        """Returns whether the selected target (self.target) is still in the field
+
+           This is much cheaper than polling for the target again.  Raises
+           IOError if the check fails for another reason, for instance if the
+           reader cannot check presence (NFC_ENOTIMPL or NFC_EDEVNOTSUPP).
+        """
+        res = nfc.nfc_initiator_target_is_present(self, self.target)
+        if res == 0:
+            return True
+        if res in CARD_ERRORS:
+            return False
+        self._failed(res)
+        raise IOError(res, "NFC Error whilst checking target presence")
+
+    def list_targets(self, modulation = 0, max_targets = 16):
+        """Selects every passive target in the field using the modulation at the given index
+
+           The targets are listed into an nfc_target array kept by the device,
+           and returned as a list of Target records (see decode_target).
+        """
+        if self._targets is None or len(self._targets) < max_targets:
+            self._targets = (nfc.nfc_target * max_targets)()
+        res = nfc.nfc_initiator_list_passive_targets(self, self.modulations[modulation], self._targets, max_targets)
+        self._properties.clear()
+        if res < 0:
+            self._failed(res)
+            raise IOError(res, "NFC Error whilst listing targets")
+        return [decode_target(self._targets[i]) for i in range(res)]
+
+    def decode_target(self):
+        """Returns an immutable record of self.target (see decode_target)"""
+        return decode_target(self.target)
+
+    def uid(self):
+        """Returns the ISO14443A UID of self.target"""
+        nai = self.target.nti.nai
+        return ctypes.string_at(ctypes.addressof(nai.abtUid), min(nai.szUidLen, len(nai.abtUid)))
+
+    def transceive_into(self, tx, timeout = 0):
+        """Sends tx to the selected target, writing the response into self.rx
+
+           Returns the libnfc result, the number of bytes received or a negative error code
+        """
+        abttx = uint8_view(tx)
+        res = nfc.nfc_initiator_transceive_bytes(self, abttx, len(abttx), self._abtrx, MAX_FRAME_LEN, timeout)
+        if res < 0:
+            self._failed(res)
+        return res
+
+    def transceive(self, tx, timeout = 0):
+        """Sends tx to the selected target and returns a memoryview of the response
+
+           The view is into the device's receive buffer, and is only valid until the next exchange.
+        """
+        res = self.transceive_into(tx, timeout)
+        if res < 0:
+            raise IOError(res, "Error transceiving bytes")
+        return memoryview(self.rx)[:res]
+
+    def transceive_bits(self, tx, bits = None, tx_parity = None):
+        """Sends a frame of bits bits (all of tx by default) and returns the response bits
+
+           With NP_HANDLE_PARITY off, tx_parity holds one parity bit per byte of tx
+           (py14443a.wrap_frame builds both).  Returns a memoryview of the response in self.rx,
+           a memoryview of its parity bits in self.rx_parity, and the number of
+           bits received.  Both views are only valid until the next exchange.
+        """
+        if self._abtrx_parity is None:
+            self.rx_parity = bytearray(MAX_FRAME_LEN)
+            self._abtrx_parity = (ctypes.c_uint8 * MAX_FRAME_LEN).from_buffer(self.rx_parity)
+        abttx = uint8_view(tx)
+        if bits is None:
+            bits = len(abttx) * 8
+        abttxpar = uint8_view(tx_parity) if tx_parity is not None else None
+        res = nfc.nfc_initiator_transceive_bits(self, abttx, bits, abttxpar, self._abtrx, MAX_FRAME_LEN,
+                                                self._abtrx_parity)
+        if res < 0:
+            self._failed(res)
+            raise IOError(res, "Error transceiving bits")
+        nbytes = (res + 7) // 8
+        return memoryview(self.rx)[:nbytes], memoryview(self.rx_parity)[:nbytes], res
@@ -28,6 +28,9 @@ setup(
     author = "Mike Auty",
     data_files = [('examples', ['mifareauth.py'])],
     license = "GPL-2",
-    py_modules = ['pynfc', 'pycrypto1', 'py14443a']
+    py_modules = ['nfc', 'pynfc', 'poller', 'nfcaio', 'keycache', 'pycrypto1', 'py14443a', 'nfcsim', 'nfcstats', 'inventory', 'presence', 'emulator', 'pyndef', 'ultralight', 'isodep', 'cardstore'],
+    packages = ['bench'],
+    # The asyncio and concurrent.futures backports used by nfcaio
+    requires = ['trollius', 'futures']
 )
 
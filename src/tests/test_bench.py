@@ -0,0 +1,65 @@
+"""Smoke tests of the bench package against a simulated reader"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import nfcsim
+import bench
+import bench.__main__
+
+class BenchTest(unittest.TestCase):
+    def tearDown(self):
+        nfcsim.uninstall()
+
+    def test_run(self):
+        reader = bench.install_sim(5)
+        results = bench.run(5, duration = 10)
+        self.assertEqual(results['taps'], 5)
+        self.assertEqual(results['operations']['read_card']['count'], 5)
+        self.assertEqual(results['operations']['presence_wait']['count'], 5)
+        # Every block of every card, read one frame at a time after one authentication per sector
+        self.assertEqual(results['frames']['count'], 5 * (64 + 16))
+        self.assertEqual(results['frames']['count'], reader.calls['nfc_initiator_transceive_bytes'])
+        # Presence checks run back to back, so reading dominates
+        self.assertTrue(results['presence_wait_seconds'] < results['read_seconds'])
+        self.assertTrue(results['reads_per_second'] >= results['taps_per_second'] > 0)
+
+    def test_percentile(self):
+        self.assertEqual(bench.percentile(range(1, 101), 50), 50)
+        self.assertEqual(bench.percentile(range(1, 101), 99), 99)
+        self.assertEqual(bench.percentile([3], 90), 3)
+        self.assertEqual(bench.percentile([], 50), None)
+
+    def test_main_writes_json(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "results.json")
+            bench.__main__.main(["--sim", "--taps", "3", "--latency", "transceive=0.0001", "--output", path])
+            with open(path) as results:
+                self.assertEqual(json.load(results)['taps'], 3)
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Tests of the memory-mapped card image store"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import nfcsim
+import pynfc
+import cardstore
+import mifareauth
+
+UID = "\x01\x02\x03\x04"
+
+class CardStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cards.db")
+        self.store = cardstore.CardStore(self.path, index_capacity = 16)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_append_and_get(self):
+        self.store.append(UID, cardstore.CLASSIC_1K, {0: "a" * 16, 1: "", 5: "b" * 10})
+        image = self.store.get(UID)
+        self.assertEqual(image.uid, UID)
+        self.assertEqual(image.layout, cardstore.CLASSIC_1K)
+        # Unread blocks are left out, short ones padded
+        self.assertEqual(image.blocks(), {0: "a" * 16, 5: "b" * 10 + "\x00" * 6})
+        self.assertFalse(image.valid(1))
+        self.assertEqual(self.store.get("\x09\x09\x09\x09"), None)
+
+    def test_history_and_diff(self):
+        first = self.store.append(UID, cardstore.CLASSIC_1K, {0: "a" * 16, 5: "b" * 16})
+        self.store.append(UID, cardstore.CLASSIC_1K, {0: "a" * 16, 5: "c" * 16, 6: "d" * 16})
+        history = list(self.store.history(UID))
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history[1].offset, first)
+        self.assertEqual(cardstore.diff(history[1], history[0]), [5, 6])
+        self.assertEqual(len(self.store), 1)
+
+    def test_index_grows(self):
+        for i in range(100):
+            self.store.append("\x04" + str(i).rjust(6, '0'), cardstore.NTAG213, "\x00" * 180)
+        self.assertEqual(len(self.store), 100)
+        self.assertTrue("\x04000042" in self.store)
+        self.assertEqual(len(self.store.get("\x04000042").data), 180)
+        self.assertEqual(sum([1 for _ in self.store]), 100)
+
+    def test_index_is_rebuilt(self):
+        self.store.append(UID, cardstore.CLASSIC_1K, {4: "x" * 16})
+        self.store.append("\x05\x06\x07\x08", cardstore.ULTRALIGHT, {4: "abcd"})
+        self.store.close()
+        os.remove(self.path + ".idx")
+        self.store = cardstore.CardStore(self.path)
+        self.assertEqual(sorted(self.store.uids()), [UID, "\x05\x06\x07\x08"])
+        self.assertEqual(self.store.get(UID).blocks(), {4: "x" * 16})
+
+    def test_reader_stores_cards_and_remembers_them(self):
+        tag = nfcsim.MifareClassicTag(UID)
+        nfcsim.install(nfcsim.SimReader(tags = [tag]))
+        try:
+            with pynfc.Context() as context:
+                with context.open() as device:
+                    nfc_reader = mifareauth.NFCReader(lambda message: None, card_store = self.store, device = device)
+                    device.initiator_init()
+                    device.poll()
+                    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+                    try:
+                        nfc_reader.read_card(UID)
+                    finally:
+                        sys.stdout.close()
+                        sys.stdout = stdout
+        finally:
+            nfcsim.uninstall()
+        self.assertEqual(len(self.store.get(UID).blocks()), 64)
+        # A new reader knows the card from the store, without reading it again
+        self.assertEqual(len(mifareauth.NFCReader(lambda message: None, card_store = self.store)._image(UID)), 64)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+"""Tests of the ISO14443A framing helpers and the Crypto1 cipher"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import ctypes
+import unittest
+
+import nfc
+import nfcsim
+import pynfc
+import py14443a
+import pycrypto1
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A Mifare Classic authentication with the default key, as traced for mfkey64
+TRACE_KEY = "\xff" * 6
+TRACE_UID = 0x9c599b32
+TRACE_NT = 0x82a4166c
+TRACE_NR = 0xefea1cda
+TRACE_NR_ENC = 0xa1e458ce
+TRACE_AR_ENC = 0x6eea41e0
+TRACE_AT_ENC = 0x5cadf439
+
+class Iso14443aTest(unittest.TestCase):
+    def test_crc_a(self):
+        # READ of block 0 and HLTA, as sent on air
+        self.assertEqual(py14443a.append_crc_a("\x30\x00"), "\x30\x00\x02\xa8")
+        self.assertEqual(py14443a.crc_a_bytes("\x50\x00"), "\x57\xcd")
+        self.assertTrue(py14443a.check_crc_a("\x30\x00\x02\xa8"))
+        self.assertFalse(py14443a.check_crc_a("\x30\x00\x02\xa9"))
+        self.assertTrue(py14443a.check_crc_a(bytearray("\x30\x00\x02\xa8")))
+
+    def test_crc_a_matches_libnfc(self):
+        nfcsim.install()
+        try:
+            frame = (ctypes.c_uint8 * 6)(0x30, 0x04, 0x01, 0x02, 0, 0)
+            nfc.iso14443a_crc_append(frame, 4)
+        finally:
+            nfcsim.uninstall()
+        self.assertEqual(py14443a.crc_a_bytes("\x30\x04\x01\x02"), "".join([chr(c) for c in frame[4:]]))
+
+    def test_parity(self):
+        self.assertEqual(py14443a.parity("\x00\x01\x03\xff"), "\x01\x00\x01\x01")
+        self.assertTrue(py14443a.check_parity("\x93\x20", py14443a.parity("\x93\x20")))
+
+    def test_wrap_frame(self):
+        frame, parity_bits = py14443a.wrap_frame("\x30\x00")
+        self.assertEqual((frame, parity_bits), ("\x30\x00\x02\xa8", "\x01\x01\x00\x00"))
+        self.assertTrue(isinstance(frame, bytearray) and isinstance(parity_bits, bytearray))
+        self.assertEqual(py14443a.wrap_frame("\x93\x20", crc = False), ("\x93\x20", "\x01\x00"))
+        # As Device.transceive_bits returns them
+        self.assertEqual(py14443a.unwrap_frame(memoryview(frame), memoryview(parity_bits), 32), "\x30\x00")
+        self.assertEqual(py14443a.unwrap_frame(frame, "\x01\x01\x00\x01"), None)
+        self.assertEqual(py14443a.unwrap_frame("\x30\x00\x02\xa9", py14443a.parity("\x30\x00\x02\xa9")), None)
+        # A four bit ACK has neither parity nor CRC
+        self.assertEqual(py14443a.unwrap_frame("\x0a", "", 4), "\x0a")
+
+    def test_raw_exchange(self):
+        tag = nfcsim.UltralightTag("\x04\x01\x02\x03\x04\x05\x06")
+        nfcsim.install(nfcsim.SimReader(tags = [tag]))
+        try:
+            with pynfc.Context() as context:
+                with context.open() as device:
+                    device.initiator_init()
+                    device.select()
+                    device.set_property(nfc.NP_HANDLE_CRC, False)
+                    device.set_property(nfc.NP_HANDLE_PARITY, False)
+                    frame, parity_bits = py14443a.wrap_frame("\x30\x04")
+                    rx, rx_parity, bits = device.transceive_bits(frame, tx_parity = parity_bits)
+                    self.assertEqual(py14443a.unwrap_frame(rx, rx_parity, bits), tag.data[16:32])
+                    # A frame without its CRC_A goes unanswered
+                    frame, parity_bits = py14443a.wrap_frame("\x30\x04", crc = False)
+                    self.assertRaises(IOError, device.transceive_bits, frame, tx_parity = parity_bits)
+        finally:
+            nfcsim.uninstall()
+
+    def test_crypto1_frames(self):
+        data = "\x30\x04\x26\xee"
+        cipher = pycrypto1.Crypto1(Crypto1Test.KEY)
+        frame, parity_bits = py14443a.crypto1_encrypt(cipher.copy(), data)
+        self.assertNotEqual(frame, data)
+        self.assertEqual(py14443a.crypto1_decrypt(cipher.copy(), frame, parity_bits), (data, True))
+        parity_bits[1] ^= 1
+        self.assertEqual(py14443a.crypto1_decrypt(cipher.copy(), frame, parity_bits), (data, False))
+
+    @unittest.skipIf(numpy is None, "Bulk framing requires numpy")
+    def test_bulk_frames(self):
+        commands = ["\x30\x04", "\x60\x00", "\x30\x3f"]
+        self.assertEqual(list(py14443a.crc_a_all("".join(commands), 2)),
+                         [py14443a.crc_a(command) for command in commands])
+        frames, parity_bits = py14443a.wrap_frames("".join(commands), 2)
+        self.assertEqual(py14443a.split_frames(frames, 4), [py14443a.wrap_frame(command)[0] for command in commands])
+        self.assertEqual(parity_bits, py14443a.parity(frames))
+        frames[5] ^= 0x01
+        self.assertEqual(py14443a.unwrap_frames(frames, parity_bits, 4),
+                         ("\x30\x04\x60\x01\x30\x3f", [True, False, True]))
+        self.assertRaises(ValueError, py14443a.wrap_frames, "\x30\x04\x60", 2)
+
+class Crypto1Test(unittest.TestCase):
+    KEY = "\xa0\xa1\xa2\xa3\xa4\xa5"
+
+    def test_prng_period(self):
+        # After 32 steps every bit of the nonce comes from the PRNG, whose period is 65535
+        nonce = pycrypto1.prng_successor(0x12345678, 32)
+        self.assertEqual(pycrypto1.prng_successor(nonce, 65535), nonce)
+        self.assertEqual(pycrypto1.prng_successor(pycrypto1.prng_successor(nonce, 64), 32),
+                         pycrypto1.prng_successor(nonce, 96))
+
+    def test_byte_matches_bits(self):
+        for encrypted in (False, True):
+            cipher = pycrypto1.Crypto1(self.KEY)
+            copy = cipher.copy()
+            for value in (0x00, 0x5a, 0xff):
+                expected = sum([copy.bit((value >> i) & 1, encrypted) << i for i in range(8)])
+                self.assertEqual(cipher.byte(value, encrypted), expected)
+            self.assertEqual(cipher.lfsr, copy.lfsr)
+
+    def test_crypt_round_trip(self):
+        data = "sixteen bytes!!!"
+        encrypted = pycrypto1.Crypto1(self.KEY).crypt(data)
+        self.assertNotEqual(encrypted, data)
+        self.assertEqual(pycrypto1.Crypto1(self.KEY).crypt(encrypted), data)
+
+    def test_authentication_trace(self):
+        cipher = pycrypto1.Crypto1(TRACE_KEY)
+        cipher.word(TRACE_UID ^ TRACE_NT)
+        cipher.word(TRACE_NR_ENC, True)
+        self.assertEqual(pycrypto1.prng_successor(TRACE_NT, 64) ^ cipher.word(), TRACE_AR_ENC)
+        self.assertEqual(pycrypto1.prng_successor(TRACE_NT, 96) ^ cipher.word(), TRACE_AT_ENC)
+
+@unittest.skipIf(numpy is None, "Crypto1Batch requires numpy")
+class Crypto1BatchTest(unittest.TestCase):
+    KEY = Crypto1Test.KEY
+
+    def test_batch_matches_single(self):
+        keys = [self.KEY, "\xff" * 6, 0x123456789abc]
+        batch = pycrypto1.Crypto1Batch(keys)
+        batch.word([0x01020304, 0x05060708, 0x090a0b0c])
+        stream = batch.keystream(8)
+        for i, (key, uid) in enumerate(zip(keys, [0x01020304, 0x05060708, 0x090a0b0c])):
+            cipher = pycrypto1.Crypto1(key)
+            cipher.word(uid)
+            self.assertEqual(cipher.keystream(8), stream[i].tostring())
+
+    def test_authentication_trace(self):
+        # The other session, with a wrong key, must not disturb the first
+        batch = pycrypto1.Crypto1Batch([TRACE_KEY, self.KEY])
+        batch.word([TRACE_UID ^ TRACE_NT] * 2)
+        batch.word([TRACE_NR_ENC] * 2, True)
+        self.assertEqual((pycrypto1.prng_successor(TRACE_NT, 64) ^ batch.word())[0], TRACE_AR_ENC)
+        self.assertEqual((pycrypto1.prng_successor(TRACE_NT, 96) ^ batch.word())[0], TRACE_AT_ENC)
+
+    def test_simulate_authentications(self):
+        nr_enc, ar_enc, at_enc = pycrypto1.simulate_authentications([TRACE_KEY] * 3, [TRACE_UID] * 3,
+                                                                    [TRACE_NT] * 3, [TRACE_NR] * 3)
+        self.assertEqual(list(nr_enc), [TRACE_NR_ENC] * 3)
+        self.assertEqual(list(ar_enc), [TRACE_AR_ENC] * 3)
+        self.assertEqual(list(at_enc), [TRACE_AT_ENC] * 3)
+
+if __name__ == '__main__':
+    unittest.main()
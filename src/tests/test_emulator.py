@@ -0,0 +1,87 @@
+"""Tests of tag emulation against a simulated initiator"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import unittest
+
+import nfcsim
+import pynfc
+import emulator
+
+MESSAGE = "\xd1\x01\x0cU\x04example.com"
+
+# A phone reading the tag, then trying to write to it and to select another application
+FRAMES = ["\x00\xa4\x04\x00\x07\xd2\x76\x00\x00\x85\x01\x01\x00",
+          "\x00\xa4\x00\x0c\x02\xe1\x03", "\x00\xb0\x00\x00\x0f",
+          "\x00\xa4\x00\x0c\x02\xe1\x04", "\x00\xb0\x00\x00\x02", "\x00\xb0\x00\x02" + chr(len(MESSAGE)),
+          "\x00\xd6\x00\x00\x01\x00", "\x00\xa4\x04\x00\x02\x01\x02", "\x00\xb0\x00\x00\x02"]
+
+class Type4TagEmulatorTest(unittest.TestCase):
+    def setUp(self):
+        self.reader = nfcsim.SimReader(initiator = FRAMES)
+        nfcsim.install(self.reader)
+        self.context = pynfc.Context()
+        self.device = self.context.open()
+        self.emulator = emulator.Type4TagEmulator(MESSAGE)
+
+    def tearDown(self):
+        self.device.close()
+        self.context.close()
+        nfcsim.uninstall()
+
+    def test_phone_reads_the_message(self):
+        self.assertTrue(self.emulator.run(self.device))
+        responses = self.reader.responses
+        self.assertEqual(len(responses), len(FRAMES))
+        self.assertEqual(responses[0], emulator.SW_OK)
+        self.assertEqual(responses[2][:-2][:7], "\x00\x0f\x20\x00\xf6\x00\xff")
+        self.assertEqual(responses[4], "\x00" + chr(len(MESSAGE)) + emulator.SW_OK)
+        self.assertEqual(responses[5], MESSAGE + emulator.SW_OK)
+        self.assertEqual(responses[6], emulator.SW_SECURITY_NOT_SATISFIED)
+        self.assertEqual(responses[7], emulator.SW_NOT_FOUND)
+        # Selecting another application leaves nothing selected
+        self.assertEqual(responses[8], emulator.SW_NO_CURRENT_EF)
+        self.assertEqual(self.emulator.frames, len(FRAMES))
+
+    def test_responses_are_prepared(self):
+        self.emulator.run(self.device)
+        first = self.emulator.misses
+        self.emulator.run(self.device)
+        self.assertEqual(self.emulator.misses, first)
+        self.assertEqual(self.reader.calls['nfc_emulate_target'], 2)
+
+    def test_set_message(self):
+        self.emulator.set_message("\xd1\x01\x04T\x02enx")
+        self.emulator.run(self.device)
+        self.assertEqual(self.reader.responses[4], "\x00\x08" + emulator.SW_OK)
+        self.assertRaises(ValueError, emulator.Type4TagEmulator(MESSAGE, size = 32).set_message, "x" * 31)
+
+    def test_handle_errors_are_raised(self):
+        class Failing(emulator.Emulator):
+            def handle(self, state, frame):
+                raise ValueError(frame)
+        failing = Failing(emulator.iso14443a_target("\x08\x01\x02\x03"))
+        self.assertRaises(ValueError, failing.run, self.device)
+
+    def test_stop(self):
+        self.emulator.stop()
+        self.assertFalse(self.emulator.run(self.device))
+        self.assertTrue(self.emulator.run(self.device))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Smoke tests of the import time benchmark"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import sys
+import StringIO
+import unittest
+
+import importbench
+
+class ImportBenchTest(unittest.TestCase):
+    def test_import_does_not_load_libnfc(self):
+        timings = importbench.time_scenario("import nfc; assert not nfc._libs, nfc._libs", 2)
+        self.assertEqual(len(timings), 2)
+        self.assertTrue(all([timing >= 0 for timing in timings]))
+
+    def test_failures_are_raised(self):
+        self.assertRaises(RuntimeError, importbench.time_scenario, "raise ValueError('no libnfc')", 1)
+
+    def test_every_scenario_is_reported(self):
+        stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+        try:
+            importbench.main(["--runs", "1"])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        # Scenarios needing libnfc are reported as failures where it is not installed
+        self.assertEqual([line.split()[0] for line in output.splitlines()],
+                         [name for name, _ in importbench.SCENARIOS])
+
+if __name__ == '__main__':
+    unittest.main()
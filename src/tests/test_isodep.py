@@ -0,0 +1,152 @@
+"""Tests of APDU exchanges with a simulated ISO14443-4 tag"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import struct
+import unittest
+
+import nfcsim
+import pynfc
+import isodep
+
+UID = "\x08\x01\x02\x03"
+FILE = "".join([chr(i & 0xff) for i in range(1000)])
+
+class Card(object):
+    """Answers READ BINARY (holding back all but held bytes for GET RESPONSE), chained UPDATE BINARY and GET DATA"""
+    def __init__(self, held = 100):
+        self.held = held
+        self.pending = ""
+        self.end = ""
+        self.chain = ""
+        self.commands = []
+
+    def __call__(self, apdu):
+        self.commands.append(apdu)
+        cla, ins, p1, p2 = [ord(c) for c in apdu[:4]]
+        if ins == isodep.INS_READ_BINARY:
+            offset = p2 if p1 & 0x80 else (p1 << 8) | p2
+            le = ord(apdu[4]) or 256
+            data = FILE[offset:offset + le]
+            # Reads past the end of the file are short, with a warning
+            self.end = "\x90\x00" if len(data) == le else "\x62\x82"
+            if len(data) > self.held:
+                self.pending = data[self.held:]
+                return data[:self.held] + "\x61" + chr(len(self.pending) & 0xff)
+            return data + self.end
+        if ins == isodep.INS_GET_RESPONSE:
+            le = ord(apdu[4]) or 256
+            data, self.pending = self.pending[:le], self.pending[le:]
+            if self.pending:
+                return data + "\x61" + chr(len(self.pending) & 0xff)
+            return data + self.end
+        if ins == 0xd6:
+            self.chain += apdu[5:5 + ord(apdu[4])]
+            if cla & isodep.CLA_CHAINING:
+                return "\x90\x00"
+            length, self.chain = len(self.chain), ""
+            return struct.pack(">H", length) + "\x90\x00"
+        if ins == 0xca:
+            if len(apdu) == 5 and ord(apdu[4]) == 4:
+                return "abcd\x90\x00"
+            return "\x6c\x04"
+        return "\x6d\x00"
+
+class IsoDepTest(unittest.TestCase):
+    def setUp(self):
+        self.card = Card()
+        self.reader = nfcsim.SimReader(tags = [nfcsim.IsoDepTag(UID, ats = "\x78\x80\x70\x02", responder = self.card)])
+        nfcsim.install(self.reader)
+        self.context = pynfc.Context()
+        self.device = self.context.open()
+        self.device.initiator_init()
+        self.device.select()
+        self.iso = isodep.IsoDep(self.device)
+
+    def tearDown(self):
+        self.device.close()
+        self.context.close()
+        nfcsim.uninstall()
+
+    def test_frame_sizes_from_ats(self):
+        self.assertEqual(self.iso.fsc, 256)
+        self.assertEqual(self.iso.max_apdu, 252)
+        self.assertEqual(self.iso.max_command_data, 246)
+        self.assertEqual(isodep.fsc("\x78\x80"), 256)
+        self.assertEqual(isodep.fsc("\x72"), 32)
+        self.assertEqual(isodep.fsc(""), 32)
+
+    def test_command_chaining(self):
+        response = self.iso.exchange(0x00, 0xd6, 0, 0, "x" * 600)
+        self.assertTrue(response.ok)
+        self.assertEqual(response.data, struct.pack(">H", 600))
+        chained = [ord(apdu[0]) & isodep.CLA_CHAINING for apdu in self.card.commands]
+        self.assertEqual(chained, [isodep.CLA_CHAINING, isodep.CLA_CHAINING, 0])
+        self.assertEqual([ord(apdu[4]) for apdu in self.card.commands], [246, 246, 108])
+
+    def test_chaining_exact_multiple(self):
+        response = self.iso.exchange(0x00, 0xd6, 0, 0, "x" * 492)
+        self.assertEqual(response.data, struct.pack(">H", 492))
+        self.assertEqual(len(self.card.commands), 2)
+
+    def test_get_response(self):
+        response = self.iso.exchange(0x00, isodep.INS_READ_BINARY, 0, 0, "", 256)
+        self.assertTrue(response.ok)
+        self.assertEqual(response.data, FILE[:256])
+        self.assertEqual([ord(apdu[1]) for apdu in self.card.commands],
+                         [isodep.INS_READ_BINARY, isodep.INS_GET_RESPONSE])
+
+    def test_wrong_length_is_retried(self):
+        response = self.iso.exchange(0x00, 0xca, 0, 0, "", 256)
+        self.assertEqual(response, isodep.Response("abcd", isodep.SW_OK))
+        self.assertEqual(self.iso.frames, 2)
+
+    def test_errors_are_returned(self):
+        response = self.iso.exchange(0x00, 0x01, 0, 0)
+        self.assertFalse(response.ok)
+        self.assertEqual((response.sw1, response.sw2), (0x6d, 0x00))
+
+    def test_exchange_many_stops_on_error(self):
+        commands = [(0x00, 0xca, 0, 0, "", 4), (0x00, 0x01, 0, 0), (0x00, 0xca, 0, 0, "", 4)]
+        self.assertEqual(len(self.iso.exchange_many(commands)), 2)
+        self.assertEqual(len(self.iso.exchange_many(commands, stop_on_error = False)), 3)
+
+    def test_read_binary(self):
+        self.assertEqual(self.iso.read_binary(1200), FILE)
+        self.assertEqual(self.iso.read_binary(300, 500), FILE[500:800])
+        self.assertEqual(self.iso.read_binary(50, 10, sfi = 1), FILE[10:60])
+        self.assertRaises(ValueError, self.iso.read_binary, 10, 0x100, 1)
+
+class BuildApduTest(unittest.TestCase):
+    def build(self, *args):
+        out = bytearray(300)
+        return str(out[:isodep.build_apdu(out, *args)])
+
+    def test_short(self):
+        self.assertEqual(self.build(0x00, 0xb0, 0, 0, "", 256), "\x00\xb0\x00\x00\x00")
+        self.assertEqual(self.build(0x00, 0xd6, 0, 1, "ab"), "\x00\xd6\x00\x01\x02ab")
+        self.assertEqual(self.build(0x00, 0xa4, 4, 0, "ab", 256), "\x00\xa4\x04\x00\x02ab\x00")
+
+    def test_extended(self):
+        self.assertEqual(self.build(0x00, 0xb0, 0, 0, "", 1000, True), "\x00\xb0\x00\x00\x00\x03\xe8")
+        self.assertEqual(self.build(0x00, 0xd6, 0, 0, "a" * 300, None, True)[:7], "\x00\xd6\x00\x00\x00\x01\x2c")
+        # Short encodings are kept when extended ones are not needed
+        self.assertEqual(self.build(0x00, 0xb0, 0, 0, "", 16, True), "\x00\xb0\x00\x00\x10")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests of the per-card key cache"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import keycache
+
+KEY_A = "\xa0" * 6
+KEY_B = "\xb0" * 6
+DEFAULT = "\xff" * 6
+
+class KeyCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unknown_cards_keep_the_key_order(self):
+        cache = keycache.KeyCache()
+        self.assertEqual(cache.candidates("\x01\x02\x03\x04", 0, [DEFAULT, (KEY_A, True)]),
+                         [(DEFAULT, False), (KEY_A, True)])
+
+    def test_remembered_key_comes_first(self):
+        cache = keycache.KeyCache()
+        cache.remember("\x01\x02\x03\x04", 2, (KEY_B, True))
+        self.assertEqual(cache.candidates("\x01\x02\x03\x04", 2, [DEFAULT, KEY_A, (KEY_B, True)]),
+                         [(KEY_B, True), (DEFAULT, False), (KEY_A, False)])
+        self.assertEqual(cache.candidates("\x01\x02\x03\x04", 3, [DEFAULT])[0], (DEFAULT, False))
+
+    def test_family_keys_are_tried_next(self):
+        cache = keycache.KeyCache()
+        cache.remember("\x01\x02\x03\x04", 1, KEY_A, "0004:08")
+        cache.remember("\x05\x06\x07\x08", 1, KEY_B, "0004:08")
+        self.assertEqual(cache.candidates("\x01\x02\x03\x04", 1, [DEFAULT], "0004:08"),
+                         [(KEY_A, False), (KEY_B, False), (DEFAULT, False)])
+        self.assertEqual(cache.candidates("\x09\x0a\x0b\x0c", 1, [DEFAULT], "0004:08")[0], (KEY_B, False))
+        self.assertEqual(cache.candidates("\x09\x0a\x0b\x0c", 1, [DEFAULT], "0044:00")[0], (DEFAULT, False))
+
+    def test_least_recently_used_card_is_evicted(self):
+        cache = keycache.KeyCache(max_cards = 2)
+        cache.remember("a", 0, KEY_A)
+        cache.remember("b", 0, KEY_A)
+        cache.candidates("a", 0, [])
+        cache.remember("c", 0, KEY_A)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.candidates("b", 0, []), [])
+        self.assertEqual(cache.candidates("a", 0, []), [(KEY_A, False)])
+
+    def test_forget(self):
+        cache = keycache.KeyCache()
+        cache.remember("a", 0, KEY_A)
+        cache.remember("a", 1, KEY_A)
+        cache.forget("a", 0)
+        self.assertEqual(cache.candidates("a", 0, []), [])
+        self.assertEqual(cache.candidates("a", 1, []), [(KEY_A, False)])
+        cache.forget("a")
+        self.assertEqual(len(cache), 0)
+
+    def test_save_and_load(self):
+        path = os.path.join(self.directory, "keys.json")
+        cache = keycache.KeyCache(path = path)
+        cache.remember("\x01\x02\x03\x04", 5, (KEY_B, True), "0004:08")
+        cache.save()
+        self.assertEqual(os.listdir(self.directory), ["keys.json"])
+        loaded = keycache.KeyCache(path = path)
+        self.assertEqual(loaded.candidates("\x01\x02\x03\x04", 5, [])[0], (KEY_B, True))
+        self.assertEqual(loaded.candidates("\x09\x0a\x0b\x0c", 5, [], "0004:08"), [(KEY_B, True)])
+
+    def test_save_without_a_path(self):
+        cache = keycache.KeyCache()
+        self.assertRaises(ValueError, cache.save)
+        self.assertRaises(ValueError, cache.load)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+"""Tests of NFCReader against a simulated reader"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import nfcsim
+import pynfc
+import keycache
+import mifareauth
+
+UID = "\xde\xad\xbe\xef"
+SECRET_KEY = "\xa0\xa1\xa2\xa3\xa4\xa5"
+
+class SimulatedCardTest(unittest.TestCase):
+    """Gives each test an NFCReader on a simulated reader, with a Mifare Classic 1K card polled"""
+    def setUp(self):
+        self.tag = nfcsim.MifareClassicTag(UID)
+        self.reader = nfcsim.SimReader(tags = [self.tag])
+        nfcsim.install(self.reader)
+        self.context = pynfc.Context()
+        self.device = self.context.open()
+        self.nfc = mifareauth.NFCReader(lambda message: None, device = self.device)
+        self.device.initiator_init()
+        self.device.poll()
+        self.nfc._setup_device()
+
+    def tearDown(self):
+        self.device.close()
+        self.context.close()
+        nfcsim.uninstall()
+
+    def block(self, block):
+        return str(self.tag.data[block * 16:(block + 1) * 16])
+
+class SelectCardTest(SimulatedCardTest):
+    def test_select_card(self):
+        self.assertEqual(self.nfc.select_card(), UID)
+
+    def test_no_card_selects_nothing(self):
+        self.reader.remove()
+        # Not the UID left behind by the last poll
+        self.assertEqual(self.nfc.select_card(), '')
+
+class AuthenticateTest(unittest.TestCase):
+    def test_short_keys_and_uids_are_rejected(self):
+        nfc_reader = mifareauth.NFCReader(lambda message: None)
+        self.assertRaises(ValueError, nfc_reader._authenticate, 4, UID, "\xff" * 5)
+        self.assertRaises(ValueError, nfc_reader._authenticate, 4, UID[:3])
+
+class ReadBlocksTest(SimulatedCardTest):
+    def frames(self):
+        return self.reader.calls['nfc_initiator_transceive_bytes']
+
+    def test_one_authentication_per_sector(self):
+        self.tag.data[16:32] = "hello, sim world"
+        blocks = self.nfc.read_blocks(UID, range(12))
+        self.assertEqual(sorted(blocks), range(12))
+        self.assertEqual(blocks[1], "hello, sim world")
+        # Key A reads back as zeros
+        self.assertEqual(blocks[3][:6], "\x00" * 6)
+        self.assertEqual(self.frames(), 3 + 12)
+
+    def test_key_fallback_and_unreadable_sectors(self):
+        self.tag.set_keys(1, SECRET_KEY, SECRET_KEY)
+        self.tag.set_keys(2, SECRET_KEY, SECRET_KEY)
+        self.tag.data[64:80] = "kept secret....."
+        blocks = self.nfc.read_blocks(UID, [4, 8], keys = [mifareauth.NFCReader.DEFAULT_KEY, (SECRET_KEY, True)])
+        self.assertEqual(blocks[4], "kept secret.....")
+        self.assertEqual(self.nfc.read_blocks(UID, [8, 9]), {8: '', 9: ''})
+        # The card still answers after the failed authentications
+        self.assertEqual(self.nfc.read_blocks(UID, [0])[0][:4], UID)
+
+class WriteCardTest(SimulatedCardTest):
+    def setUp(self):
+        SimulatedCardTest.setUp(self)
+        self.tag.data[16:32] = "hello, sim world"
+
+    def test_only_changed_blocks_are_written(self):
+        image = self.nfc.read_blocks(UID, range(8))
+        image[1] = "hello, sim world"
+        image[4] = "new contents 4.."
+        image[0] = "\x00" * 16
+        self.assertEqual(self.nfc.write_card(UID, image), [4])
+        self.assertEqual(self.block(4), "new contents 4..")
+        self.assertEqual(self.block(0)[:4], UID)
+        # Writing the same image again finds nothing to do
+        self.assertEqual(self.nfc.write_card(UID, image), [])
+
+    def test_whole_image_string(self):
+        image = self.nfc.read_blocks(UID, range(8))
+        card = "".join([image[block] for block in range(8)])
+        card = card[:80] + "z" * 16 + card[96:]
+        self.assertEqual(self.nfc.write_card(UID, card), [5])
+        self.assertEqual(self.block(5), "z" * 16)
+
+    def test_unreadable_blocks_are_not_written(self):
+        self.tag.set_keys(2, SECRET_KEY, SECRET_KEY)
+        self.tag.data[128:144] = "kept secret....."
+        image = self.nfc.read_blocks(UID, range(12))
+        self.assertEqual(image[8], '')
+        image[4] = "new contents 4.."
+        self.assertEqual(self.nfc.write_card(UID, image), [4])
+        self.assertEqual(self.block(8), "kept secret.....")
+
+    def test_blocks_not_read_are_not_written(self):
+        self.nfc.read_blocks(UID, range(4))
+        self.assertEqual(self.nfc.write_card(UID, {5: "z" * 16}), [])
+        self.assertEqual(self.block(5), "\x00" * 16)
+
+    def test_short_and_long_blocks_are_refused_before_writing(self):
+        self.nfc.read_blocks(UID, range(8))
+        writes = self.reader.calls['nfc_initiator_transceive_bytes']
+        self.assertRaises(ValueError, self.nfc.write_card, UID, {4: "a" * 16, 5: "b" * 17})
+        self.assertRaises(ValueError, self.nfc.write_card, UID, {4: "a" * 16, 5: "b"})
+        self.assertEqual(self.reader.calls['nfc_initiator_transceive_bytes'], writes)
+        self.assertEqual(self.block(4), "\x00" * 16)
+
+    def test_trailers_need_write_trailers(self):
+        image = self.nfc.read_blocks(UID, range(4))
+        trailer = "\xff" * 6 + image[3][6:10] + "\xff" * 6
+        self.assertEqual(self.nfc.write_card(UID, {3: trailer}), [])
+        self.assertEqual(self.nfc.write_card(UID, {3: trailer}, write_trailers = True), [3])
+
+    def test_verify_and_key_fallback(self):
+        self.tag.set_keys(2, SECRET_KEY, SECRET_KEY)
+        self.nfc.keys = [mifareauth.NFCReader.DEFAULT_KEY, SECRET_KEY]
+        image = self.nfc.read_blocks(UID, range(12))
+        image[4] = "a" * 16
+        image[9] = "b" * 16
+        self.assertEqual(self.nfc.write_card(UID, image, verify = True), [4, 9])
+        self.assertEqual(self.block(9), "b" * 16)
+
+class RunTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        nfcsim.uninstall()
+        shutil.rmtree(self.directory)
+
+    def run_reader(self, nfc_reader, seconds):
+        thread = threading.Thread(target = nfc_reader.run)
+        thread.start()
+        time.sleep(seconds)
+        nfc_reader.stop()
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+
+    def test_stop_aborts_a_poll(self):
+        reader = nfcsim.SimReader(latency = {'poll_empty': 10})
+        nfcsim.install(reader)
+        started = time.time()
+        self.run_reader(mifareauth.NFCReader(lambda message: None), 0.1)
+        self.assertTrue(time.time() - started < 2)
+        self.assertEqual(reader.calls['nfc_abort_command'], 1)
+
+    def test_stop_without_a_poll_does_not_abort(self):
+        reader = nfcsim.SimReader()
+        nfcsim.install(reader)
+        mifareauth.NFCReader(lambda message: None).stop()
+        self.assertEqual(reader.calls['nfc_abort_command'], 0)
+
+    def test_read_cards_are_watched_until_they_leave(self):
+        tag = nfcsim.MifareClassicTag(UID)
+        reader = nfcsim.SimReader(script = [tag, tag, tag, None, None], latency = {'poll_empty': 0.01})
+        nfcsim.install(reader)
+        nfc_reader = mifareauth.NFCReader(lambda message: None)
+        reads = []
+        nfc_reader.read_card = reads.append
+        self.run_reader(nfc_reader, 0.2)
+        self.assertEqual(reads, [UID])
+        # Two presence checks find the card, two more miss it
+        self.assertEqual(reader.calls['nfc_initiator_target_is_present'], 4)
+
+    def test_cards_gone_after_reading_are_not_watched(self):
+        tag = nfcsim.MifareClassicTag(UID)
+        reader = nfcsim.SimReader(script = [tag], latency = {'poll_empty': 0.01})
+        nfcsim.install(reader)
+        nfc_reader = mifareauth.NFCReader(lambda message: None)
+        nfc_reader.read_card = lambda uid: reader.remove()
+        self.run_reader(nfc_reader, 0.2)
+        self.assertEqual(reader.calls['nfc_initiator_target_is_present'], 0)
+        self.assertTrue(reader.calls['nfc_initiator_poll_target'] > 1)
+
+    def test_key_cache_is_saved(self):
+        path = os.path.join(self.directory, "keys.json")
+        reader = nfcsim.SimReader(script = [nfcsim.MifareClassicTag(UID)], latency = {'poll_empty': 0.01})
+        nfcsim.install(reader)
+        nfc_reader = mifareauth.NFCReader(lambda message: None, key_cache = keycache.KeyCache(path = path))
+        nfc_reader.read_card = lambda uid: nfc_reader.read_blocks(uid, range(4))
+        self.run_reader(nfc_reader, 0.2)
+        saved = keycache.KeyCache(path = path)
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(saved.candidates(UID, 0, [])[0], (mifareauth.NFCReader.DEFAULT_KEY, False))
+
+if __name__ == '__main__':
+    unittest.main()
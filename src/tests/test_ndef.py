@@ -0,0 +1,86 @@
+"""Tests of NDEF encoding and decoding"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import unittest
+
+import pyndef
+
+URI = "https://www.example.com/poster/12345"
+
+def type2_memory(records):
+    memory = bytearray(pyndef.type2_size(records))
+    pyndef.encode_type2_into(records, memory)
+    return str(memory)
+
+class NdefTest(unittest.TestCase):
+    records = [pyndef.uri_record(URI), pyndef.text_record(u"h\xe9llo", "fr"),
+               pyndef.Record(pyndef.TNF_MIME, "application/x", "id1", "x" * 300)]
+
+    def test_round_trip(self):
+        encoded = pyndef.encode(self.records)
+        self.assertEqual(len(encoded), pyndef.encoded_size(self.records))
+        message = pyndef.Message(encoded)
+        self.assertEqual(len(message), 3)
+        self.assertEqual(pyndef.decode_uri(message[0].payload), URI)
+        self.assertEqual(pyndef.decode_text(message[1].payload), (u"h\xe9llo", "fr"))
+        self.assertEqual((message[2].tnf, message[2].type.tobytes(), message[2].id.tobytes()),
+                         (pyndef.TNF_MIME, "application/x", "id1"))
+        self.assertEqual(pyndef.encode(list(message)), encoded)
+
+    def test_uri_prefix(self):
+        self.assertEqual(pyndef.uri_record(URI).payload[0], "\x02")
+        self.assertEqual(pyndef.uri_record("geo:1,2").payload, "\x00geo:1,2")
+
+    def test_type2_reads_only_what_it_needs(self):
+        memory = bytearray("\x01\x03\xa0\x10\x44") + type2_memory(self.records) + bytearray(64)
+        chunks = []
+        def reads():
+            for i in range(0, len(memory), 16):
+                chunks.append(i)
+                yield memory[i:i + 16]
+        message = pyndef.decode_type2(reads())
+        self.assertEqual(len(message), 3)
+        self.assertTrue(len(chunks) < len(memory) // 16)
+
+    def test_type2_byte_at_a_time(self):
+        memory = type2_memory(self.records)
+        decoder = pyndef.Type2Decoder()
+        for i in range(len(memory)):
+            if decoder.feed(memory[i:i + 1]):
+                break
+            self.assertTrue(decoder.needed >= 1)
+        self.assertEqual(decoder.message.tobytes(), str(pyndef.encode(self.records)))
+
+    def test_type4(self):
+        nfile = bytearray(pyndef.encoded_size(self.records) + 2)
+        pyndef.encode_type4_into(self.records, nfile)
+        decoder = pyndef.Type4Decoder()
+        self.assertFalse(decoder.feed(nfile[:2]))
+        self.assertEqual(decoder.needed, len(nfile) - 2)
+        self.assertTrue(decoder.feed(nfile[2:]))
+        self.assertEqual(len(decoder.message), 3)
+
+    def test_empty_and_bad_messages(self):
+        self.assertEqual(pyndef.decode_type2(["\x00\x00\xfe"]), None)
+        self.assertEqual(pyndef.decode_type4(["\x00\x00"]), None)
+        self.assertRaises(ValueError, pyndef.decode_type2, ["\x03\x10abc"])
+        self.assertRaises(ValueError, pyndef.encode, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Tests of the asyncio interface against simulated readers"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import time
+import unittest
+
+import nfcsim
+import pynfc
+
+try:
+    import nfcaio
+    from nfcaio import asyncio
+except ImportError:
+    # nfcaio needs the trollius and futures backports
+    nfcaio = None
+
+TAG_A = nfcsim.MifareClassicTag("\x01\x02\x03\x04")
+TAG_B = nfcsim.MifareClassicTag("\x05\x06\x07\x08")
+
+@unittest.skipIf(nfcaio is None, "nfcaio requires trollius and futures")
+class AsyncDeviceTest(unittest.TestCase):
+    def start(self, reader):
+        self.reader = reader
+        nfcsim.install(reader)
+        self.context = pynfc.Context()
+        self.device = self.context.open()
+        self.device.initiator_init()
+        self.loop = asyncio.new_event_loop()
+        self.async_device = nfcaio.AsyncDevice(self.device, self.loop)
+
+    def tearDown(self):
+        self.async_device.close()
+        self.loop.close()
+        self.device.close()
+        self.context.close()
+        nfcsim.uninstall()
+
+    def test_poll_and_transceive(self):
+        self.start(nfcsim.SimReader(tags = [TAG_A]))
+        target = self.loop.run_until_complete(self.async_device.poll())
+        self.assertEqual(target.uid, TAG_A.uid)
+        self.loop.run_until_complete(self.async_device.transceive("\x60\x00" + "\xff" * 6 + TAG_A.uid))
+        block = self.loop.run_until_complete(self.async_device.transceive("\x30\x00"))
+        self.assertEqual(block[:4], TAG_A.uid)
+
+    def test_arrivals_end_when_closed(self):
+        self.start(nfcsim.SimReader(script = [TAG_A, TAG_A, None, TAG_B], latency = {'poll_empty': 0.01}))
+        arrivals = self.async_device.arrivals()
+
+        @asyncio.coroutine
+        def follow():
+            uids = []
+            while True:
+                try:
+                    event = yield asyncio.From(arrivals.next_arrival())
+                except nfcaio.StopArrivals:
+                    raise asyncio.Return(uids)
+                uids.append(event.uid)
+                if len(uids) == 2:
+                    self.loop.call_later(0.05, self.async_device.close)
+
+        uids = self.loop.run_until_complete(asyncio.wait_for(follow(), 2, loop = self.loop))
+        self.assertEqual(uids, [TAG_A.uid, TAG_B.uid])
+        self.assertEqual(self.reader.calls['nfc_abort_command'], 1)
+
+    def test_cancelling_aborts_the_poll(self):
+        self.start(nfcsim.SimReader(latency = {'poll_empty': 10}))
+        future = self.async_device.poll()
+        self.loop.call_later(0.1, future.cancel)
+        started = time.time()
+        self.assertRaises(asyncio.CancelledError, self.loop.run_until_complete, future)
+        # The executor's thread is free again, well before the simulated poll would have ended
+        self.reader.latency['poll_empty'] = 0
+        self.assertEqual(self.loop.run_until_complete(self.async_device.poll()), None)
+        self.assertTrue(time.time() - started < 2)
+        self.assertEqual(self.reader.calls['nfc_abort_command'], 1)
+
+    def test_cancelling_a_queued_call_does_not_abort(self):
+        self.start(nfcsim.SimReader(tags = [TAG_A], latency = {'poll': 0.1}))
+        first = self.async_device.poll()
+        second = self.async_device.poll()
+        second.cancel()
+        self.assertEqual(self.loop.run_until_complete(first).uid, TAG_A.uid)
+        self.assertEqual(self.reader.calls['nfc_abort_command'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Tests of the simulated libnfc backend"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import time
+import ctypes
+import threading
+import unittest
+
+import nfc
+import nfcsim
+import pynfc
+
+UID = "\x01\x02\x03\x04"
+
+class SimLibraryTest(unittest.TestCase):
+    def tearDown(self):
+        nfcsim.uninstall()
+
+    def test_raw_functions(self):
+        lib = nfcsim.install(nfcsim.SimReader("sim:0"), nfcsim.SimReader("sim:1"))
+        self.assertEqual(nfc.nfc_version(), lib.version)
+        context = ctypes.POINTER(nfc.nfc_context)()
+        nfc.nfc_init(ctypes.byref(context))
+        connstrings = (nfc.nfc_connstring * 4)()
+        self.assertEqual(nfc.nfc_list_devices(context, connstrings, 4), 2)
+        self.assertEqual([connstrings[i].value for i in range(2)], ["sim:0", "sim:1"])
+        device = nfc.nfc_open(context, connstrings[1])
+        self.assertEqual(nfc.nfc_device_get_connstring(device), "sim:1")
+        # A reader can only be opened once
+        self.assertFalse(nfc.nfc_open(context, connstrings[1]))
+        nfc.nfc_close(device)
+        nfc.nfc_exit(context)
+        self.assertEqual(lib.readers[1].calls['nfc_close'], 1)
+
+    def test_uninstall_forgets_the_simulation(self):
+        nfcsim.install()
+        nfc.nfc_version()
+        nfcsim.uninstall()
+        self.assertFalse('nfc_version' in nfc.__dict__)
+        self.assertFalse('nfc' in nfc._libs)
+
+class SimReaderTest(unittest.TestCase):
+    def open(self, reader):
+        self.reader = reader
+        nfcsim.install(reader)
+        self.context = pynfc.Context()
+        self.device = self.context.open()
+        self.device.initiator_init()
+
+    def tearDown(self):
+        self.device.close()
+        self.context.close()
+        nfcsim.uninstall()
+
+    def test_script(self):
+        tag = nfcsim.MifareClassicTag(UID)
+        self.open(nfcsim.SimReader(script = [tag, None, [tag]]))
+        self.assertEqual([self.device.poll() for _ in range(4)], [1, 0, 1, 0])
+        # Selecting only looks at the field, which stays empty once the script runs out
+        self.assertEqual(self.device.select(), 0)
+
+    def test_properties(self):
+        self.open(nfcsim.SimReader(tags = [nfcsim.MifareClassicTag(UID)]))
+        self.device.set_property(nfc.NP_INFINITE_SELECT, False)
+        self.device.set_property(nfc.NP_HANDLE_CRC, False)
+        self.assertEqual(self.reader.calls['nfc_device_set_property_bool'], 2)
+        self.device.poll()
+        self.assertTrue(self.reader.properties[nfc.NP_INFINITE_SELECT])
+        self.device.initiator_init()
+        self.assertTrue(self.reader.properties[nfc.NP_HANDLE_CRC])
+
+    def test_abort_ends_a_wait(self):
+        self.open(nfcsim.SimReader(latency = {'poll_empty': 10}))
+        threading.Timer(0.05, self.device.abort).start()
+        started = time.time()
+        try:
+            self.device.poll()
+        except IOError, e:
+            self.assertEqual(e.errno, nfc.NFC_EOPABORTED)
+        else:
+            self.fail("The poll was not aborted")
+        self.assertTrue(time.time() - started < 2)
+
+    def test_mifare_classic_halts_on_failed_authentication(self):
+        tag = nfcsim.MifareClassicTag(UID)
+        self.open(nfcsim.SimReader(tags = [tag]))
+        self.device.select()
+        self.assertEqual(self.device.transceive_into("\x60\x04" + "\x00" * 6 + UID), nfc.NFC_EMFCAUTHFAIL)
+        self.assertEqual(self.device.transceive_into("\x60\x04" + "\xff" * 6 + UID), nfc.NFC_ERFTRANS)
+        self.device.select()
+        self.assertEqual(self.device.transceive_into("\x60\x04" + "\xff" * 6 + UID), 0)
+        self.assertEqual(self.device.transceive("\x30\x04").tobytes(), "\x00" * 16)
+        # Reading outside the authenticated sector halts the card again
+        self.assertRaises(IOError, self.device.transceive, "\x30\x08")
+
+    def test_framing(self):
+        self.open(nfcsim.SimReader(tags = [nfcsim.UltralightTag("\x04\x01\x02\x03\x04\x05\x06")]))
+        self.device.select()
+        # Authentication frames need a key and UID under easy framing
+        self.assertEqual(self.device.transceive_into("\x60\x04"), nfc.NFC_EMFCAUTHFAIL)
+        self.device.set_property(nfc.NP_EASY_FRAMING, False)
+        self.device.set_property(nfc.NP_HANDLE_CRC, False)
+        # Without the CRC the tag does not answer
+        self.assertEqual(self.device.transceive_into("\x30\x00"), nfc.NFC_ERFTRANS)
+
+    def test_reqa(self):
+        self.open(nfcsim.SimReader(tags = [nfcsim.MifareClassicTag(UID)]))
+        rx, _, bits = self.device.transceive_bits("\x26", 7)
+        self.assertEqual((rx.tobytes(), bits), ("\x04\x00", 16))
+
+if __name__ == '__main__':
+    unittest.main()
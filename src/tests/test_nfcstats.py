@@ -0,0 +1,104 @@
+"""Tests of the libnfc call instrumentation against a simulated reader"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import unittest
+
+import nfc
+import nfcsim
+import pynfc
+import nfcstats
+
+UID = "\x01\x02\x03\x04"
+
+class NfcStatsTest(unittest.TestCase):
+    def tearDown(self):
+        nfcstats.disable()
+        nfcstats.reset()
+        nfcsim.uninstall()
+
+    def read_card(self):
+        with pynfc.Context() as context:
+            with context.open() as device:
+                device.initiator_init()
+                device.poll()
+                device.transceive_into("\x60\x00" + "\xff" * 6 + UID)
+                device.transceive_into("\x30\x40")
+
+    def install(self):
+        self.reader = nfcsim.SimReader(tags = [nfcsim.MifareClassicTag(UID)])
+        nfcsim.install(self.reader)
+
+    def test_enabling_binds_nothing(self):
+        nfcsim.uninstall()
+        self.assertEqual(nfcstats.enable(['nfc_open', 'nfc_no_such_function']), ['nfc_open'])
+        self.assertTrue(nfcstats.enabled())
+        self.assertFalse('nfc' in nfc._libs)
+        self.assertFalse('nfc_open' in nfc.__dict__)
+
+    def test_enable_install_disable(self):
+        nfcstats.enable()
+        self.install()
+        self.read_card()
+        stats = nfcstats.snapshot()
+        self.assertEqual(stats['nfc_initiator_poll_target']['calls'], 1)
+        self.assertEqual(stats['nfc_initiator_transceive_bytes']['calls'], 2)
+        self.assertEqual(stats['nfc_initiator_transceive_bytes']['errors'], {nfc.NFC_ERFTRANS: 1})
+        self.assertEqual(stats['nfc_initiator_transceive_bytes']['buckets'][-1], (float('inf'), 2))
+        nfcstats.disable()
+        self.assertFalse(nfcstats.enabled())
+        self.read_card()
+        self.assertEqual(nfcstats.snapshot()['nfc_initiator_poll_target']['calls'], 1)
+        # The simulation is still the one in use
+        self.assertEqual(self.reader.calls['nfc_initiator_poll_target'], 2)
+
+    def test_install_after_reading(self):
+        # Functions already bound are wrapped at once, and wrapped again once nfcsim rebinds them
+        self.install()
+        self.read_card()
+        self.assertEqual(nfcstats.enable(['nfc_initiator_poll_target']), ['nfc_initiator_poll_target'])
+        self.read_card()
+        self.install()
+        self.read_card()
+        stats = nfcstats.snapshot()
+        self.assertEqual(stats.keys(), ['nfc_initiator_poll_target'])
+        self.assertEqual(stats['nfc_initiator_poll_target']['calls'], 2)
+        nfcstats.disable()
+        nfcsim.uninstall()
+        self.assertFalse('nfc_initiator_poll_target' in nfc.__dict__)
+
+    def test_prometheus(self):
+        nfcstats.enable(['nfc_initiator_transceive_bytes'])
+        self.install()
+        self.read_card()
+        lines = nfcstats.prometheus().splitlines()
+        self.assertTrue('pynfc_call_seconds_bucket{function="nfc_initiator_transceive_bytes",le="+Inf"} 2' in lines)
+        self.assertTrue('pynfc_call_seconds_count{function="nfc_initiator_transceive_bytes"} 2' in lines)
+        self.assertTrue('pynfc_call_errors_total{function="nfc_initiator_transceive_bytes",code="-20"} 1' in lines)
+
+    def test_timed(self):
+        recorded = []
+        record = lambda seconds, error: recorded.append(error)
+        self.assertEqual(nfcstats.timed(lambda x: -x, record, errors = True)(5), -5)
+        self.assertEqual(nfcstats.timed(lambda x: -x, record)(5), -5)
+        self.assertRaises(ZeroDivisionError, nfcstats.timed(lambda: 1 / 0, record))
+        self.assertEqual(recorded, [-5, None, 'exception'])
+
+if __name__ == '__main__':
+    unittest.main()
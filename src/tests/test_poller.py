@@ -0,0 +1,122 @@
+"""Tests of polling, presence checks and inventories against simulated readers"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import time
+import unittest
+
+import nfc
+import nfcsim
+import pynfc
+import poller
+import presence
+import inventory
+
+TAG_A = nfcsim.MifareClassicTag("\x01\x02\x03\x04")
+TAG_B = nfcsim.MifareClassicTag("\x05\x06\x07\x08")
+
+class PollerTest(unittest.TestCase):
+    def tearDown(self):
+        nfcsim.uninstall()
+
+    def drain(self, events):
+        result = []
+        while not events.empty():
+            result.append(events.get())
+        return result
+
+    def test_arrivals_on_every_reader(self):
+        first = nfcsim.SimReader("sim:0", script = [TAG_A, TAG_A, None, TAG_A], latency = {'poll_empty': 0.01})
+        second = nfcsim.SimReader("sim:1", script = [TAG_B], latency = {'poll_empty': 0.01})
+        nfcsim.install(first, second)
+        with pynfc.Context() as context:
+            multi = poller.MultiPoller(context)
+            multi.start()
+            time.sleep(0.2)
+            multi.stop(1)
+            events = self.drain(multi.events)
+            stats = multi.stats()
+        arrivals = sorted([(event.connstring, event.uid) for event in events])
+        self.assertEqual(arrivals, [("sim:0", TAG_A.uid), ("sim:0", TAG_A.uid), ("sim:1", TAG_B.uid)])
+        self.assertEqual(stats["sim:0"]['detections'], 2)
+        self.assertTrue(stats["sim:0"]['polls'] > 4)
+        self.assertFalse(any([device_poller.is_alive() for device_poller in multi.pollers]))
+
+    def test_stop_aborts_a_long_poll(self):
+        reader = nfcsim.SimReader(latency = {'poll_empty': 10})
+        nfcsim.install(reader)
+        with pynfc.Context() as context:
+            multi = poller.MultiPoller(context)
+            multi.start()
+            time.sleep(0.1)
+            multi.stop(2)
+            stats = multi.stats()
+        self.assertTrue(stats["sim:0"]['stop_latency'] < 1)
+        self.assertEqual(reader.calls['nfc_abort_command'], 1)
+
+class PresenceTest(unittest.TestCase):
+    def setUp(self):
+        self.reader = nfcsim.SimReader(tags = [TAG_A])
+        nfcsim.install(self.reader)
+        self.context = pynfc.Context()
+        self.device = self.context.open()
+        self.device.initiator_init()
+        self.device.poll()
+        self.tracker = presence.PresenceTracker(self.device, interval = 0.001)
+
+    def tearDown(self):
+        self.device.close()
+        self.context.close()
+        nfcsim.uninstall()
+
+    def test_removal(self):
+        self.assertTrue(self.tracker.present())
+        self.reader.script = iter([[TAG_A]] * 3)
+        self.assertTrue(self.tracker.wait_for_removal(timeout = 1))
+        # Two misses in a row count as a removal
+        self.assertEqual(self.tracker.checks, 6)
+
+    def test_timeout_and_stop(self):
+        self.assertFalse(self.tracker.wait_for_removal(timeout = 0.01))
+        self.assertFalse(self.tracker.wait_for_removal(stopped = lambda: True))
+
+    def test_unsupported_reader(self):
+        self.reader.is_present = lambda uid = None: nfc.NFC_EDEVNOTSUPP
+        self.assertFalse(self.tracker.wait_for_removal(timeout = 1))
+        self.assertFalse(self.tracker.supported)
+
+class InventoryTest(unittest.TestCase):
+    def test_arrivals_and_departures(self):
+        reader = nfcsim.SimReader(script = [[TAG_A], [TAG_A, TAG_B], [TAG_B], None])
+        nfcsim.install(reader)
+        try:
+            with pynfc.Context() as context:
+                with context.open() as device:
+                    device.initiator_init()
+                    tracked = inventory.Inventory(device)
+                    scans = [sorted([(event.kind, event.uid) for event in tracked.scan()]) for _ in range(4)]
+        finally:
+            nfcsim.uninstall()
+        self.assertEqual(scans, [[(inventory.ARRIVED, TAG_A.uid)],
+                                 [(inventory.ARRIVED, TAG_B.uid)],
+                                 [(inventory.DEPARTED, TAG_A.uid)],
+                                 [(inventory.DEPARTED, TAG_B.uid)]])
+        self.assertEqual(len(tracked), 0)
+
+if __name__ == '__main__':
+    unittest.main()
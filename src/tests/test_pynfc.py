@@ -0,0 +1,160 @@
+"""Tests of pynfc.Device against a simulated reader"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import unittest
+
+import nfc
+import nfcsim
+import pynfc
+
+UID = "\x01\x02\x03\x04"
+
+class DeviceTest(unittest.TestCase):
+    def setUp(self):
+        self.tag = nfcsim.MifareClassicTag(UID)
+        self.reader = nfcsim.SimReader(tags = [self.tag])
+        nfcsim.install(self.reader)
+        self.context = pynfc.Context()
+        self.device = self.context.open()
+        self.device.initiator_init()
+
+    def tearDown(self):
+        self.device.close()
+        self.context.close()
+        nfcsim.uninstall()
+
+    def sets(self):
+        return self.reader.calls['nfc_device_set_property_bool']
+
+    def test_setting_a_property_again_is_elided(self):
+        self.device.set_property(nfc.NP_EASY_FRAMING, True)
+        self.device.set_property(nfc.NP_EASY_FRAMING, True)
+        self.assertEqual(self.sets(), 1)
+        self.assertEqual(self.device.elided_properties, 1)
+
+    def test_properties_are_forgotten_after_polling(self):
+        self.device.set_property(nfc.NP_INFINITE_SELECT, False)
+        self.assertEqual(self.device.poll(), 1)
+        # Polling turned infinite select back on behind the cache's back
+        self.assertTrue(self.reader.properties[nfc.NP_INFINITE_SELECT])
+        self.device.set_property(nfc.NP_INFINITE_SELECT, False)
+        self.assertEqual(self.sets(), 2)
+        self.assertFalse(self.reader.properties[nfc.NP_INFINITE_SELECT])
+
+    def test_properties_are_forgotten_after_listing_targets(self):
+        self.device.set_property(nfc.NP_INFINITE_SELECT, False)
+        self.assertEqual([target.uid for target in self.device.list_targets()], [UID])
+        self.device.set_property(nfc.NP_INFINITE_SELECT, False)
+        self.assertEqual(self.sets(), 2)
+
+    def test_properties_are_forgotten_after_initiator_init(self):
+        self.device.set_property(nfc.NP_HANDLE_CRC, False)
+        self.device.initiator_init()
+        self.device.set_property(nfc.NP_HANDLE_CRC, False)
+        self.assertEqual(self.sets(), 2)
+
+    def test_properties_survive_card_errors(self):
+        self.device.poll()
+        self.device.set_property(nfc.NP_EASY_FRAMING, True)
+        self.assertRaises(IOError, self.device.transceive, "\x30\x04")
+        self.device.set_property(nfc.NP_EASY_FRAMING, True)
+        self.assertEqual(self.sets(), 1)
+
+    def test_poll(self):
+        self.assertEqual(self.device.poll(), 1)
+        self.assertEqual(self.device.uid(), UID)
+
+    def test_poll_finds_nothing(self):
+        self.reader.remove()
+        self.assertEqual(self.device.poll(), 0)
+
+    def test_closing_twice(self):
+        self.device.close()
+        self.device.close()
+        self.assertEqual(self.reader.calls['nfc_close'], 1)
+
+    def test_uint8_view(self):
+        shared = bytearray("\x01\x02")
+        pynfc.uint8_view(shared)[0] = 9
+        self.assertEqual(shared, "\x09\x02")
+        self.assertEqual(list(pynfc.uint8_view("\x01\x02")), [1, 2])
+        self.assertEqual(list(pynfc.uint8_view(memoryview("\x01\x02"))), [1, 2])
+
+    def test_transceive_helpers(self):
+        self.device.poll()
+        self.device.set_property(nfc.NP_EASY_FRAMING, True)
+        rx = bytearray(pynfc.MAX_FRAME_LEN)
+        self.assertEqual(pynfc.transceive(self.device, "\x60\x00" + "\xff" * 6 + UID, rx).tobytes(), "")
+        response = pynfc.transceive(self.device, memoryview("\x30\x00"), rx)
+        self.assertEqual(response.tobytes()[:4], UID)
+        # The response is a view of rx, not a copy
+        self.assertEqual(rx[:4], UID)
+        self.assertEqual(pynfc.transceive_into(self.device, bytearray("\x30\x40"), rx), nfc.NFC_ERFTRANS)
+        try:
+            pynfc.transceive(self.device, "\x30\x00")
+        except IOError, e:
+            self.assertEqual(e.errno, nfc.NFC_ERFTRANS)
+        else:
+            self.fail("Reading a halted card succeeded")
+
+    def test_transceive(self):
+        self.device.poll()
+        self.device.set_property(nfc.NP_EASY_FRAMING, True)
+        self.assertEqual(self.device.transceive("\x60\x00" + "\xff" * 6 + UID).tobytes(), "")
+        response = self.device.transceive("\x30\x00")
+        self.assertTrue(isinstance(response, memoryview))
+        self.assertEqual(response.tobytes()[:4], UID)
+
+class DecodeTargetTest(unittest.TestCase):
+    def tearDown(self):
+        nfcsim.uninstall()
+
+    def targets(self, *tags):
+        nfcsim.install(nfcsim.SimReader(tags = tags))
+        with pynfc.Context() as context:
+            with context.open() as device:
+                device.initiator_init()
+                return device.list_targets()
+
+    def test_iso14443a(self):
+        tag = nfcsim.IsoDepTag("\x08\x01\x02\x03", ats = "\x78\x80\x70\x02")
+        target, = self.targets(tag)
+        self.assertTrue(isinstance(target, pynfc.ISO14443ATarget))
+        self.assertEqual((target.modulation, target.baud_rate), (nfc.NMT_ISO14443A, nfc.NBR_106))
+        self.assertEqual((target.uid, target.sak, target.ats), (tag.uid, 0x20, "\x78\x80\x70\x02"))
+        self.assertEqual(target.atqa, "\x00\x04")
+        self.assertRaises(AttributeError, setattr, target, 'uid', UID)
+
+    def test_targets_are_copied(self):
+        targets = self.targets(nfcsim.MifareClassicTag(UID), nfcsim.MifareClassicTag("\x05\x06\x07\x08"))
+        self.assertEqual([(target.uid, target.ats) for target in targets], [(UID, ""), ("\x05\x06\x07\x08", "")])
+
+    def test_other_modulations(self):
+        target = nfc.nfc_target()
+        target.nm.nmt = nfc.NMT_DEP
+        target.nm.nbr = nfc.NBR_424
+        target.nti.ndi.abtNFCID3[:4] = [1, 2, 3, 4]
+        record = pynfc.decode_target(target)
+        self.assertTrue(isinstance(record, pynfc.DEPTarget))
+        self.assertEqual(record.uid[:4], "\x01\x02\x03\x04")
+        self.assertEqual(record.baud_rate, nfc.NBR_424)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests of the Ultralight and NTAG reader against simulated tags"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import unittest
+
+import nfc
+import nfcsim
+import pynfc
+import pyndef
+import ultralight
+
+URI = "https://www.example.com/poster/12345"
+
+def type2_memory(records):
+    memory = bytearray(pyndef.type2_size(records))
+    pyndef.encode_type2_into(records, memory)
+    return str(memory)
+
+class UltralightTest(unittest.TestCase):
+    def read(self, tag):
+        self.reader = nfcsim.SimReader(tags = [tag])
+        nfcsim.install(self.reader)
+        with pynfc.Context() as context:
+            with context.open() as device:
+                device.initiator_init()
+                device.select()
+                self.ul = ultralight.UltralightReader(device)
+                self.ul.probe()
+                message = self.ul.read_ndef()
+                memory = self.ul.read_memory()
+                self.framing = self.reader.properties[nfc.NP_EASY_FRAMING]
+        return message, memory
+
+    def tearDown(self):
+        nfcsim.uninstall()
+
+    def test_ntag213_uses_fast_read(self):
+        memory = type2_memory([pyndef.uri_record(URI)])
+        tag = nfcsim.UltralightTag("\x04\x01\x02\x03\x04\x05\x06", data = memory)
+        message, contents = self.read(tag)
+        self.assertTrue(self.ul.fast)
+        self.assertEqual(self.ul.version.storage, 0x0f)
+        self.assertEqual(self.ul.user_pages, 36)
+        self.assertEqual(pyndef.decode_uri(message[0].payload), URI)
+        self.assertEqual(contents, tag.data[16:16 + 144])
+        # GET_VERSION, then one FAST_READ each for the message and the whole memory
+        self.assertEqual(self.reader.calls['nfc_initiator_transceive_bytes'], 3)
+        # Easy framing is back on for whatever comes next
+        self.assertTrue(self.framing)
+
+    def test_large_memory_is_read_in_frames(self):
+        records = [pyndef.Record(pyndef.TNF_MIME, "text/plain", "", "y" * 600)]
+        tag = nfcsim.UltralightTag("\x04\x01\x02\x03\x04\x05\x07", 888, type2_memory(records),
+                                   "\x00\x04\x04\x02\x01\x00\x13\x03")
+        message, contents = self.read(tag)
+        self.assertEqual(len(message[0].payload), 600)
+        self.assertEqual(len(contents), 888)
+        self.assertEqual(contents, tag.data[16:16 + 888])
+
+    def test_ultralight_without_get_version(self):
+        memory = type2_memory([pyndef.uri_record(URI)])
+        tag = nfcsim.UltralightTag("\x04\x01\x02\x03\x04\x05\x08", 48, memory, None)
+        message, contents = self.read(tag)
+        self.assertFalse(self.ul.fast)
+        self.assertEqual(self.ul.version, None)
+        self.assertEqual(self.ul.user_pages, 12)
+        self.assertEqual(pyndef.decode_uri(message[0].payload), URI)
+        self.assertEqual(contents, tag.data[16:64])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+"""Reads Mifare Ultralight and NTAG21x tags in as few frames as possible"""
+
+#  Pynfc is a python wrapper for the libnfc library
+#  Copyright (C) 2009  Mike Auty
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+# Tags that answer GET_VERSION (Ultralight EV1 and NTAG21x) also support
+# FAST_READ, which returns any range of pages in one frame, so their whole
+# user memory takes one or two frames.  Older tags NAK GET_VERSION (and go
+# back to idle, so they are selected again), are sized from their capability
+# container, and are read with READ, four pages a frame.
+#
+# With NP_EASY_FRAMING set, a PN53x sends frames with InDataExchange, which
+# takes 0x60 for Mifare Classic authentication, so GET_VERSION and FAST_READ
+# are sent as raw frames (with the reader adding the CRC), as nfc-mfultralight
+# does.  READ is understood either way.
+
+import collections
+
+import nfc
+import pyndef
+
+UL_READ = 0x30
+UL_FAST_READ = 0x3A
+UL_GET_VERSION = 0x60
+
+# Bytes in a page, and the first page of user memory
+PAGE_SIZE = 4
+FIRST_USER_PAGE = 4
+
+class Version(collections.namedtuple('Version', 'header vendor product_type product_subtype major minor storage protocol')):
+    """The response to GET_VERSION"""
+    __slots__ = ()
+
+# User memory bytes, by the storage size byte of GET_VERSION (which only gives a range for most sizes)
+USER_MEMORY = {0x0b: 48,     # Ultralight EV1 MF0UL11, NTAG210
+               0x0e: 128,    # Ultralight EV1 MF0UL21, NTAG212
+               0x0f: 144,    # NTAG213
+               0x11: 504,    # NTAG215
+               0x13: 888}    # NTAG216
+
+# User memory bytes of a tag with no capability container (an Ultralight)
+DEFAULT_USER_MEMORY = 48
+
+class UltralightReader(object):
+    """Reads the Ultralight or NTAG tag selected on a pynfc.Device
+
+       probe() must be called once the tag is selected, to find out its size
+       and whether it supports FAST_READ.  FAST_READ frames are limited to
+       max_pages pages, to keep the response within the reader's frame size.
+    """
+    def __init__(self, device, max_pages = 60):
+        self.device = device
+        self.max_pages = max_pages
+        self.version = None
+        self.fast = False
+        self.user_pages = None
+        # Pages 0 to 3 (UID, lock bytes and capability container), if they have been read
+        self.header = None
+
+    def _command(self, *command):
+        self.device.set_property(nfc.NP_EASY_FRAMING, True)
+        return self.device.transceive("".join([chr(c) for c in command]))
+
+    def _raw_framing(self, raw):
+        """Turns raw framing (NP_EASY_FRAMING off, NP_HANDLE_CRC on) on or off
+
+           Both go through the device, so that switching to the framing already set costs nothing.
+        """
+        if raw:
+            self.device.set_property(nfc.NP_HANDLE_CRC, True)
+        self.device.set_property(nfc.NP_EASY_FRAMING, not raw)
+
+    def _raw_command(self, *command):
+        return self.device.transceive("".join([chr(c) for c in command]))
+
+    def get_version(self):
+        """Returns the tag's Version, or None if it does not support GET_VERSION
+
+           Tags without it stop answering after rejecting the command, so they are selected again.
+        """
+        self._raw_framing(True)
+        try:
+            response = self._raw_command(UL_GET_VERSION).tobytes()
+        except IOError:
+            response = None
+        finally:
+            self._raw_framing(False)
+        if response is not None and len(response) == 8:
+            return Version(*bytearray(response))
+        if self.device.select() < 1:
+            raise IOError("Tag left the field")
+        return None
+
+    def probe(self):
+        """Identifies the selected tag, returning the number of pages of user memory"""
+        self.header = None
+        self.version = self.get_version()
+        if self.version is not None:
+            self.fast = True
+            size = USER_MEMORY.get(self.version.storage, 1 << (self.version.storage >> 1))
+        else:
+            self.fast = False
+            self.header = self.read_pages(0, FIRST_USER_PAGE)
+            if self.header[12] == 0xe1:
+                size = self.header[14] * 8
+            else:
+                size = DEFAULT_USER_MEMORY
+        self.user_pages = size // PAGE_SIZE
+        return self.user_pages
+
+    def read_pages(self, start, count, out = None):
+        """Reads count pages from start, into out (a bytearray) if given, and returns them
+
+           Uses FAST_READ for as many pages as fit in a frame if the tag supports
+           it, and otherwise READ, which returns four pages a frame.
+        """
+        if out is None:
+            out = bytearray(count * PAGE_SIZE)
+        done = 0
+        if self.fast:
+            self._raw_framing(True)
+        try:
+            while done < count:
+                page = start + done
+                if self.fast:
+                    pages = min(count - done, self.max_pages)
+                    data = self._raw_command(UL_FAST_READ, page, page + pages - 1)
+                else:
+                    pages = min(count - done, 4)
+                    data = self._command(UL_READ, page)
+                if len(data) < pages * PAGE_SIZE:
+                    raise IOError("Short read of page %d" % page)
+                out[done * PAGE_SIZE:(done + pages) * PAGE_SIZE] = data[:pages * PAGE_SIZE]
+                done += pages
+        finally:
+            if self.fast:
+                self._raw_framing(False)
+        return out
+
+    def read_memory(self):
+        """Returns the whole of the tag's user memory"""
+        if self.user_pages is None:
+            self.probe()
+        return self.read_pages(FIRST_USER_PAGE, self.user_pages)
+
+    def read_ndef(self, first_pages = 16):
+        """Returns the tag's NDEF message (a pyndef.Message), or None if it holds none
+
+           Only as much of the user memory is read as the message needs: first
+           the capability container and first_pages pages, then whatever the
+           rest of the message takes.
+        """
+        if self.user_pages is None:
+            self.probe()
+        end = FIRST_USER_PAGE + self.user_pages
+        if self.header is None:
+            # Read the capability container along with the start of the user memory
+            start = FIRST_USER_PAGE - 1
+        else:
+            start = FIRST_USER_PAGE
+        pages = min(first_pages, self.user_pages) + FIRST_USER_PAGE - start
+        data = self.read_pages(start, pages)
+        page = start + pages
+        if self.header is None:
+            cc, data = data[:PAGE_SIZE], data[PAGE_SIZE:]
+        else:
+            cc = self.header[12:16]
+        if cc[0] != 0xe1:
+            return None
+        decoder = pyndef.Type2Decoder()
+        # READ returns four pages whether they are needed or not
+        least = 1 if self.fast else 4
+        while not decoder.feed(data):
+            if page >= end:
+                raise ValueError("Tag memory ended before the NDEF message")
+            pages = min(max(-(-decoder.needed // PAGE_SIZE), least), end - page)
+            data = self.read_pages(page, pages)
+            page += pages
+        return decoder.message